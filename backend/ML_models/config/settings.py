@@ -23,7 +23,47 @@ AI_MODELS = {
 CACHE_SETTINGS = {
     'enabled': True,
     'ttl': 3600,  # 1 hour
-    'max_size': 1000
+    'max_size': 1000,                       # entries per tier
+    'max_bytes': 256 * 1024 * 1024,         # disk tier
+    'max_memory_bytes': 64 * 1024 * 1024,   # memory tier (per process, in front of the backend)
+    'backend': 'sqlite',                    # 'sqlite' (shared by all workers, WAL) or 'file' (single process)
+    'path': None,                           # sqlite database file; default <cache_dir>/cache.sqlite3
+    'schema_version': 1,                    # bump when cached data changes shape; old entries become misses
+    'compress_threshold': 16 * 1024,        # zlib-compress entry payloads larger than this (None: never)
+    'io_workers': 4,                        # threads for backend I/O of the async API
+    'early_refresh_beta': 1.0,              # probabilistic early refresh (XFetch); 0 disables
+    'stats_flush_interval': 5.0,            # seconds between writes of batched hit / miss counts to the backend
+}
+
+# Itinerary enrichment (Google Maps lookups per activity)
+ENRICHMENT_SETTINGS = {
+    'max_concurrency': 8,       # Maps calls in flight at once per service
+    'deadline_seconds': 15.0,   # per itinerary; unfinished activities are returned as-is
+}
+
+# Place details used by enrichment, cached per place_id and field group
+PLACE_CACHE_SETTINGS = {
+    'cache_dir': BASE_DIR / 'cache' / 'places',
+    'max_size': 20000,
+    'ttl': {
+        'static': 30 * 24 * 3600,    # name, address, geometry, phone, website, price level
+        'ratings': 24 * 3600,        # rating, review count, reviews, photos
+        'hours': 3600,               # opening hours
+        'resolve': 30 * 24 * 3600,   # (destination, activity name) -> place_id
+    },
+}
+
+# Travel times between consecutive activities (Distance Matrix + local estimate)
+TRAVEL_TIME_SETTINGS = {
+    'mode': 'walking',
+    'cache_dir': BASE_DIR / 'cache' / 'travel',
+    'max_size': 50000,
+    'ttl': 7 * 24 * 3600,
+    'precision': 4,                   # decimals of the coordinates in leg cache keys (~11 m)
+    'legs_in_flight': 10,             # concurrent 1 x 1 Distance Matrix requests (billed per element)
+    'quota_cooldown_seconds': 600,    # estimate only for this long after a quota error
+    'circuity': 1.3,                  # street distance / straight-line distance
+    'speeds_kmh': {'walking': 4.8, 'bicycling': 15, 'driving': 30, 'transit': 20},
 }
 
 # Data Paths
@@ -41,30 +41,24 @@ class AIItineraryService:
             Dictionary containing the generated itinerary
         """
         try:
-            # Check cache first
             cache_key = self.cache_manager.generate_key(request_data)
-            cached_result = self.cache_manager.get(cache_key)
-            
-            if cached_result:
-                logger.info(f"Returning cached result for key: {cache_key}")
-                return cached_result
-            
-            # Build prompt
-            prompt = self.prompt_builder.build_itinerary_prompt(request_data)
-            system_prompt = self.prompt_builder.get_system_prompt()
-            
-            # Generate with AI
-            response_text = await self._call_gemini(system_prompt, prompt)
-            
-            # Parse and validate response
-            # Gemini response is a JSON string, so we parse it here.
-            parsed_itinerary = self.response_parser.parse_itinerary_response(response_text)
-            
-            # Cache the result
-            self.cache_manager.set(cache_key, parsed_itinerary)
-            
-            logger.info("Successfully generated itinerary")
-            return parsed_itinerary
+
+            async def generate() -> Dict[str, Any]:
+                # Build prompt
+                prompt = self.prompt_builder.build_itinerary_prompt(request_data)
+                system_prompt = self.prompt_builder.get_system_prompt()
+
+                # Generate with AI
+                response_text = await self._call_gemini(system_prompt, prompt)
+
+                # Parse and validate response
+                # Gemini response is a JSON string, so we parse it here.
+                parsed_itinerary = self.response_parser.parse_itinerary_response(response_text)
+                logger.info("Successfully generated itinerary")
+                return parsed_itinerary
+
+            # Cached result, or one Gemini call shared by all concurrent identical requests
+            return await self.cache_manager.get_or_compute(cache_key, generate)
             
         except Exception as e:
             logger.error(f"Failed to generate itinerary: {str(e)}")
@@ -0,0 +1,412 @@
+import json
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+Buffer = Union[bytes, memoryview]
+
+
+class CacheBackend:
+    """
+    Storage tier behind CacheManager's in-process memory cache (L1).
+
+    Backends store opaque payload bytes with their write timestamp and TTL,
+    enforce their own count / byte limits and expire entries on read.
+    Statistics counters (hits, misses, evictions) live in the backend so a
+    shared backend can report them across processes.
+    """
+
+    name = 'base'
+
+    def get(self, key: str) -> Optional[Buffer]:
+        """Payload for key (bytes or a memoryview), or None if missing or expired. Pass it to release() when done."""
+        raise NotImplementedError
+
+    def release(self, payload: Buffer) -> None:
+        """Free a payload returned by get (unmaps memory-mapped reads)."""
+        if isinstance(payload, memoryview):
+            owner = payload.obj
+            payload.release()
+            if isinstance(owner, mmap.mmap):
+                try:
+                    owner.close()
+                except BufferError:
+                    pass  # still referenced elsewhere; closed when collected
+
+    def set(self, key: str, payload: bytes, timestamp: float, ttl: float) -> None:
+        """Store payload atomically: readers see the old or the new value, never a partial one."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        """Add to a statistics counter (hits / misses / evictions)."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus 'entries' and 'bytes' of this tier."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+def _is_expired(timestamp: float, ttl: float) -> bool:
+    return (time.time() - timestamp) > ttl
+
+
+# ======================================================================
+# FILE BACKEND (single process)
+# ======================================================================
+INDEX_FILE = 'entries.jsonl'
+ENTRY_SUFFIX = '.entry'
+# Pickle files / index of the previous format; removed when the index is rebuilt
+LEGACY_SUFFIX = '.pkl'
+LEGACY_INDEX_FILE = 'index.jsonl'
+# Files at least this large are memory mapped instead of read into a bytes copy
+MMAP_THRESHOLD = 64 * 1024
+# Rewrite the index journal once it holds this many times more records than live entries
+INDEX_COMPACT_RATIO = 2
+
+
+class FileCacheBackend(CacheBackend):
+    """
+    One file per key plus an in-memory LRU index (key -> size, timestamp,
+    ttl) persisted as an append-only journal, so neither writes nor stats
+    have to glob / stat the cache directory. Files are written to a temp file
+    and renamed into place; large ones are memory mapped on read. The index is
+    per process: use the SQLite backend when several workers share the cache.
+    """
+
+    name = 'file'
+
+    def __init__(self, cache_dir: Path, max_size: int, max_bytes: Optional[int] = None,
+                 suffix: str = ENTRY_SUFFIX, default_ttl: float = 3600):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.default_ttl = default_ttl
+
+        self.index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.total_bytes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.RLock()
+        self._index_path = self.cache_dir / INDEX_FILE
+        self._journal_records = 0
+        self._load_index()
+
+    def file_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[Buffer]:
+        with self._lock:
+            meta = self.index.get(key)
+            if meta is None:
+                return None
+            if _is_expired(meta['timestamp'], meta['ttl']):
+                self.delete(key)
+                return None
+            try:
+                payload = self._read(self.file_path(key))
+            except FileNotFoundError:
+                payload = None
+            if not payload:
+                self.delete(key)  # removed behind our back
+                return None
+            self.index.move_to_end(key)
+            return payload
+
+    @staticmethod
+    def _read(path: Path) -> Optional[Buffer]:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < MMAP_THRESHOLD:
+                return f.read()
+            # Zero-copy view; the mapping survives closing the file
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def set(self, key: str, payload: bytes, timestamp: float, ttl: float) -> None:
+        # Write to a temp file in the same directory, then rename over the old file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.file_path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            old = self.index.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old['size']
+            meta = {'size': len(payload), 'timestamp': timestamp, 'ttl': ttl}
+            self.index[key] = meta
+            self.total_bytes += meta['size']
+            self._journal({'op': 'set', 'key': key, **meta})
+
+            while len(self.index) > 1 and (
+                len(self.index) > self.max_size
+                or (self.max_bytes and self.total_bytes > self.max_bytes)
+            ):
+                self.delete(next(iter(self.index)))
+                self.counters['evictions'] += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            meta = self.index.pop(key, None)
+            if meta is None:
+                return
+            self.total_bytes -= meta['size']
+            try:
+                self.file_path(key).unlink()
+            except FileNotFoundError:
+                pass
+            self._journal({'op': 'del', 'key': key})
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self.index):
+                try:
+                    self.file_path(key).unlink()
+                except FileNotFoundError:
+                    pass
+            self.index.clear()
+            self.total_bytes = 0
+            self._compact_index()
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, 'entries': len(self.index), 'bytes': self.total_bytes}
+
+    def _journal(self, record: Dict[str, Any]) -> None:
+        """Append one record to the index journal; compact it once it is mostly garbage."""
+        try:
+            with open(self._index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+            self._journal_records += 1
+            if self._journal_records > INDEX_COMPACT_RATIO * max(len(self.index), self.max_size // 2):
+                self._compact_index()
+        except OSError as e:
+            logger.error(f"Cache index write failed: {str(e)}")
+
+    def _compact_index(self) -> None:
+        """Rewrite the journal with one record per live entry (in LRU order)."""
+        tmp_path = self._index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, meta in self.index.items():
+                f.write(json.dumps({'op': 'set', 'key': key, **meta}) + "\n")
+        os.replace(tmp_path, self._index_path)
+        self._journal_records = len(self.index)
+
+    def _load_index(self) -> None:
+        """Replay the index journal, or rebuild it from the directory once if there is none."""
+        if self._index_path.exists():
+            try:
+                with open(self._index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        self._journal_records += 1
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # torn last line after a crash
+                        key = record.pop('key')
+                        self.index.pop(key, None)
+                        if record.pop('op') == 'set':
+                            self.index[key] = record
+                self.total_bytes = sum(meta['size'] for meta in self.index.values())
+                return
+            except (OSError, KeyError) as e:
+                logger.error(f"Cache index unreadable, rebuilding: {str(e)}")
+                self.index.clear()
+
+        # One-time scan (first run, or index lost): oldest files first
+        for legacy_file in [*self.cache_dir.glob(f"*{LEGACY_SUFFIX}"), self.cache_dir / LEGACY_INDEX_FILE]:
+            legacy_file.unlink(missing_ok=True)
+        files = sorted(self.cache_dir.glob(f"*{self.suffix}"), key=lambda p: p.stat().st_mtime)
+        for cache_file in files:
+            stat = cache_file.stat()
+            self.index[cache_file.stem] = {'size': stat.st_size, 'timestamp': stat.st_mtime, 'ttl': self.default_ttl}
+        self.total_bytes = sum(meta['size'] for meta in self.index.values())
+        self._compact_index()
+
+
+# ======================================================================
+# SQLITE BACKEND (shared by all worker processes)
+# ======================================================================
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,
+    value       BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    timestamp   REAL NOT NULL,
+    ttl         REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES
+    ('hits', 0), ('misses', 0), ('evictions', 0), ('entries', 0), ('bytes', 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'entries';
+    UPDATE counters SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'entries';
+    UPDATE counters SET value = value - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE counters SET value = value - OLD.size + NEW.size WHERE name = 'bytes';
+END;
+"""
+
+# Only refresh last_access on reads when it is older than this (saves a write per hit)
+TOUCH_INTERVAL = 30.0
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache table in one SQLite database (WAL mode), so every worker process
+    sees the same entries and the same hit / miss / eviction counters.
+    Writes are single transactions, hence atomic for concurrent readers.
+    Entry count and byte totals are kept by triggers, so limits are checked
+    without scanning; eviction removes the least recently used rows.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: Path, max_size: int, max_bytes: Optional[int] = None,
+                 busy_timeout: float = 5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.executescript(_SQLITE_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread and process (connections must not cross a fork)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Buffer]:
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT value, timestamp, ttl, last_access FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, timestamp, ttl, last_access = row
+        if _is_expired(timestamp, ttl):
+            self.delete(key)
+            return None
+        now = time.time()
+        if now - last_access > TOUCH_INTERVAL:
+            conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+        return bytes(value)
+
+    def set(self, key: str, payload: bytes, timestamp: float, ttl: float) -> None:
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO entries (key, value, size, timestamp, ttl, last_access) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                'timestamp = excluded.timestamp, ttl = excluded.ttl, last_access = excluded.last_access',
+                (key, sqlite3.Binary(payload), len(payload), timestamp, ttl, time.time()),
+            )
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used rows until both limits hold (inside the caller's transaction)."""
+        while True:
+            entries, total_bytes = self._totals(conn)
+            over_count = entries - self.max_size
+            over_bytes = (total_bytes - self.max_bytes) if self.max_bytes else 0
+            if entries <= 1 or (over_count <= 0 and over_bytes <= 0):
+                return
+            # Remove enough rows for the count limit in one statement, at least one for the byte limit
+            batch = max(over_count, 1)
+            deleted = conn.execute(
+                'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT ?)',
+                (batch,),
+            ).rowcount
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'evictions'", (deleted,))
+            if not deleted:
+                return
+
+    @staticmethod
+    def _totals(conn: sqlite3.Connection):
+        rows = dict(conn.execute("SELECT name, value FROM counters WHERE name IN ('entries', 'bytes')").fetchall())
+        return rows.get('entries', 0), rows.get('bytes', 0)
+
+    def delete(self, key: str) -> None:
+        self._conn().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self) -> None:
+        self._conn().execute('DELETE FROM entries')
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        self._conn().execute(
+            'INSERT INTO counters (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            (counter, amount),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._conn().execute('SELECT name, value FROM counters').fetchall())
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_backend(name: str, cache_dir: Path, max_size: int, max_bytes: Optional[int] = None,
+                   **options) -> CacheBackend:
+    """Backend named in CACHE_SETTINGS['backend']: 'sqlite' (shared) or 'file'."""
+    if name == 'sqlite':
+        path = options.get('path') or Path(cache_dir) / 'cache.sqlite3'
+        return SQLiteCacheBackend(path, max_size, max_bytes)
+    if name == 'file':
+        return FileCacheBackend(cache_dir, max_size, max_bytes, default_ttl=options.get('ttl', 3600))
+    raise ValueError(f"Unknown cache backend: {name}")
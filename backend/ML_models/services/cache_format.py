@@ -0,0 +1,87 @@
+import json
+import struct
+import zlib
+from typing import Any, NamedTuple, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # optional, JSON is used without it
+    msgpack = None
+
+# Entry layout: fixed little-endian header followed by the payload.
+#   magic (4s) | format version (B) | flags (B) | schema version (H)
+#   | timestamp (d) | ttl (d) | compute time (d) | payload size (I)
+# Version 2 added the compute time (seconds the value took to produce, for early refresh).
+MAGIC = b'TVAC'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<4sBBHdddI')
+
+FLAG_ZLIB = 0x01
+FLAG_MSGPACK = 0x02
+
+# Payloads above this size are zlib compressed (level 1: fast, still ~5x on itinerary JSON)
+COMPRESS_THRESHOLD = 16 * 1024
+ZLIB_LEVEL = 1
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class EntryHeader(NamedTuple):
+    flags: int
+    schema_version: int
+    timestamp: float
+    ttl: float
+    delta: float
+    size: int
+
+
+def encode_entry(data: Any, timestamp: float, ttl: float, schema_version: int,
+                 compress_threshold: Optional[int] = COMPRESS_THRESHOLD, delta: float = 0.0) -> bytes:
+    """Serialize data (MessagePack if installed, else compact JSON) behind an EntryHeader."""
+    flags = 0
+    if msgpack is not None:
+        payload = msgpack.packb(data, use_bin_type=True, default=str)
+        flags |= FLAG_MSGPACK
+    else:
+        payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+    if compress_threshold is not None and len(payload) > compress_threshold:
+        payload = zlib.compress(payload, ZLIB_LEVEL)
+        flags |= FLAG_ZLIB
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, schema_version, timestamp, ttl, delta, len(payload))
+    return header + payload
+
+
+def read_header(buf: Buffer) -> Optional[EntryHeader]:
+    """Header of an encoded entry, or None if buf is not in this format (e.g. an old pickle entry)."""
+    if len(buf) < HEADER.size:
+        return None
+    magic, version = buf[:4], buf[4]
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    _, _, flags, schema_version, timestamp, ttl, delta, size = HEADER.unpack_from(buf, 0)
+    if len(buf) < HEADER.size + size:
+        return None
+    return EntryHeader(flags, schema_version, timestamp, ttl, delta, size)
+
+
+def decode_payload(buf: Buffer, header: EntryHeader) -> Any:
+    """Deserialize the payload of an entry. Works on memoryviews (e.g. over an mmap) without copying first."""
+    view = memoryview(buf)[HEADER.size:HEADER.size + header.size]
+    if header.flags & FLAG_ZLIB:
+        view = zlib.decompress(view)
+
+    if header.flags & FLAG_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Cache entry is MessagePack encoded but msgpack is not installed")
+        return msgpack.unpackb(view, raw=False)
+    return json.loads(bytes(view))
+
+
+def decode_entry(buf: Buffer, schema_version: int) -> Optional[Tuple[EntryHeader, Any]]:
+    """(header, data), or None when the entry is in another format or schema version."""
+    header = read_header(buf)
+    if header is None or header.schema_version != schema_version:
+        return None
+    return header, decode_payload(buf, header)
@@ -1,23 +1,76 @@
+import asyncio
+import concurrent.futures
 import json
 import hashlib
+import math
+import random
 import time
-from typing import Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable
 from pathlib import Path
-import pickle
 import logging
+from ..config.settings import CACHE_SETTINGS
+from .cache_backends import CacheBackend, create_backend
+from .cache_format import HEADER, encode_entry, read_header, decode_payload
 
 logger = logging.getLogger(__name__)
 
 class CacheManager:
-    """Manager for caching AI responses and data"""
+    """
+    Manager for caching AI responses and data.
+
+    An in-process LRU memory tier (L1, ordered dict with O(1) lookup, touch
+    and eviction; bounded by max_size and max_memory_bytes) in front of a
+    pluggable storage backend (see cache_backends): SQLite in WAL mode by
+    default, shared by all worker processes together with the hit / miss
+    statistics, or one file per key for single-process use.
+
+    Entries are stored in the versioned binary format of cache_format
+    (header + MessagePack / JSON, zlib above a size threshold). Entries in an
+    older format or another schema_version are dropped on read, as misses.
+
+    Coroutines use aget / aset / get_or_compute, which keep backend I/O off
+    the event loop and collapse concurrent misses for a key into one computation.
+    """
     
-    def __init__(self, cache_dir: str = None, max_size: int = 1000, ttl: int = 3600):
+    def __init__(self, cache_dir: str = None, max_size: int = None, ttl: int = None,
+                 max_bytes: int = None, max_memory_bytes: int = None, backend: str = None,
+                 schema_version: int = None):
         self.cache_dir = Path(cache_dir) if cache_dir else Path.cwd() / 'cache'
-        self.cache_dir.mkdir(exist_ok=True)
-        self.max_size = max_size
-        self.ttl = ttl  # Time to live in seconds
-        self.memory_cache = {}
-        self.cache_stats = {'hits': 0, 'misses': 0}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size or CACHE_SETTINGS.get('max_size', 1000)
+        self.ttl = ttl or CACHE_SETTINGS.get('ttl', 3600)  # Time to live in seconds
+        self.max_bytes = max_bytes or CACHE_SETTINGS.get('max_bytes')
+        self.max_memory_bytes = max_memory_bytes or CACHE_SETTINGS.get('max_memory_bytes')
+        # Bump when the shape of cached data changes; older entries then read as misses
+        self.schema_version = schema_version or CACHE_SETTINGS.get('schema_version', 1)
+        self.compress_threshold = CACHE_SETTINGS.get('compress_threshold', 16 * 1024)
+        # XFetch beta: > 1 refreshes earlier, 0 disables early refresh
+        self.early_refresh_beta = CACHE_SETTINGS.get('early_refresh_beta', 1.0)
+        # Hit / miss counts are batched in-process and added to the shared
+        # counters every stats_flush_interval seconds (and on get_stats / close)
+        self.stats_flush_interval = CACHE_SETTINGS.get('stats_flush_interval', 5.0)
+        self._counts = {'hits': 0, 'misses': 0}
+        self._counts_flushed_at = time.monotonic()
+
+        self.memory_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.memory_bytes = 0
+        self._lock = threading.RLock()
+        # key -> concurrent.futures.Future of the computation in progress (get_or_compute)
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=CACHE_SETTINGS.get('io_workers', 4), thread_name_prefix='cache-io'
+        )
+
+        self.backend: CacheBackend = create_backend(
+            backend or CACHE_SETTINGS.get('backend', 'sqlite'),
+            self.cache_dir,
+            self.max_size,
+            self.max_bytes,
+            path=CACHE_SETTINGS.get('path'),
+            ttl=self.ttl,
+        )
     
     def generate_key(self, data: Dict[str, Any]) -> str:
         """Generate cache key from request data"""
@@ -47,33 +100,38 @@ class CacheManager:
     
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         """Retrieve cached data"""
+        entry = self._get_entry(key)
+        return entry['data'] if entry is not None else None
+
+    def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached entry (data, timestamp, ttl, delta) from L1 or the backend; counts the hit / miss."""
         try:
-            # Check memory cache first
-            if key in self.memory_cache:
-                entry = self.memory_cache[key]
-                if not self._is_expired(entry):
-                    self.cache_stats['hits'] += 1
-                    logger.debug(f"Cache hit (memory): {key}")
-                    return entry['data']
-                else:
-                    del self.memory_cache[key]
-            
-            # Check file cache
-            cache_file = self.cache_dir / f"{key}.pkl"
-            if cache_file.exists():
-                with open(cache_file, 'rb') as f:
-                    entry = pickle.load(f)
-                    
-                if not self._is_expired(entry):
-                    # Load into memory cache
-                    self.memory_cache[key] = entry
-                    self.cache_stats['hits'] += 1
-                    logger.debug(f"Cache hit (file): {key}")
-                    return entry['data']
-                else:
-                    cache_file.unlink()  # Remove expired file
-            
-            self.cache_stats['misses'] += 1
+            with self._lock:
+                # Check memory cache first
+                entry = self.memory_cache.get(key)
+                if entry is not None:
+                    if not self._is_expired(entry):
+                        self.memory_cache.move_to_end(key)
+                        self._count('hits')
+                        logger.debug(f"Cache hit (memory): {key}")
+                        return entry
+                    self._drop_memory(key)
+
+            # Check the shared backend
+            payload = self.backend.get(key)
+            if payload is not None:
+                try:
+                    entry = self._decode(key, payload)
+                finally:
+                    self.backend.release(payload)
+                if entry is not None:
+                    with self._lock:
+                        self._put_memory(key, entry, entry['size'])
+                    self._count('hits')
+                    logger.debug(f"Cache hit ({self.backend.name}): {key}")
+                    return entry
+
+            self._count('misses')
             logger.debug(f"Cache miss: {key}")
             return None
             
@@ -81,82 +139,225 @@ class CacheManager:
             logger.error(f"Cache retrieval failed for {key}: {str(e)}")
             return None
     
-    def set(self, key: str, data: Dict[str, Any]) -> None:
-        """Store data in cache"""
+    def set(self, key: str, data: Dict[str, Any], delta: float = 0.0, ttl: float = None) -> None:
+        """
+        Store data in cache (delta: seconds it took to compute, used for early
+        refresh; ttl: overrides the manager's TTL for this entry)
+        """
         try:
             entry = {
                 'data': data,
                 'timestamp': time.time(),
-                'ttl': self.ttl
+                'ttl': ttl or self.ttl,
+                'delta': delta,
             }
-            
-            # Store in memory cache
-            self.memory_cache[key] = entry
-            
-            # Store in file cache
-            cache_file = self.cache_dir / f"{key}.pkl"
-            with open(cache_file, 'wb') as f:
-                pickle.dump(entry, f)
-            
-            # Cleanup if cache is too large
-            self._cleanup_cache()
-            
+            payload = encode_entry(
+                data, entry['timestamp'], entry['ttl'], self.schema_version, self.compress_threshold, delta
+            )
+
+            with self._lock:
+                self._put_memory(key, entry, len(payload))
+            self.backend.set(key, payload, entry['timestamp'], entry['ttl'])
+
             logger.debug(f"Cached data: {key}")
             
         except Exception as e:
             logger.error(f"Cache storage failed for {key}: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # Async API
+    # ------------------------------------------------------------------
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """get() for coroutines: L1 hits return inline, backend I/O runs on the cache thread pool."""
+        entry = await self._aget_entry(key)
+        return entry['data'] if entry is not None else None
+
+    async def aset(self, key: str, data: Dict[str, Any], delta: float = 0.0) -> None:
+        """set() on the cache thread pool."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.set, key, data, delta)
+
+    async def _aget_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self.memory_cache.get(key)
+            if entry is not None and not self._is_expired(entry):
+                self.memory_cache.move_to_end(key)
+                hit = True
+            else:
+                hit = False
+        if hit:
+            self._count('hits')
+            return entry
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._get_entry, key)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]], beta: float = None) -> Any:
+        """
+        Cached value for key, or the result of `await compute()` (then cached).
+
+        Concurrent callers for the same key share one computation through an
+        in-flight future (works across threads and event loops). Entries are
+        refreshed early with probability growing towards expiry, scaled by how
+        long they took to compute (XFetch), so a hot key is recomputed by one
+        caller while everyone else keeps getting the cached value.
+        """
+        beta = self.early_refresh_beta if beta is None else beta
+        entry = await self._aget_entry(key)
+        if entry is not None and not self._should_refresh_early(entry, beta):
+            return entry['data']
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[key] = concurrent.futures.Future()
+
+        if not owner:
+            # Someone is already refreshing: serve the current value if there is one
+            if entry is not None:
+                return entry['data']
+            return await asyncio.wrap_future(inflight)
+
+        try:
+            started = time.monotonic()
+            data = await compute()
+            await self.aset(key, data, time.monotonic() - started)
+            inflight.set_result(data)
+            return data
+        except Exception as e:
+            if entry is not None and not self._is_expired(entry):
+                # Early refresh failed, but the cached value has not expired yet
+                logger.warning(f"Early refresh of {key} failed, serving cached value: {e}")
+                inflight.set_result(entry['data'])
+                return entry['data']
+            inflight.set_exception(e)
+            raise
+        except BaseException as e:
+            inflight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    @staticmethod
+    def _should_refresh_early(entry: Dict[str, Any], beta: float) -> bool:
+        """XFetch: refresh when now - delta * beta * ln(rand) passes the expiry time."""
+        delta = entry.get('delta') or 0.0
+        if delta <= 0 or beta <= 0:
+            return False
+        expiry = entry['timestamp'] + entry['ttl']
+        return time.time() - delta * beta * math.log(1.0 - random.random()) >= expiry
     
     def _is_expired(self, entry: Dict[str, Any]) -> bool:
         """Check if cache entry is expired"""
         return (time.time() - entry['timestamp']) > entry['ttl']
-    
-    def _cleanup_cache(self) -> None:
-        """Cleanup old cache entries"""
-        # Memory cache cleanup
-        if len(self.memory_cache) > self.max_size:
-            # Remove oldest entries
-            sorted_items = sorted(
-                self.memory_cache.items(),
-                key=lambda x: x[1]['timestamp']
-            )
-            
-            items_to_remove = len(self.memory_cache) - self.max_size + 10
-            for key, _ in sorted_items[:items_to_remove]:
-                del self.memory_cache[key]
-        
-        # File cache cleanup
+
+    def _decode(self, key: str, payload) -> Optional[Dict[str, Any]]:
+        """Entry dict from stored bytes; stale-format, other-schema and expired entries are deleted."""
+        header = read_header(payload)
+        if header is None or header.schema_version != self.schema_version:
+            logger.debug(f"Dropping cache entry in another format / schema: {key}")
+            self.backend.delete(key)
+            return None
+
+        entry = {
+            'timestamp': header.timestamp,
+            'ttl': header.ttl,
+            'delta': header.delta,
+            'size': HEADER.size + header.size,
+        }
+        if self._is_expired(entry):
+            self.backend.delete(key)
+            return None
+        entry['data'] = decode_payload(payload, header)
+        return entry
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+    def _count(self, counter: str) -> None:
+        """Count a hit / miss in-process; a due flush runs on the cache thread pool, never inline."""
+        with self._lock:
+            self._counts[counter] += 1
+            due = time.monotonic() - self._counts_flushed_at >= self.stats_flush_interval
+            if due:
+                self._counts_flushed_at = time.monotonic()
+        if due:
+            try:
+                self._executor.submit(self.flush_stats)
+            except RuntimeError:
+                pass  # closed; the counts stay batched
+
+    def flush_stats(self) -> None:
+        """Add the hit / miss counts batched since the last flush to the backend counters."""
+        with self._lock:
+            counts, self._counts = self._counts, {'hits': 0, 'misses': 0}
         try:
-            cache_files = list(self.cache_dir.glob("*.pkl"))
-            if len(cache_files) > self.max_size:
-                # Sort by modification time
-                cache_files.sort(key=lambda x: x.stat().st_mtime)
-                
-                files_to_remove = len(cache_files) - self.max_size + 10
-                for cache_file in cache_files[:files_to_remove]:
-                    cache_file.unlink()
-                    
+            for counter, amount in counts.items():
+                if amount:
+                    self.backend.incr(counter, amount)
+                    counts[counter] = 0
         except Exception as e:
-            logger.error(f"Cache cleanup failed: {str(e)}")
-    
+            logger.error(f"Cache statistics flush failed: {str(e)}")
+            with self._lock:
+                for counter, amount in counts.items():
+                    self._counts[counter] += amount
+
+    # ------------------------------------------------------------------
+    # Memory tier (L1)
+    # ------------------------------------------------------------------
+    def _put_memory(self, key: str, entry: Dict[str, Any], size: int) -> None:
+        self._drop_memory(key)
+        entry['size'] = size
+        self.memory_cache[key] = entry
+        self.memory_bytes += size
+
+        # Evict least recently used entries (never the one just stored)
+        while len(self.memory_cache) > 1 and (
+            len(self.memory_cache) > self.max_size
+            or (self.max_memory_bytes and self.memory_bytes > self.max_memory_bytes)
+        ):
+            _, old_entry = self.memory_cache.popitem(last=False)
+            self.memory_bytes -= old_entry.get('size', 0)
+
+    def _drop_memory(self, key: str) -> None:
+        entry = self.memory_cache.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= entry.get('size', 0)
+
     def clear(self) -> None:
         """Clear all cache"""
-        self.memory_cache.clear()
-        
+        with self._lock:
+            self.memory_cache.clear()
+            self.memory_bytes = 0
+
         try:
-            for cache_file in self.cache_dir.glob("*.pkl"):
-                cache_file.unlink()
+            self.backend.clear()
         except Exception as e:
             logger.error(f"Cache clear failed: {str(e)}")
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        total_requests = self.cache_stats['hits'] + self.cache_stats['misses']
-        hit_rate = (self.cache_stats['hits'] / total_requests * 100) if total_requests > 0 else 0
+        """Get cache statistics (hits / misses / evictions aggregate over all processes sharing the backend)"""
+        self.flush_stats()
+        shared = self.backend.stats()
+        hits, misses = shared.get('hits', 0), shared.get('misses', 0)
+        total_requests = hits + misses
+        hit_rate = (hits / total_requests * 100) if total_requests > 0 else 0
         
         return {
-            'hits': self.cache_stats['hits'],
-            'misses': self.cache_stats['misses'],
+            'hits': hits,
+            'misses': misses,
+            'evictions': shared.get('evictions', 0),
             'hit_rate': f"{hit_rate:.2f}%",
+            'backend': self.backend.name,
             'memory_cache_size': len(self.memory_cache),
-            'file_cache_size': len(list(self.cache_dir.glob("*.pkl")))
+            'memory_cache_bytes': self.memory_bytes,
+            'file_cache_size': shared.get('entries', 0),
+            'file_cache_bytes': shared.get('bytes', 0),
         }
+
+    def close(self) -> None:
+        """Flush batched statistics and release the cache threads and backend connection."""
+        self._executor.shutdown(wait=True)
+        self.flush_stats()
+        self.backend.close()
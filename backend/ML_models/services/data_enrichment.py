@@ -1,27 +1,61 @@
 import googlemaps
 import requests
 import asyncio
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 from ..config.api_keys import APIKeyManager
-from ..config.settings import EXTERNAL_APIS
+from ..config.settings import EXTERNAL_APIS, ENRICHMENT_SETTINGS, TRAVEL_TIME_SETTINGS
+from .place_cache import PlaceDetailsCache
+from .travel_times import TravelTimeCache, QuotaGuard, estimate_leg, matrix_leg
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _coords_of(activity: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(lat, lng) of an enriched activity, or None when it was not located."""
+    coords = activity.get('coordinates') or {}
+    if coords.get('lat') is None or coords.get('lng') is None:
+        return None
+    return (coords['lat'], coords['lng'])
+
+
 class DataEnrichmentService:
-    """Service for enriching itinerary data with real-time information"""
+    """
+    Service for enriching itinerary data with real-time information.
+
+    The googlemaps client is blocking, so every Maps call runs on a bounded
+    thread pool (ENRICHMENT_SETTINGS['max_concurrency'] calls at a time) and
+    all activities of an itinerary are enriched concurrently. Enrichment
+    stops at ENRICHMENT_SETTINGS['deadline_seconds']; whatever finished by
+    then is returned.
+    """
     
     def __init__(self):
         self.api_keys = APIKeyManager()
+        self.max_concurrency = ENRICHMENT_SETTINGS.get('max_concurrency', 8)
+        self.deadline_seconds = ENRICHMENT_SETTINGS.get('deadline_seconds', 15.0)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix='enrichment'
+        )
+        self.place_cache = PlaceDetailsCache()
+        self.travel_cache = TravelTimeCache()
+        self.matrix_quota = QuotaGuard()
         
         # Initialize Google Maps client
         if self.api_keys.is_service_available('google_maps'):
             self.gmaps = googlemaps.Client(
-                key=self.api_keys.get_key('google_maps')
+                key=self.api_keys.get_key('google_maps'),
+                timeout=EXTERNAL_APIS['google_places']['timeout'],
             )
         else:
             self.gmaps = None
             logger.warning("Google Maps API not available")
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run a blocking (googlemaps / requests) call on the enrichment pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
     
     async def enrich_itinerary(self, 
                              itinerary: Dict[str, Any], 
@@ -37,23 +71,25 @@ class DataEnrichmentService:
             Enriched itinerary with additional data
         """
         enriched = itinerary.copy()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_seconds
         
         try:
-            # Get destination coordinates
-            dest_coords = await self._get_destination_coordinates(destination)
-            enriched['destination_coordinates'] = dest_coords
-            
-            # Enrich activities
+            # Geocode the destination while the activities are being looked up
+            coords_task = asyncio.ensure_future(self._get_destination_coordinates(destination))
+
+            # Enrich all activities concurrently (bounded by the executor)
             if 'daily_schedule' in enriched:
-                for day_idx, day in enumerate(enriched['daily_schedule']):
-                    if 'activities' in day:
-                        enriched_activities = []
-                        for activity in day['activities']:
-                            enriched_activity = await self._enrich_activity(
-                                activity, destination
-                            )
-                            enriched_activities.append(enriched_activity)
-                        day['activities'] = enriched_activities
+                enriched['daily_schedule'] = [dict(day) for day in enriched['daily_schedule']]
+                enriched['enrichment'] = await self._enrich_all_activities(
+                    enriched['daily_schedule'], destination, deadline
+                )
+
+            try:
+                dest_coords = await asyncio.wait_for(coords_task, max(deadline - loop.time(), 0.001))
+            except asyncio.TimeoutError:
+                dest_coords = {'lat': 0, 'lng': 0}
+            enriched['destination_coordinates'] = dest_coords
             
             # Add weather forecast
             if dest_coords['lat'] != 0 and dest_coords['lng'] != 0:
@@ -68,7 +104,7 @@ class DataEnrichmentService:
             enriched['local_events'] = local_events
             
             # Calculate travel times
-            enriched = await self._add_travel_times(enriched)
+            enriched = await self._add_travel_times(enriched, deadline)
             
             logger.info("Successfully enriched itinerary data")
             return enriched
@@ -77,13 +113,52 @@ class DataEnrichmentService:
             logger.error(f"Data enrichment failed: {str(e)}")
             return itinerary  # Return original if enrichment fails
     
+    async def _enrich_all_activities(self,
+                                     days: List[Dict[str, Any]],
+                                     destination: str,
+                                     deadline: float) -> Dict[str, Any]:
+        """
+        Enrich every activity of every day concurrently, in place.
+        Activities not finished by the deadline keep their original data.
+        Returns a summary: {'complete', 'enriched', 'total'}.
+        """
+        loop = asyncio.get_running_loop()
+        tasks = {}
+        for day_idx, day in enumerate(days):
+            for act_idx, activity in enumerate(day.get('activities') or []):
+                task = asyncio.ensure_future(self._enrich_activity(activity, destination))
+                tasks[task] = (day_idx, act_idx)
+
+        for day in days:
+            if 'activities' in day:
+                day['activities'] = list(day['activities'])
+
+        if not tasks:
+            return {'complete': True, 'enriched': 0, 'total': 0}
+
+        done, pending = await asyncio.wait(tasks, timeout=max(deadline - loop.time(), 0))
+        for task in pending:
+            # Not started yet: dropped from the pool queue; running: result ignored
+            task.cancel()
+
+        for task in done:
+            day_idx, act_idx = tasks[task]
+            days[day_idx]['activities'][act_idx] = task.result()
+
+        if pending:
+            logger.warning(
+                f"Enrichment deadline ({self.deadline_seconds}s) hit: "
+                f"{len(done)}/{len(tasks)} activities enriched"
+            )
+        return {'complete': not pending, 'enriched': len(done), 'total': len(tasks)}
+
     async def _get_destination_coordinates(self, destination: str) -> Dict[str, float]:
         """Get latitude and longitude for destination"""
         if not self.gmaps:
             return {'lat': 0, 'lng': 0}
         
         try:
-            geocode_result = self.gmaps.geocode(destination)
+            geocode_result = await self._run_blocking(self.gmaps.geocode, destination)
             if geocode_result:
                 location = geocode_result[0]['geometry']['location']
                 return {
@@ -106,24 +181,10 @@ class DataEnrichmentService:
         enriched_activity = activity.copy()
         
         try:
-            # Search for the place
-            search_query = f"{activity.get('title', '')} {destination}"
-            places_result = self.gmaps.places(query=search_query)
+            # Resolution + details run back to back on one pool thread
+            details = await self._run_blocking(self._fetch_place_details, activity, destination)
             
-            if places_result['results']:
-                place = places_result['results'][0]
-                place_id = place['place_id']
-                
-                # Get detailed information
-                details = self.gmaps.place(
-                    place_id=place_id,
-                    fields=[
-                        'place_id', 'name', 'rating', 'user_ratings_total',
-                        'formatted_address', 'formatted_phone_number', 
-                        'website', 'opening_hours', 'geometry', 'price_level',
-                        'photos', 'reviews'
-                    ]
-                )['result']
+            if details:
                 
                 # Add enriched data
                 enriched_activity.update({
@@ -164,6 +225,29 @@ class DataEnrichmentService:
             logger.error(f"Activity enrichment failed for {activity.get('title', 'Unknown')}: {str(e)}")
         
         return enriched_activity
+
+    def _fetch_place_details(self, activity: Dict[str, Any], destination: str) -> Optional[Dict[str, Any]]:
+        """
+        Blocking: details for the activity's place (None if not found).
+        Uses the activity's place_id or a cached resolution before falling back
+        to a text search, and only requests field groups that are not cached.
+        """
+        title = activity.get('title', '')
+        place_id = activity.get('place_id') or self.place_cache.resolve(destination, title)
+        if not place_id:
+            places_result = self.gmaps.places(query=f"{title} {destination}")
+            if not places_result['results']:
+                return None
+            place_id = places_result['results'][0]['place_id']
+            self.place_cache.remember(destination, title, place_id)
+
+        details, missing = self.place_cache.get_details(place_id)
+        if missing:
+            fetched = self.gmaps.place(place_id=place_id, fields=missing)['result']
+            self.place_cache.put_details(place_id, fetched, missing)
+            details.update(fetched)
+        details.setdefault('place_id', place_id)
+        return details
     
     async def _get_weather_forecast(self, 
                                   coordinates: Dict[str, float], 
@@ -229,48 +313,66 @@ class DataEnrichmentService:
         # For now, returning empty list as placeholder
         return []
     
-    async def _add_travel_times(self, itinerary: Dict[str, Any]) -> Dict[str, Any]:
-        """Add travel times between activities"""
-        if not self.gmaps or 'daily_schedule' not in itinerary:
+    async def _add_travel_times(self, itinerary: Dict[str, Any], deadline: float = None) -> Dict[str, Any]:
+        """
+        Add travel times between consecutive activities.
+        Cached legs are reused; the rest of each day go out as concurrent 1 x 1
+        Distance Matrix requests, legs_in_flight at a time. Past the deadline,
+        after a quota error or without a Maps client, legs are estimated locally.
+        """
+        if 'daily_schedule' not in itinerary:
             return itinerary
-        
+
+        loop = asyncio.get_running_loop()
+        mode = TRAVEL_TIME_SETTINGS.get('mode', 'walking')
+        chunk = TRAVEL_TIME_SETTINGS.get('legs_in_flight', 10)
+        counts = {'matrix': 0, 'cache': 0, 'estimate': 0}
+
         for day in itinerary['daily_schedule']:
             activities = day.get('activities', [])
-            
+
+            # (activity index, origin, destination) of every leg with known coordinates
+            legs = []
             for i in range(len(activities) - 1):
-                current_activity = activities[i]
-                next_activity = activities[i + 1]
-                
-                current_coords = current_activity.get('coordinates')
-                next_coords = next_activity.get('coordinates')
-                
-                if current_coords and next_coords:
-                    try:
-                        # Calculate travel time
-                        directions = self.gmaps.directions(
-                            origin=(current_coords['lat'], current_coords['lng']),
-                            destination=(next_coords['lat'], next_coords['lng']),
-                            mode="walking",
-                            departure_time="now"
-                        )
-                        
-                        if directions:
-                            leg = directions[0]['legs'][0]
-                            current_activity['travel_to_next'] = {
-                                'duration': leg['duration']['text'],
-                                'duration_seconds': leg['duration']['value'],
-                                'distance': leg['distance']['text'],
-                                'mode': 'walking'
-                            }
-                    
-                    except Exception as e:
-                        logger.error(f"Travel time calculation failed: {str(e)}")
-                        current_activity['travel_to_next'] = {
-                            'duration': '15 mins',
-                            'duration_seconds': 900,
-                            'mode': 'walking'
-                        }
-        
+                origin = _coords_of(activities[i])
+                destination = _coords_of(activities[i + 1])
+                if origin and destination:
+                    legs.append((i, origin, destination))
+
+            cached = await asyncio.gather(*(self.travel_cache.aget(o, d, mode) for _, o, d in legs))
+            results = {i: leg for (i, _, _), leg in zip(legs, cached)}
+            missing = [leg for leg in legs if results[leg[0]] is None]
+
+            for start in range(0, len(missing), chunk):
+                batch = missing[start:start + chunk]
+                remaining = None if deadline is None else deadline - loop.time()
+                if not self.gmaps or not self.matrix_quota.available() or (remaining is not None and remaining <= 0):
+                    break
+                calls = [self._run_blocking(matrix_leg, self.gmaps, o, d, mode) for _, o, d in batch]
+                try:
+                    fetched = await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), remaining)
+                except asyncio.TimeoutError:
+                    logger.warning("Travel time deadline hit; estimating remaining legs")
+                    break
+                errors = [leg for leg in fetched if isinstance(leg, Exception)]
+                stores = []
+                for (i, origin, dest), leg in zip(batch, fetched):
+                    if leg and not isinstance(leg, Exception):
+                        stores.append(self.travel_cache.aput(origin, dest, mode, leg))
+                        results[i] = leg
+                await asyncio.gather(*stores)
+                if errors:
+                    logger.error(f"Travel time calculation failed: {str(errors[0])}")
+                    for error in errors:
+                        self.matrix_quota.record_error(error)
+                    break
+
+            for i, origin, dest in legs:
+                leg = results[i] or estimate_leg(origin, dest, mode)
+                counts[leg['source']] += 1
+                activities[i]['travel_to_next'] = leg
+
+        logger.info(f"Travel times: {counts}")
         return itinerary
     
     async def _make_request(self, url: str, params: Dict[str, Any]) -> Any:
@@ -0,0 +1,82 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+from ..config.settings import PLACE_CACHE_SETTINGS
+from .cache_manager import CacheManager
+
+logger = logging.getLogger(__name__)
+
+# Place Details fields grouped by how quickly they go stale
+FIELD_GROUPS: Dict[str, List[str]] = {
+    'static': ['place_id', 'name', 'formatted_address', 'geometry',
+               'formatted_phone_number', 'website', 'price_level'],
+    'ratings': ['rating', 'user_ratings_total', 'reviews', 'photos'],
+    'hours': ['opening_hours'],
+}
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize_name(text: str) -> str:
+    return _WHITESPACE_RE.sub(' ', (text or '').strip().lower())
+
+
+class PlaceDetailsCache:
+    """
+    Google Place Details cached per place_id and field group, each group with
+    its own TTL (PLACE_CACHE_SETTINGS['ttl']): address / geometry for weeks,
+    ratings for a day, opening hours for an hour. Also remembers which
+    place_id a (destination, activity name) resolved to, so the text search
+    can be skipped next time.
+    """
+
+    def __init__(self, cache_manager: CacheManager = None):
+        self.ttls = PLACE_CACHE_SETTINGS['ttl']
+        self.cache = cache_manager or CacheManager(
+            cache_dir=PLACE_CACHE_SETTINGS.get('cache_dir'),
+            max_size=PLACE_CACHE_SETTINGS.get('max_size'),
+            ttl=self.ttls['static'],
+        )
+
+    # ------------------------------------------------------------------
+    # Name -> place_id resolution
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _resolve_key(destination: str, name: str) -> str:
+        return f"resolve:{_normalize_name(destination)}:{_normalize_name(name)}"
+
+    def resolve(self, destination: str, name: str) -> Optional[str]:
+        """place_id previously found for this activity name at this destination."""
+        if not name:
+            return None
+        hit = self.cache.get(self._resolve_key(destination, name))
+        return hit.get('place_id') if hit else None
+
+    def remember(self, destination: str, name: str, place_id: str) -> None:
+        if name and place_id:
+            self.cache.set(self._resolve_key(destination, name), {'place_id': place_id}, ttl=self.ttls['resolve'])
+
+    # ------------------------------------------------------------------
+    # Details by field group
+    # ------------------------------------------------------------------
+    def get_details(self, place_id: str) -> Tuple[Dict[str, Any], List[str]]:
+        """(cached fields still fresh, fields that have to be fetched again)."""
+        details: Dict[str, Any] = {}
+        missing: List[str] = []
+        for group, fields in FIELD_GROUPS.items():
+            cached = self.cache.get(f"place:{place_id}:{group}")
+            if cached is None:
+                missing += fields
+            else:
+                details.update(cached)
+        return details, missing
+
+    def put_details(self, place_id: str, details: Dict[str, Any], fields: List[str]) -> None:
+        """Store the fetched fields; groups are only written when all of their fields were requested."""
+        requested = set(fields)
+        for group, group_fields in FIELD_GROUPS.items():
+            if not requested.issuperset(group_fields):
+                continue
+            # Absent fields (e.g. no website) are cached as absent too
+            values = {f: details[f] for f in group_fields if f in details}
+            self.cache.set(f"place:{place_id}:{group}", values, ttl=self.ttls[group])
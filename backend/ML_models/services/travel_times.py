@@ -0,0 +1,139 @@
+import math
+import time
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+from ..config.settings import TRAVEL_TIME_SETTINGS
+from .cache_manager import CacheManager
+
+logger = logging.getLogger(__name__)
+
+Coords = Tuple[float, float]
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(origin: Coords, destination: Coords) -> float:
+    """Great-circle distance in km."""
+    lat1, lng1 = map(math.radians, origin)
+    lat2, lng2 = map(math.radians, destination)
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def format_duration(seconds: int) -> str:
+    """Google-style duration text: '1 min', '25 mins', '1 hour 5 mins'."""
+    minutes = max(1, round(seconds / 60))
+    hours, minutes = divmod(minutes, 60)
+    parts = []
+    if hours:
+        parts.append(f"{hours} hour{'s' if hours > 1 else ''}")
+    if minutes or not hours:
+        parts.append(f"{minutes} min{'s' if minutes > 1 else ''}")
+    return ' '.join(parts)
+
+
+def format_distance(meters: int) -> str:
+    """Google-style distance text: '850 m', '1.2 km'."""
+    if meters < 1000:
+        return f"{int(meters)} m"
+    return f"{meters / 1000:.1f} km"
+
+
+def estimate_leg(origin: Coords, destination: Coords, mode: str) -> Dict[str, Any]:
+    """
+    Local estimate of a leg: straight-line distance times a circuity factor
+    (streets are not straight) at the mode's average speed.
+    """
+    km = haversine_km(origin, destination) * TRAVEL_TIME_SETTINGS['circuity']
+    speed_kmh = TRAVEL_TIME_SETTINGS['speeds_kmh'].get(mode, TRAVEL_TIME_SETTINGS['speeds_kmh']['walking'])
+    seconds = int(km / speed_kmh * 3600)
+    meters = int(km * 1000)
+    return {
+        'duration': format_duration(seconds),
+        'duration_seconds': seconds,
+        'distance': format_distance(meters),
+        'distance_meters': meters,
+        'mode': mode,
+        'source': 'estimate',
+    }
+
+
+class TravelTimeCache:
+    """
+    Leg results (duration / distance between two points for a mode), keyed by
+    the coordinates rounded to TRAVEL_TIME_SETTINGS['precision'] decimals
+    (4 decimals ~ 11 m) so nearby lookups of the same place share an entry.
+    Only Distance Matrix results are cached, never local estimates.
+    """
+
+    def __init__(self, cache_manager: CacheManager = None):
+        self.precision = TRAVEL_TIME_SETTINGS.get('precision', 4)
+        self.cache = cache_manager or CacheManager(
+            cache_dir=TRAVEL_TIME_SETTINGS.get('cache_dir'),
+            max_size=TRAVEL_TIME_SETTINGS.get('max_size'),
+            ttl=TRAVEL_TIME_SETTINGS.get('ttl'),
+        )
+
+    def _key(self, origin: Coords, destination: Coords, mode: str) -> str:
+        p = self.precision
+        return (f"leg:{mode}:{origin[0]:.{p}f},{origin[1]:.{p}f}"
+                f":{destination[0]:.{p}f},{destination[1]:.{p}f}")
+
+    def get(self, origin: Coords, destination: Coords, mode: str) -> Optional[Dict[str, Any]]:
+        leg = self.cache.get(self._key(origin, destination, mode))
+        return dict(leg, source='cache') if leg else None
+
+    def put(self, origin: Coords, destination: Coords, mode: str, leg: Dict[str, Any]) -> None:
+        self.cache.set(self._key(origin, destination, mode), leg)
+
+    async def aget(self, origin: Coords, destination: Coords, mode: str) -> Optional[Dict[str, Any]]:
+        """get() for coroutines (backend reads run on the cache thread pool)."""
+        leg = await self.cache.aget(self._key(origin, destination, mode))
+        return dict(leg, source='cache') if leg else None
+
+    async def aput(self, origin: Coords, destination: Coords, mode: str, leg: Dict[str, Any]) -> None:
+        await self.cache.aset(self._key(origin, destination, mode), leg)
+
+
+def matrix_leg(gmaps, origin: Coords, destination: Coords, mode: str) -> Optional[Dict[str, Any]]:
+    """
+    Blocking: one leg as a 1 x 1 Distance Matrix request, or None if the API
+    could not route it. Distance Matrix bills per element, so consecutive legs
+    go out as separate 1 x 1 requests (run concurrently by the caller) rather
+    than one N x N request of which only the diagonal would be used.
+    No departure_time, so the result only depends on the points and can be cached.
+    """
+    response = gmaps.distance_matrix(origins=[origin], destinations=[destination], mode=mode)
+    rows = response.get('rows') or []
+    elements = rows[0].get('elements') if rows else None
+    element = elements[0] if elements else {}
+    if element.get('status') != 'OK':
+        return None
+    return {
+        'duration': element['duration']['text'],
+        'duration_seconds': element['duration']['value'],
+        'distance': element['distance']['text'],
+        'distance_meters': element['distance']['value'],
+        'mode': mode,
+        'source': 'matrix',
+    }
+
+
+class QuotaGuard:
+    """Stops Distance Matrix calls for a cooldown after the API reports the quota is exhausted."""
+
+    QUOTA_STATUSES = {'OVER_QUERY_LIMIT', 'OVER_DAILY_LIMIT', 'RESOURCE_EXHAUSTED'}
+
+    def __init__(self, cooldown: float = None):
+        self.cooldown = cooldown or TRAVEL_TIME_SETTINGS.get('quota_cooldown_seconds', 600)
+        self._blocked_until = 0.0
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._blocked_until
+
+    def record_error(self, error: Exception) -> None:
+        status = getattr(error, 'status', None) or type(error).__name__
+        if status in self.QUOTA_STATUSES or status == '_OverQueryLimit':
+            self._blocked_until = time.monotonic() + self.cooldown
+            logger.warning(f"Distance Matrix quota exhausted ({status}); estimating for {self.cooldown}s")
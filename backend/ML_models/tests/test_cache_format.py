@@ -0,0 +1,70 @@
+import pickle
+import struct
+import time
+import unittest
+
+from ML_models.services.cache_format import (
+    FLAG_ZLIB,
+    FORMAT_VERSION,
+    HEADER,
+    MAGIC,
+    decode_entry,
+    decode_payload,
+    encode_entry,
+    read_header,
+)
+
+
+class CacheFormatTests(unittest.TestCase):
+    def setUp(self):
+        self.data = {"destination": "Goa", "days": [{"day": 1, "activities": ["Beach", "Fort"]}], "cost": 1250.5}
+        self.timestamp = time.time()
+
+    def test_header_fields(self):
+        buf = encode_entry(self.data, self.timestamp, 3600, schema_version=3, delta=1.5)
+
+        magic, version = struct.unpack_from("<4sB", buf)
+        self.assertEqual((magic, version), (MAGIC, FORMAT_VERSION))
+        header = read_header(buf)
+        self.assertEqual(header.schema_version, 3)
+        self.assertEqual(header.timestamp, self.timestamp)
+        self.assertEqual(header.ttl, 3600)
+        self.assertEqual(header.delta, 1.5)
+        self.assertEqual(HEADER.size + header.size, len(buf))
+
+    def test_round_trip(self):
+        buf = encode_entry(self.data, self.timestamp, 60, schema_version=1)
+        header, data = decode_entry(buf, schema_version=1)
+
+        self.assertEqual(data, self.data)
+        self.assertFalse(header.flags & FLAG_ZLIB)
+
+    def test_round_trip_compressed_from_memoryview(self):
+        data = {"text": "x" * 50000}
+        buf = encode_entry(data, self.timestamp, 60, schema_version=1, compress_threshold=1024)
+        header = read_header(memoryview(buf))
+
+        self.assertTrue(header.flags & FLAG_ZLIB)
+        self.assertLess(len(buf), 50000)
+        self.assertEqual(decode_payload(memoryview(buf), header), data)
+
+    def test_schema_version_mismatch_is_a_miss(self):
+        buf = encode_entry(self.data, self.timestamp, 60, schema_version=1)
+        self.assertIsNone(decode_entry(buf, schema_version=2))
+
+    def test_other_format_versions_are_rejected(self):
+        buf = bytearray(encode_entry(self.data, self.timestamp, 60, schema_version=1))
+        buf[4] = FORMAT_VERSION - 1
+        self.assertIsNone(read_header(bytes(buf)))
+
+    def test_legacy_and_truncated_entries_are_rejected(self):
+        legacy = pickle.dumps({"data": self.data, "timestamp": self.timestamp})
+        buf = encode_entry(self.data, self.timestamp, 60, schema_version=1)
+
+        self.assertIsNone(read_header(legacy))
+        self.assertIsNone(read_header(buf[:HEADER.size - 1]))
+        self.assertIsNone(read_header(buf[:-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
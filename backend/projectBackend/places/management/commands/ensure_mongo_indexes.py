@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from places.services.mongo_indexes import ensure_indexes, explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = "Create the declared MongoDB indexes (idempotent) and optionally explain the hot queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Print the winning plan and execution stats of each hot query.",
+        )
+        parser.add_argument(
+            "--explain-only",
+            action="store_true",
+            help="Only print the explain report; do not create indexes.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["explain_only"]:
+            report = ensure_indexes()
+            for collection, names in report.items():
+                self.stdout.write(f"{collection}: {', '.join(names) or '-'}")
+            self.stdout.write(self.style.SUCCESS("Mongo indexes are up to date."))
+
+        if options["explain"] or options["explain_only"]:
+            self.stdout.write("")
+            for row in explain_hot_queries():
+                line = (
+                    f"{row['collection']} {row['filter']}"
+                    f"{' sort=' + str(row['sort']) if row['sort'] else ''}\n"
+                    f"    plan: {row['plan']}  docs examined: {row['docs_examined']}  "
+                    f"keys examined: {row['keys_examined']}  returned: {row['returned']}  "
+                    f"time: {row['execution_ms']} ms"
+                )
+                if row["collection_scan"]:
+                    self.stdout.write(self.style.WARNING(line))
+                else:
+                    self.stdout.write(line)
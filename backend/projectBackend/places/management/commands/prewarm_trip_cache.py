@@ -0,0 +1,127 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from places.services.prewarm import (
+    OPTIONS,
+    RateBudget,
+    coverage,
+    default_plan,
+    in_window,
+    parse_window,
+    pending_targets,
+    warm_target,
+)
+from places.services.write_behind import WRITE_BEHIND
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill trip_places_cache ahead of demand for popular destinations and the most common "
+        "preference / experience combinations. Existing entries are skipped, so an interrupted "
+        "run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "destinations",
+            nargs="*",
+            help="Destinations to warm (default: most frequent trip_details.to_location values).",
+        )
+        parser.add_argument("--top", type=int, default=OPTIONS["destinations"],
+                            help="Number of destinations taken from trip history.")
+        parser.add_argument("--combos", type=int, default=OPTIONS["combos"],
+                            help="Number of (preferences, experience) combinations per destination.")
+        parser.add_argument("--per-minute", type=float, default=OPTIONS["per_minute"],
+                            help="Rate budget: cache entries built per minute.")
+        parser.add_argument("--max-entries", type=int, default=None,
+                            help="Stop after building this many entries.")
+        parser.add_argument("--window", default=OPTIONS["window"],
+                            help='Only build inside this local time window, e.g. "01:00-06:00".')
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep running: wait for the window, re-plan and warm again every --interval seconds.")
+        parser.add_argument("--interval", type=int, default=3600,
+                            help="Seconds between passes with --loop.")
+        parser.add_argument("--report", action="store_true",
+                            help="Only print the coverage report.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="List the entries that would be built.")
+
+    def handle(self, *args, **options):
+        try:
+            window = parse_window(options["window"])
+        except ValueError:
+            raise CommandError(f'Invalid --window {options["window"]!r}; expected "HH:MM-HH:MM"')
+
+        while True:
+            if not options["report"] and not in_window(window):
+                if not options["loop"]:
+                    self.stdout.write(f"Outside the off-peak window {options['window']}; nothing built.")
+                    return
+                time.sleep(60)
+                continue
+
+            # Re-planned every pass so new trip history is picked up
+            plan = default_plan(options["destinations"], options["top"], options["combos"])
+            if not plan:
+                self.stdout.write(self.style.WARNING("Nothing to warm: no destinations given or in trip history."))
+                return
+
+            if options["report"]:
+                self._report(plan, detailed=True)
+                return
+
+            self._run_pass(plan, window, options)
+            self._report(plan, detailed=False)
+
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
+
+    def _run_pass(self, plan, window, options):
+        budget = RateBudget(options["per_minute"], options["max_entries"])
+        built = failed = 0
+
+        for target in pending_targets(plan):
+            if budget.exhausted():
+                self.stdout.write(f"Entry budget of {options['max_entries']} reached.")
+                break
+            if not in_window(window):
+                self.stdout.write("Off-peak window closed; stopping this pass.")
+                break
+
+            label = f"{target.destination} [{target.experience_type}] {', '.join(target.preferences) or '-'}"
+            if options["dry_run"]:
+                self.stdout.write(f"would warm {label}")
+                continue
+
+            budget.acquire()
+            started = time.perf_counter()
+            try:
+                error = warm_target(target)
+            except Exception as e:
+                error = str(e)
+
+            elapsed = time.perf_counter() - started
+            if error:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"failed {label}: {error}"))
+            else:
+                built += 1
+                self.stdout.write(f"warmed {label} ({elapsed:.1f}s)")
+
+        # Cache documents are written in the background; make sure they land before reporting
+        WRITE_BEHIND.flush(timeout=30)
+        self.stdout.write(self.style.SUCCESS(
+            f"{datetime.now():%Y-%m-%d %H:%M} pass finished: {built} built, {failed} failed"
+        ))
+
+    def _report(self, plan, detailed: bool):
+        report = coverage(plan)
+        if detailed:
+            for destination, row in report["destinations"].items():
+                line = f"{destination}: {row['cached']}/{row['planned']}"
+                self.stdout.write(line if row["cached"] == row["planned"] else self.style.WARNING(line))
+        self.stdout.write(self.style.SUCCESS(
+            f"Coverage: {report['cached']}/{report['planned']} entries ({report['ratio']:.1%}) "
+            f"across {len(report['destinations'])} destinations"
+        ))
@@ -0,0 +1,59 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from places.services import metrics
+
+
+def _endpoint_label(request) -> str:
+    """Use the matched route pattern (low cardinality) rather than the raw path."""
+    match = getattr(request, "resolver_match", None)
+    if match is not None and match.route:
+        return match.route
+    return "unmatched"
+
+
+class ServerTimingMiddleware:
+    """
+    Times every request, exposes the per-stage breakdown in a Server-Timing
+    header and feeds the process-wide histograms served by /api/metrics/.
+    Works for both sync and async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        timings, token = metrics.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        timings, token = metrics.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, response, timings, start)
+
+    @staticmethod
+    def _finish(request, response, timings, start):
+        total_ms = (time.perf_counter() - start) * 1000.0
+        # Stage descriptions can carry request details; only internal clients get them
+        response["Server-Timing"] = timings.server_timing_header(total_ms, metrics.can_read_metrics(request))
+        profile_id = getattr(request, "profile_id", None)
+        if profile_id:
+            response["X-Profile-Id"] = profile_id
+        metrics.REGISTRY.observe_request(_endpoint_label(request), timings, total_ms)
+        return response
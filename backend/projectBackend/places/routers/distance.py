@@ -1,83 +1,184 @@
+import contextvars
 import requests
-import os
-from ninja import Router, Body
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from ninja import Router, Body, Query
 from django.http import JsonResponse
-from dotenv import load_dotenv
+from places.services.geo_cache import (
+    GOOGLE_API_KEY,
+    SESSION,
+    TIMEOUT,
+    GeocodingError,
+    resolve_endpoints,
+    route_key,
+    get_route,
+    put_route,
+    routes_waypoint,
+)
+from places.services.geo_utils import (
+    ROUTES_MODE_TRANSPORT,
+    estimate_travel,
+    get_transport_profiles,
+    normalize_transport,
+)
+from places.services.metrics import stage
 
-load_dotenv()
 routes_router = Router()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-def validate_place(place_name: str):
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {
-        "address": place_name,
-        "key": GOOGLE_API_KEY
-    }
+ROUTES_URL = "https://routes.googleapis.com/directions/v2:computeRoutes"
+ROUTE_MATRIX_URL = "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix"
+TRAVEL_MODES = {"DRIVE", "WALK", "BICYCLE", "TWO_WHEELER", "TRANSIT"}
 
-    res = requests.get(url, params=params).json()
+# computeRouteMatrix limits: 50 waypoints and 625 elements per call (100 for TRANSIT)
+MATRIX_MAX_ENDPOINTS = 25
+MATRIX_CHUNK = {"TRANSIT": 10}
+MATRIX_DEFAULT_CHUNK = 25
 
-    if res["status"] != "OK":
-        return None, f"Invalid place: {place_name}"
+_matrix_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="route-matrix")
 
-    result = res["results"][0]
-    formatted_address = result["formatted_address"]
-    location = result["geometry"]["location"]   # { lat: , lng: }
 
-    return {
-        "label": formatted_address,
-        "lat": location["lat"],
-        "lng": location["lng"]
-    }, None
+def _parse_duration(value) -> int:
+    return int(str(value or "0s").replace("s", ""))
 
-@routes_router.post("/distance/")
-def get_route_distance(request, payload: dict = Body(...)):
-    origin = payload.get("origin")
-    destination = payload.get("destination")
 
-    if not origin or not destination:
-        return JsonResponse({"error": "origin and destination required"}, status=400)
+def compute_route(start_info: dict, end_info: dict, mode: str):
+    """
+    Distance / duration between two resolved endpoints, from the route cache
+    or one computeRoutes call. Returns (route, error).
+    """
+    key = route_key(start_info, end_info, mode)
+    cached = get_route(key)
+    if cached:
+        return cached, None
 
-    # Validate origin
-    start_info, err1 = validate_place(origin)
-    if err1:
-        return JsonResponse({"error": err1}, status=400)
-
-    # Validate destination
-    end_info, err2 = validate_place(destination)
-    if err2:
-        return JsonResponse({"error": err2}, status=400)
-
-    # Call Routes API
-    url = "https://routes.googleapis.com/directions/v2:computeRoutes"
-    
     headers = {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": GOOGLE_API_KEY,
         "X-Goog-FieldMask": "routes.distanceMeters,routes.duration"
     }
-
     body = {
-        "origin": { "address": start_info["label"] },
-        "destination": { "address": end_info["label"] }
+        "origin": routes_waypoint(start_info),
+        "destination": routes_waypoint(end_info),
+        "travelMode": mode,
     }
 
-    response = requests.post(url, json=body, headers=headers).json()
+    try:
+        with stage("routes_api"):
+            response = SESSION.post(ROUTES_URL, json=body, headers=headers, timeout=TIMEOUT).json()
+    except (requests.RequestException, ValueError) as e:
+        return None, {"error": "Could not compute route", "details": str(e)}
 
-    if "routes" not in response:
-        return JsonResponse({"error": "Could not compute route", "details": response}, status=500)
+    if not response.get("routes"):
+        return None, {"error": "Could not compute route", "details": response}
 
     route = response["routes"][0]
-    distance_m = route["distanceMeters"]
-    duration_s = route["duration"]
+    result = {
+        "distance_meters": route.get("distanceMeters", 0),
+        "duration_seconds": _parse_duration(route.get("duration")),
+    }
+    put_route(key, result)
+    return result, None
+
+
+def _fetch_matrix_block(origins: List[dict], destinations: List[dict], mode: str) -> List[dict]:
+    """One computeRouteMatrix call; returns its elements (indexes relative to the block)."""
+    headers = {
+        "Content-Type": "application/json",
+        "X-Goog-Api-Key": GOOGLE_API_KEY,
+        "X-Goog-FieldMask": "originIndex,destinationIndex,distanceMeters,duration,condition,status",
+    }
+    body = {
+        "origins": [{"waypoint": routes_waypoint(info)} for info in origins],
+        "destinations": [{"waypoint": routes_waypoint(info)} for info in destinations],
+        "travelMode": mode,
+    }
+    with stage("route_matrix_api", desc=f"{len(origins)}x{len(destinations)}"):
+        response = SESSION.post(ROUTE_MATRIX_URL, json=body, headers=headers, timeout=TIMEOUT).json()
+    if not isinstance(response, list):
+        raise ValueError(response.get("error", response) if isinstance(response, dict) else response)
+    return response
+
 
-    seconds = int(duration_s.replace("s", ""))
+def compute_route_matrix(origins: List[dict], destinations: List[dict], mode: str) -> Dict[str, list]:
+    """
+    Distance / duration for every (origin, destination) pair of resolved
+    endpoints. Cells come from the route cache where possible; the rest is
+    fetched in computeRouteMatrix blocks (in parallel), covering only the
+    origins and destinations that still have missing cells.
+    Cells that cannot be routed are None.
+    """
+    rows, cols = len(origins), len(destinations)
+    distances = [[None] * cols for _ in range(rows)]
+    durations = [[None] * cols for _ in range(rows)]
+    keys = [[route_key(o, d, mode) for d in destinations] for o in origins]
+
+    missing = set()
+    for i in range(rows):
+        for j in range(cols):
+            cached = get_route(keys[i][j])
+            if cached:
+                distances[i][j] = cached["distance_meters"]
+                durations[i][j] = cached["duration_seconds"]
+            else:
+                missing.add((i, j))
+
+    chunk = MATRIX_CHUNK.get(mode, MATRIX_DEFAULT_CHUNK)
+    miss_rows = sorted({i for i, _ in missing})
+    miss_cols = sorted({j for _, j in missing})
+    blocks: List[Tuple[List[int], List[int]]] = []
+    for r in range(0, len(miss_rows), chunk):
+        for c in range(0, len(miss_cols), chunk):
+            row_ids, col_ids = miss_rows[r:r + chunk], miss_cols[c:c + chunk]
+            if any((i, j) in missing for i in row_ids for j in col_ids):
+                blocks.append((row_ids, col_ids))
+
+    # Blocks run in a copy of the request context so their stage() timings are recorded
+    futures = [
+        _matrix_executor.submit(
+            contextvars.copy_context().run,
+            _fetch_matrix_block, [origins[i] for i in row_ids], [destinations[j] for j in col_ids], mode
+        )
+        for row_ids, col_ids in blocks
+    ]
+    failed = 0
+    for (row_ids, col_ids), future in zip(blocks, futures):
+        try:
+            elements = future.result()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Route matrix block failed: {e}")
+            failed += 1
+            continue
+        for element in elements:
+            if element.get("condition") != "ROUTE_EXISTS":
+                continue
+            i, j = row_ids[element.get("originIndex", 0)], col_ids[element.get("destinationIndex", 0)]
+            result = {
+                "distance_meters": element.get("distanceMeters", 0),
+                "duration_seconds": _parse_duration(element.get("duration")),
+            }
+            put_route(keys[i][j], result)
+            distances[i][j] = result["distance_meters"]
+            durations[i][j] = result["duration_seconds"]
+
+    return {
+        "distance_meters": distances,
+        "duration_seconds": durations,
+        "cached_cells": rows * cols - len(missing),
+        "api_calls": len(blocks),
+        "failed_calls": failed,
+    }
+
+
+def _distance_response(start_info: dict, end_info: dict, route: dict, **extra) -> JsonResponse:
+    distance_m = route["distance_meters"]
+    seconds = route["duration_seconds"]
     hours = seconds // 3600
     minutes = (seconds % 3600) // 60
 
     data = {
         "origin": start_info["label"],
         "destination": end_info["label"],
+        **extra,
         "distance_meters": distance_m,
         "distance_km": round(distance_m / 1000, 2),
         "duration_text": f"{hours} hr {minutes} min",
@@ -85,3 +186,108 @@ def get_route_distance(request, payload: dict = Body(...)):
     }
 
     return JsonResponse(data)
+
+
+def _flag_is_set(value) -> bool:
+    """Body flags may arrive as JSON booleans or strings ("false" must stay False)."""
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+@routes_router.post("/distance/")
+def get_route_distance(request, payload: dict = Body(...), estimate: bool = Query(False)):
+    """
+    Route distance / duration. origin and destination can each be an address,
+    {"lat", "lng"} or {"place_id"}; optional mode (DRIVE, WALK, BICYCLE,
+    TWO_WHEELER, TRANSIT; default DRIVE) or transport (a mode_of_transport
+    value: car, train, flight, ...).
+
+    With estimate=true (query or body) no route is computed: a cached exact
+    route is returned if there is one, otherwise a great-circle estimate
+    using the transport's circuity and speed profile ("exact": false).
+    """
+    origin = payload.get("origin")
+    destination = payload.get("destination")
+    estimate = estimate or _flag_is_set(payload.get("estimate"))
+
+    if not origin or not destination:
+        return JsonResponse({"error": "origin and destination required"}, status=400)
+
+    transport = None
+    default_mode = "DRIVE"
+    if payload.get("transport"):
+        profiles = get_transport_profiles()
+        transport = normalize_transport(payload["transport"])
+        if transport not in profiles:
+            return JsonResponse(
+                {"error": f"Invalid transport: {payload['transport']}", "transports": sorted(profiles)},
+                status=400,
+            )
+        # Profiles added through settings.TRANSPORT_PROFILES may omit routes_mode (400 below)
+        default_mode = profiles[transport].get("routes_mode")
+    mode = str(payload.get("mode") or default_mode or "").upper() or None
+
+    if mode is not None and mode not in TRAVEL_MODES:
+        return JsonResponse({"error": f"Invalid mode: {mode}", "modes": sorted(TRAVEL_MODES)}, status=400)
+    if mode is None and not estimate:
+        return JsonResponse({"error": f"No road route for {transport}; use estimate=true"}, status=400)
+
+    # Resolve both endpoints concurrently (cached geocodes / coordinates need no call)
+    try:
+        (start_info, err1), (end_info, err2) = resolve_endpoints([origin, destination])
+    except GeocodingError as e:
+        return JsonResponse({"error": "Geocoding failed", "details": str(e)}, status=502)
+    if err1 or err2:
+        return JsonResponse({"error": err1 or err2}, status=400)
+
+    if estimate:
+        cached = get_route(route_key(start_info, end_info, mode)) if mode else None
+        if cached:
+            return _distance_response(start_info, end_info, cached, mode=mode, exact=True)
+        transport = transport or ROUTES_MODE_TRANSPORT[mode]
+        route = estimate_travel(start_info["lat"], start_info["lng"], end_info["lat"], end_info["lng"], transport)
+        return _distance_response(start_info, end_info, route, mode=mode, transport=transport, exact=False)
+
+    route, error = compute_route(start_info, end_info, mode)
+    if error:
+        return JsonResponse(error, status=500)
+
+    return _distance_response(start_info, end_info, route, mode=mode, exact=True)
+
+
+@routes_router.post("/matrix/")
+def get_route_matrix(request, payload: dict = Body(...)):
+    """
+    Distances / durations between lists of origins and destinations (up to 25
+    each; same endpoint forms and modes as /distance/). Returns row-major
+    arrays: distance_meters[i][j] / duration_seconds[i][j] for origins[i] ->
+    destinations[j], null where no route was found.
+    """
+    origins = payload.get("origins")
+    destinations = payload.get("destinations")
+    mode = str(payload.get("mode") or "DRIVE").upper()
+
+    if not isinstance(origins, list) or not isinstance(destinations, list) or not origins or not destinations:
+        return JsonResponse({"error": "origins and destinations (non-empty lists) required"}, status=400)
+    if len(origins) > MATRIX_MAX_ENDPOINTS or len(destinations) > MATRIX_MAX_ENDPOINTS:
+        return JsonResponse({"error": f"At most {MATRIX_MAX_ENDPOINTS} origins and destinations"}, status=400)
+    if mode not in TRAVEL_MODES:
+        return JsonResponse({"error": f"Invalid mode: {mode}", "modes": sorted(TRAVEL_MODES)}, status=400)
+
+    try:
+        resolved = resolve_endpoints(origins + destinations)
+    except GeocodingError as e:
+        return JsonResponse({"error": "Geocoding failed", "details": str(e)}, status=502)
+    errors = [err for _, err in resolved if err]
+    if errors:
+        return JsonResponse({"error": "Invalid endpoints", "details": errors}, status=400)
+
+    start_infos = [info for info, _ in resolved[:len(origins)]]
+    end_infos = [info for info, _ in resolved[len(origins):]]
+    matrix = compute_route_matrix(start_infos, end_infos, mode)
+
+    return JsonResponse({
+        "origins": [info["label"] for info in start_infos],
+        "destinations": [info["label"] for info in end_infos],
+        "mode": mode,
+        **matrix,
+    })
@@ -0,0 +1,31 @@
+from ninja import Router, Query
+from django.http import HttpResponse, JsonResponse
+from places.services.metrics import REGISTRY, can_read_metrics
+from places.services.write_behind import WRITE_BEHIND
+from places.services import geo_cache
+
+# Ninja Routers
+metrics_router = Router()
+
+@metrics_router.get("/")
+def get_metrics(request, format: str = Query("prometheus")):
+    """
+    Stage latency histograms labelled by endpoint, cache source and stage.
+    ?format=json returns p50/p95/p99 estimates instead of the Prometheus text format.
+    Write-behind queue counters and geo cache sizes are included in both formats.
+    Staff users and METRICS_ALLOWED_NETWORKS only.
+    """
+    if not can_read_metrics(request):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    write_behind = WRITE_BEHIND.stats()
+    geo = geo_cache.stats()
+    if format == "json":
+        return {"metrics": REGISTRY.snapshot(), "write_behind": write_behind, "geo_cache": geo}
+
+    lines = [f"travai_write_behind_{name} {value}" for name, value in write_behind.items()]
+    lines += [f"travai_geo_cache_{name} {value}" for name, value in geo.items()]
+    return HttpResponse(
+        REGISTRY.render_prometheus() + "\n".join(lines) + "\n",
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -1,11 +1,48 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Dict, Any, List
+from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from django.http import JsonResponse, StreamingHttpResponse
 from places.schemas import TripDetailsSchema
-from datetime import datetime
+from datetime import date, datetime
 import projectBackend.settings as settings
 from ninja import Router, Body
 
 # Ninja Routers
 trip_router = Router()
 
+# --- Date Conversion ---
+TRIP_DATE_FIELDS = ('start_date', 'end_date', 'to_date')
+
+
+@lru_cache(maxsize=4096)
+def parse_trip_date(value: str) -> Optional[datetime]:
+    """YYYY-MM-DD string -> midnight datetime, or None if it does not parse. Memoized: bulk loads repeat dates a lot."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (ValueError, TypeError):
+        return None
+
+
+def convert_trip_dates(trip_docs: List[Dict[str, Any]]) -> None:
+    """Convert the date strings of every document to datetime (in place) for MongoDB."""
+    for trip_doc in trip_docs:
+        for field in TRIP_DATE_FIELDS:
+            value = trip_doc.get(field)
+            if not value or not isinstance(value, str):
+                continue
+            parsed = parse_trip_date(value)
+            if parsed is None:
+                # Keep the original string if parsing fails
+                print(f"Warning: Could not parse {field}: {value}")
+            else:
+                trip_doc[field] = parsed
+
+
 # --- Trip Endpoints ---
 @trip_router.post("/add-trip/")
 def add_trip(request, payload: TripDetailsSchema):
@@ -15,41 +52,297 @@ def add_trip(request, payload: TripDetailsSchema):
     trip_doc = payload.dict()
 
     # Convert date strings to datetime for MongoDB compatibility
-    date_fields = ['start_date', 'end_date', 'to_date']
-    
-    for field in date_fields:
-        if field in trip_doc and trip_doc[field]:
-            try:
-                # Parse the date string (format: "YYYY-MM-DD")
-                date_obj = datetime.strptime(trip_doc[field], "%Y-%m-%d")
-                trip_doc[field] = datetime.combine(date_obj, datetime.min.time())
-            except (ValueError, TypeError) as e:
-                print(f"Warning: Could not parse {field}: {trip_doc[field]}. Error: {e}")
-                # Keep the original string if parsing fails
+    convert_trip_dates([trip_doc])
 
     # Insert into MongoDB
     result = settings.MONGO_DB.trip_details.insert_one(trip_doc)
 
     # Prepare the document for a clean JSON response
     trip_doc['_id'] = str(result.inserted_id)
-    
+
     # Convert datetime objects back to ISO format strings for response
-    for field in date_fields:
+    for field in TRIP_DATE_FIELDS:
         if field in trip_doc and isinstance(trip_doc[field], datetime):
             trip_doc[field] = trip_doc[field].isoformat()
 
     return {"message": "Trip saved successfully", "data": trip_doc}
 
+
+# --- Bulk Ingestion ---
+BULK_MAX_TRIPS = 5000
+BULK_BATCH_SIZE = 500
+# Checked before the body is read or parsed (about 2 KB per trip at BULK_MAX_TRIPS)
+BULK_MAX_BYTES = 10 * 1024 * 1024
+
+# Place-data prefetches run one at a time in the background
+_prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trip-prefetch")
+
+
+class BulkBodyTooLarge(Exception):
+    pass
+
+
+def _read_bulk_body(request) -> bytes:
+    """
+    Raw body of at most BULK_MAX_BYTES. Content-Length is checked before
+    anything is read; bodies without one are cut off one byte past the limit.
+    """
+    try:
+        declared = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        declared = 0
+    if declared > BULK_MAX_BYTES:
+        raise BulkBodyTooLarge()
+    body = request.read(BULK_MAX_BYTES + 1)
+    if len(body) > BULK_MAX_BYTES:
+        raise BulkBodyTooLarge()
+    return body
+
+
+def _parse_bulk_body(request) -> List[Any]:
+    """JSON array, or NDJSON (one trip per line). Raises ValueError on malformed input."""
+    body = _read_bulk_body(request).decode("utf-8").strip()
+    if not body:
+        return []
+    if body.startswith("["):
+        items = json.loads(body)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of trips")
+        return items
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+
+def _prefetch_trip_places(trip_docs: List[Dict[str, Any]]) -> int:
+    """
+    Schedule place-data fetches for (destination, preferences, experience)
+    combinations that have no cached response yet. Returns how many were scheduled.
+    """
+    # Imported lazily: views pulls in the Google / Gemini clients
+    from places.views import get_preference_based_places
+    from places.services.db_helpers import build_cache_key
+
+    combos = {}
+    for trip in trip_docs:
+        destination = trip.get("to_location")
+        if not destination:
+            continue
+        prefs = trip.get("travel_preferences") or []
+        experience = trip.get("experience_type") or "moderate"
+        combos.setdefault(build_cache_key(destination, prefs, experience), (destination, prefs, experience))
+
+    if not combos:
+        return 0
+
+    cached = {
+        doc["_id"] for doc in
+        settings.MONGO_DB.trip_places_cache.find({"_id": {"$in": list(combos)}}, {"_id": 1})
+    }
+    missing = [combo for key, combo in combos.items() if key not in cached]
+
+    for destination, prefs, experience in missing:
+        _prefetch_executor.submit(
+            get_preference_based_places, None, destination, ",".join(prefs), experience
+        )
+    return len(missing)
+
+
+@trip_router.post("/add-trips/bulk/")
+def add_trips_bulk(request, prefetch: bool = False):
+    """
+    Saves many trips in one call. The body is a JSON array of trips or NDJSON
+    (one trip per line), each validated with TripDetailsSchema. Valid trips
+    are written with unordered insert_many batches, so one bad item never
+    aborts the rest; every item gets its own result.
+    With ?prefetch=true, place data for uncached destinations is fetched in the background.
+    """
+    try:
+        items = _parse_bulk_body(request)
+    except BulkBodyTooLarge:
+        return JsonResponse({"error": f"Body larger than {BULK_MAX_BYTES} bytes"}, status=413)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({"error": f"Invalid body: {e}"}, status=400)
+
+    if len(items) > BULK_MAX_TRIPS:
+        return JsonResponse({"error": f"At most {BULK_MAX_TRIPS} trips per request"}, status=400)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    valid_docs: List[Dict[str, Any]] = []
+    valid_index: List[int] = []
+
+    for i, item in enumerate(items):
+        try:
+            valid_docs.append(TripDetailsSchema.model_validate(item).dict())
+            valid_index.append(i)
+        except ValidationError as e:
+            results[i] = {
+                "index": i,
+                "status": "invalid",
+                "errors": e.errors(include_url=False, include_context=False, include_input=False),
+            }
+
+    convert_trip_dates(valid_docs)
+
+    for start in range(0, len(valid_docs), BULK_BATCH_SIZE):
+        batch = valid_docs[start:start + BULK_BATCH_SIZE]
+        failed: Dict[int, str] = {}
+        try:
+            # insert_many sets _id on every document before sending the batch
+            settings.MONGO_DB.trip_details.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                failed[err["index"]] = err.get("errmsg", "write failed")
+
+        for offset, doc in enumerate(batch):
+            i = valid_index[start + offset]
+            if offset in failed:
+                results[i] = {"index": i, "status": "failed", "error": failed[offset]}
+            else:
+                results[i] = {"index": i, "status": "inserted", "_id": str(doc["_id"])}
+
+    inserted_docs = [doc for doc, i in zip(valid_docs, valid_index) if results[i]["status"] == "inserted"]
+    summary = {
+        "received": len(items),
+        "inserted": len(inserted_docs),
+        "invalid": sum(1 for r in results if r["status"] == "invalid"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+    }
+    if prefetch:
+        summary["prefetch_scheduled"] = _prefetch_trip_places(inserted_docs)
+
+    return {"message": "Bulk trip import finished", **summary, "results": results}
+
+
+# --- Trip Listing ---
+TRIPS_DEFAULT_LIMIT = 50
+TRIPS_MAX_LIMIT = 500
+EXPORT_BATCH_SIZE = 500
+
+
+def _json_default(value: Any) -> Any:
+    """json.dumps default for BSON values: dates as ISO strings, ObjectId and anything else as str."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _serialize_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _serialize_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_serialize_value(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return _json_default(value)
+
+
+def _serialize_trip(trip: Dict[str, Any]) -> Dict[str, Any]:
+    """Make ObjectId, datetime and other BSON values JSON serializable, at any depth."""
+    return _serialize_value(trip)
+
+
+def _build_trip_filter(user_id, start_from, start_to) -> Dict[str, Any]:
+    """Mongo filter for the optional user / start-date range filters. Raises ValueError on bad dates."""
+    query: Dict[str, Any] = {}
+    if user_id:
+        query["user_id"] = user_id
+
+    date_range = {}
+    if start_from:
+        date_range["$gte"] = datetime.strptime(start_from, "%Y-%m-%d")
+    if start_to:
+        date_range["$lte"] = datetime.strptime(start_to, "%Y-%m-%d")
+    if date_range:
+        query["start_date"] = date_range
+    return query
+
+
+def _build_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Comma separated field names -> Mongo projection (unknown names are ignored)."""
+    if not fields:
+        return None
+    allowed = set(TripDetailsSchema.model_fields)
+    wanted = [f.strip() for f in fields.split(",") if f.strip() in allowed]
+    return {f: 1 for f in wanted} or None
+
+
 @trip_router.get("/trips/")
-def list_trips(request):
+def list_trips(
+    request,
+    limit: int = TRIPS_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    user_id: Optional[str] = None,
+    start_from: Optional[str] = None,
+    start_to: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     """
-    Lists all trips, ensuring ObjectId and datetime are JSON serializable.
+    Lists trips one page at a time, ordered by _id.
+    Pass the returned `next_cursor` as `cursor` to get the next page;
+    it is null on the last page. Without `limit` only the first
+    TRIPS_DEFAULT_LIMIT trips are returned; use /trips/export/ for all of them.
     """
-    trips = []
-    for trip in settings.MONGO_DB.trip_details.find({}):
-        trip['_id'] = str(trip['_id'])
-        if isinstance(trip.get('date'), datetime):
-            trip['date'] = trip['date'].isoformat()
-        trips.append(trip)
-    return {"trips": trips}
+    limit = max(1, min(limit, TRIPS_MAX_LIMIT))
+
+    try:
+        query = _build_trip_filter(user_id, start_from, start_to)
+        if cursor:
+            query["_id"] = {"$gt": ObjectId(cursor)}
+    except (InvalidId, TypeError):
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "Dates must be in YYYY-MM-DD format"}, status=400)
+
+    # Fetch one extra document to know whether another page exists
+    docs = list(
+        settings.MONGO_DB.trip_details
+        .find(query, _build_projection(fields))
+        .sort("_id", 1)
+        .limit(limit + 1)
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = str(docs[-1]["_id"]) if has_more else None
+
+    return {
+        "trips": [_serialize_trip(trip) for trip in docs],
+        "next_cursor": next_cursor,
+    }
+
+
+@trip_router.get("/trips/export/")
+def export_trips(
+    request,
+    user_id: Optional[str] = None,
+    start_from: Optional[str] = None,
+    start_to: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Streams every matching trip as one JSON array without holding the
+    result set in memory.
+    """
+    try:
+        query = _build_trip_filter(user_id, start_from, start_to)
+    except ValueError:
+        return JsonResponse({"error": "Dates must be in YYYY-MM-DD format"}, status=400)
+
+    projection = _build_projection(fields)
+
+    def generate():
+        trips = (
+            settings.MONGO_DB.trip_details
+            .find(query, projection)
+            .sort("_id", 1)
+            .batch_size(EXPORT_BATCH_SIZE)
+        )
+        try:
+            yield "["
+            for i, trip in enumerate(trips):
+                yield ("," if i else "") + json.dumps(trip, default=_json_default)
+            yield "]"
+        finally:
+            trips.close()
 
+    response = StreamingHttpResponse(generate(), content_type="application/json")
+    response["Content-Disposition"] = 'attachment; filename="trips.json"'
+    return response
@@ -3,6 +3,11 @@ from typing import List, Optional
 from ninja import Schema
 
 class TripDetailsSchema(Schema):
+    # -----------------
+    # Owner
+    # -----------------
+    user_id: Optional[str] = None
+
     # -----------------
     # Location
     # -----------------
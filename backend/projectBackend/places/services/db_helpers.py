@@ -1,6 +1,16 @@
-from typing import Dict, Any, List
+import json
+import zlib
+from typing import Dict, Any, List, Optional, Sequence, Union
+from bson.binary import Binary
 from django.conf import settings
-from datetime import datetime
+from datetime import date, datetime, timezone
+from places.services.metrics import stage
+from places.services.write_behind import WRITE_BEHIND
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is always available
+    zstandard = None
 
 def build_cache_key(destination: str, preferences_list: List[str], experience_type: str) -> str:
     """
@@ -12,6 +22,105 @@ def build_cache_key(destination: str, preferences_list: List[str], experience_ty
     return f"{norm_dest}__{norm_exp}__{'|'.join(norm_prefs)}"
 
 
+# ======================================================================
+# STORAGE CODEC (bulky sections as compressed compact JSON)
+# ======================================================================
+# Sections that hold the full place dicts / weather; everything else stays
+# a plain, queryable field.
+PACKED_SECTIONS = ("reference_places", "recommended_places", "generated_queries", "weather")
+# 2: datetime / date values are tagged so they decode back to the same type (1 stored them as str)
+PACKED_FORMAT_VERSION = 2
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def _storage_codec() -> Optional[str]:
+    """Codec configured by TRIP_CACHE_COMPRESSION ("zstd", "zlib" or None); zstd falls back to zlib if not installed."""
+    codec = getattr(settings, "TRIP_CACHE_COMPRESSION", None)
+    if codec == "zstd" and zstandard is None:
+        return "zlib"
+    return codec if codec in ("zstd", "zlib") else None
+
+
+def _compress(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return zlib.compress(raw, ZLIB_LEVEL)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Cached document is zstd compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _encode_value(value: Any) -> Any:
+    """json.dumps default: tag dates so unpack_sections restores them; other values (ObjectId ...) as str."""
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    return str(value)
+
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return date.fromisoformat(obj["$date"])
+    return obj
+
+
+def pack_sections(doc: Dict[str, Any], codec: str) -> Dict[str, Any]:
+    """Move PACKED_SECTIONS of `doc` into doc["packed"] as one compressed blob each."""
+    sections = {}
+    for name in PACKED_SECTIONS:
+        if name in doc:
+            raw = json.dumps(doc.pop(name), separators=(",", ":"), default=_encode_value).encode("utf-8")
+            sections[name] = Binary(_compress(raw, codec))
+    doc["packed"] = {"codec": codec, "format": PACKED_FORMAT_VERSION, "sections": sections}
+    return doc
+
+
+def unpack_sections(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of pack_sections. Documents stored without a codec pass through unchanged."""
+    packed = doc.pop("packed", None)
+    if not packed:
+        return doc
+    codec = packed.get("codec", "zlib")
+    object_hook = _decode_object if packed.get("format", 1) >= 2 else None
+    for name, data in (packed.get("sections") or {}).items():
+        doc[name] = json.loads(_decompress(bytes(data), codec), object_hook=object_hook)
+    return doc
+
+
+# ======================================================================
+# PROJECTION PROFILES (partial loads per caller)
+# ======================================================================
+LOAD_PROFILES: Dict[str, Sequence[str]] = {
+    # /tour/itinerary/generate/: places for the day plan, coordinates + weather as fallback
+    "itinerary": ("destination", "reference_places", "coordinates", "weather"),
+    # custom itinerary (AI based): weather is always refetched for the trip length
+    "itinerary_custom": ("destination", "reference_places", "coordinates"),
+}
+
+
+def build_projection(fields: Sequence[str]) -> Dict[str, int]:
+    """
+    Mongo projection for top-level response fields. Packed sections live under
+    packed.sections.<name>, so each field is requested in both layouts.
+    """
+    projection = {"packed.codec": 1, "packed.format": 1}
+    for field in fields:
+        projection[field] = 1
+        if field in PACKED_SECTIONS:
+            projection[f"packed.sections.{field}"] = 1
+    return projection
+
+
 def save_trip_response(cache_key: str, response_data: Dict[str, Any]) -> None:
     """
     Save or update the full response for a given cache_key.
@@ -21,20 +130,52 @@ def save_trip_response(cache_key: str, response_data: Dict[str, Any]) -> None:
     doc["_id"] = cache_key
     doc["cache_key"] = cache_key
     doc["last_updated"] = datetime.now().isoformat()
+    # BSON date for the TTL index on trip_places_cache (see mongo_indexes)
+    doc["cached_at"] = datetime.now(timezone.utc)
 
-    settings.MONGO_DB.trip_places_cache.update_one(
-        {"_id": cache_key},
-        {"$set": doc},
-        upsert=True,
-    )
+    # Drop whichever layout the previous version of this document used
+    codec = _storage_codec()
+    if codec:
+        with stage("compress"):
+            pack_sections(doc, codec)
+        stale = {name: "" for name in PACKED_SECTIONS}
+    else:
+        stale = {"packed": ""}
 
+    # Written by the background worker; load_trip_response sees it while pending
+    with stage("mongo_save", desc="queued"):
+        WRITE_BEHIND.upsert("trip_places_cache", cache_key, doc, stale)
 
-def load_trip_response(cache_key: str) -> Dict[str, Any] | None:
+
+def load_trip_response(
+    cache_key: str,
+    projection: Union[str, Sequence[str], None] = None,
+) -> Dict[str, Any] | None:
     """
     Load a previously saved response for this cache_key, if available.
+    Compressed sections are decoded transparently.
+
+    projection: a LOAD_PROFILES name or a list of top-level fields; only those
+    fields (plus _id) are fetched and decoded. None loads the whole document.
     """
-    doc = settings.MONGO_DB.trip_places_cache.find_one({"_id": cache_key})
+    if isinstance(projection, str):
+        projection = LOAD_PROFILES[projection]
+    mongo_projection = build_projection(projection) if projection else None
+
+    doc = WRITE_BEHIND.get_pending("trip_places_cache", cache_key)
+    if doc is not None and projection:
+        doc = {k: v for k, v in doc.items() if k in projection or k in ("_id", "packed")}
+        if doc.get("packed"):
+            # Same fields as the Mongo projection: only decode the projected sections
+            sections = doc["packed"].get("sections") or {}
+            doc["packed"]["sections"] = {k: v for k, v in sections.items() if k in projection}
+    if doc is None:
+        with stage("mongo_load"):
+            doc = settings.MONGO_DB.trip_places_cache.find_one({"_id": cache_key}, mongo_projection)
     if doc:
         doc["_id"] = str(doc["_id"])
+        if "packed" in doc:
+            with stage("decompress"):
+                unpack_sections(doc)
         return doc
     return None
\ No newline at end of file
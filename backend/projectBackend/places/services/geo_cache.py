@@ -0,0 +1,207 @@
+# places/services/geo_cache.py
+import contextvars
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union
+import requests
+from cachetools import TTLCache
+from django.conf import settings
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from places.services.metrics import stage
+
+load_dotenv()
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+_DEFAULTS = {
+    "geocode_ttl": 7 * 24 * 3600,
+    "geocode_maxsize": 10000,
+    "route_ttl": 24 * 3600,
+    "route_maxsize": 20000,
+    "timeout": (3.05, 10),      # (connect, read) seconds for Google HTTP calls
+    "pool_size": 20,
+}
+OPTIONS = {**_DEFAULTS, **getattr(settings, "GEO_CACHE", {})}
+
+# Decimals kept in coordinate cache keys (5 decimals ~ 1 m)
+COORD_PRECISION = 5
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class GeocodingError(Exception):
+    """Geocoding API failed (quota, denied key, network); not the same as "no such place"."""
+
+
+# ======================================================================
+# SHARED HTTP SESSION
+# ======================================================================
+def _build_session() -> requests.Session:
+    """Keep-alive connection pool for Google APIs; retries idempotent calls on 5xx / connection errors."""
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.2, status_forcelist=(500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=OPTIONS["pool_size"], max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = _build_session()
+TIMEOUT = OPTIONS["timeout"]
+
+# Resolves the endpoints of one request in parallel
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="geocode")
+
+
+# ======================================================================
+# GEOCODE CACHE
+# ======================================================================
+_geocode_cache: TTLCache = TTLCache(maxsize=OPTIONS["geocode_maxsize"], ttl=OPTIONS["geocode_ttl"])
+_geocode_lock = threading.Lock()
+_NOT_FOUND = object()  # cached "ZERO_RESULTS"
+
+
+def normalize_address(address: str) -> str:
+    return _WHITESPACE_RE.sub(" ", (address or "").strip().lower())
+
+
+def _geocode_request(params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    params = {**params, "key": GOOGLE_API_KEY}
+    try:
+        with stage("geocode"):
+            res = SESSION.get(GEOCODE_URL, params=params, timeout=TIMEOUT).json()
+    except (requests.RequestException, ValueError) as e:
+        raise GeocodingError(str(e)) from e
+
+    if res.get("status") == "ZERO_RESULTS":
+        return None
+    if res.get("status") != "OK":
+        raise GeocodingError(f"{res.get('status')}: {res.get('error_message', '')}".strip())
+
+    result = res["results"][0]
+    location = result["geometry"]["location"]
+    return {
+        "label": result.get("formatted_address"),
+        "lat": location["lat"],
+        "lng": location["lng"],
+        "place_id": result.get("place_id"),
+    }
+
+
+def _cached_geocode(cache_key: str, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    with _geocode_lock:
+        hit = _geocode_cache.get(cache_key)
+    if hit is _NOT_FOUND:
+        return None
+    if hit is not None:
+        return dict(hit)
+
+    result = _geocode_request(params)
+    with _geocode_lock:
+        _geocode_cache[cache_key] = result if result is not None else _NOT_FOUND
+    return dict(result) if result else None
+
+
+def geocode(address: str) -> Optional[Dict[str, Any]]:
+    """
+    {label, lat, lng, place_id} for an address, or None if Google finds nothing.
+    Results (including "not found") are cached by normalized address.
+    Raises GeocodingError when the API call itself fails.
+    """
+    return _cached_geocode(f"address:{normalize_address(address)}", {"address": address})
+
+
+def geocode_place_id(place_id: str) -> Optional[Dict[str, Any]]:
+    """Same as geocode, for a Google place id."""
+    return _cached_geocode(f"place_id:{place_id}", {"place_id": place_id})
+
+
+# ======================================================================
+# ENDPOINTS (address | {lat, lng} | {place_id})
+# ======================================================================
+Endpoint = Union[str, Dict[str, Any]]
+
+
+def resolve_endpoint(endpoint: Endpoint) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Resolve a route endpoint to {label, lat, lng, place_id}.
+    Coordinates are used as given (no API call). Returns (info, error).
+    """
+    if isinstance(endpoint, dict) and endpoint.get("place_id"):
+        info = geocode_place_id(str(endpoint["place_id"]))
+        if not info:
+            return None, f"Invalid place_id: {endpoint['place_id']}"
+        info["place_id"] = endpoint["place_id"]
+        return info, None
+
+    if isinstance(endpoint, dict) and "lat" in endpoint and "lng" in endpoint:
+        try:
+            lat, lng = float(endpoint["lat"]), float(endpoint["lng"])
+        except (TypeError, ValueError):
+            return None, f"Invalid coordinates: {endpoint}"
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return None, f"Invalid coordinates: {endpoint}"
+        label = endpoint.get("label") or f"{lat:.{COORD_PRECISION}f},{lng:.{COORD_PRECISION}f}"
+        return {"label": label, "lat": lat, "lng": lng, "place_id": None}, None
+
+    if isinstance(endpoint, str) and endpoint.strip():
+        info = geocode(endpoint)
+        if not info:
+            return None, f"Invalid place: {endpoint}"
+        return info, None
+
+    return None, f"Invalid endpoint: {endpoint!r} (expected an address, {{lat, lng}} or {{place_id}})"
+
+
+def resolve_endpoints(endpoints: List[Endpoint]) -> List[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """resolve_endpoint for several endpoints at once (geocoding misses run in parallel)."""
+    if len(endpoints) == 1:
+        return [resolve_endpoint(endpoints[0])]
+    # Each task runs in a copy of the caller's context so its stage() timings reach the request
+    futures = [_executor.submit(contextvars.copy_context().run, resolve_endpoint, e) for e in endpoints]
+    return [f.result() for f in futures]
+
+
+def endpoint_key(info: Dict[str, Any]) -> str:
+    """Cache identity of a resolved endpoint: its place id, else its rounded coordinates."""
+    if info.get("place_id"):
+        return f"pid:{info['place_id']}"
+    return f"ll:{info['lat']:.{COORD_PRECISION}f},{info['lng']:.{COORD_PRECISION}f}"
+
+
+def routes_waypoint(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Routes API waypoint for a resolved endpoint (no address, so Google does not geocode again)."""
+    if info.get("place_id"):
+        return {"placeId": info["place_id"]}
+    return {"location": {"latLng": {"latitude": info["lat"], "longitude": info["lng"]}}}
+
+
+# ======================================================================
+# ROUTE CACHE
+# ======================================================================
+_route_cache: TTLCache = TTLCache(maxsize=OPTIONS["route_maxsize"], ttl=OPTIONS["route_ttl"])
+_route_lock = threading.Lock()
+
+
+def route_key(origin: Dict[str, Any], destination: Dict[str, Any], mode: str) -> Tuple[str, str, str]:
+    return endpoint_key(origin), endpoint_key(destination), mode
+
+
+def get_route(key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+    """Cached {distance_meters, duration_seconds} for (origin key, destination key, mode)."""
+    with _route_lock:
+        hit = _route_cache.get(key)
+    return dict(hit) if hit else None
+
+
+def put_route(key: Tuple[str, str, str], route: Dict[str, Any]) -> None:
+    with _route_lock:
+        _route_cache[key] = dict(route)
+
+
+def stats() -> Dict[str, int]:
+    with _geocode_lock, _route_lock:
+        return {"geocode_entries": len(_geocode_cache), "route_entries": len(_route_cache)}
@@ -0,0 +1,112 @@
+# places/services/geo_utils.py
+import math
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Door-to-door estimates per TripDetailsSchema.mode_of_transport:
+# road distance = great-circle distance * circuity; duration = overhead + distance / speed.
+# Overhead covers check-in / boarding / getting to the station. Override in settings.TRANSPORT_PROFILES.
+_DEFAULT_TRANSPORT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "car":         {"speed_kmh": 55, "circuity": 1.3, "overhead_minutes": 0, "routes_mode": "DRIVE"},
+    "two_wheeler": {"speed_kmh": 40, "circuity": 1.3, "overhead_minutes": 0, "routes_mode": "TWO_WHEELER"},
+    "bus":         {"speed_kmh": 40, "circuity": 1.35, "overhead_minutes": 15, "routes_mode": "TRANSIT"},
+    "train":       {"speed_kmh": 65, "circuity": 1.25, "overhead_minutes": 30, "routes_mode": "TRANSIT"},
+    "flight":      {"speed_kmh": 650, "circuity": 1.05, "overhead_minutes": 150, "routes_mode": None},
+    "bicycle":     {"speed_kmh": 15, "circuity": 1.25, "overhead_minutes": 0, "routes_mode": "BICYCLE"},
+    "walk":        {"speed_kmh": 4.8, "circuity": 1.2, "overhead_minutes": 0, "routes_mode": "WALK"},
+}
+
+
+@lru_cache(maxsize=1)
+def get_transport_profiles() -> Dict[str, Dict[str, Any]]:
+    """Default profiles merged with settings.TRANSPORT_PROFILES (read on first use, not at import)."""
+    overrides = getattr(settings, "TRANSPORT_PROFILES", {})
+    return {
+        name: {**_DEFAULT_TRANSPORT_PROFILES.get(name, {}), **overrides.get(name, {})}
+        for name in {**_DEFAULT_TRANSPORT_PROFILES, **overrides}
+    }
+
+
+# Free-text mode_of_transport values -> profile name
+_TRANSPORT_ALIASES = {
+    "drive": "car", "driving": "car", "road": "car", "taxi": "car", "cab": "car", "self drive": "car",
+    "bike": "two_wheeler", "motorbike": "two_wheeler", "scooter": "two_wheeler",
+    "coach": "bus", "transit": "bus",
+    "rail": "train", "railway": "train",
+    "plane": "flight", "air": "flight", "airplane": "flight", "aeroplane": "flight",
+    "cycle": "bicycle", "cycling": "bicycle",
+    "walking": "walk", "foot": "walk",
+}
+
+# Routes API travelMode -> profile name
+ROUTES_MODE_TRANSPORT = {
+    "DRIVE": "car", "TWO_WHEELER": "two_wheeler", "TRANSIT": "bus", "BICYCLE": "bicycle", "WALK": "walk",
+}
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def normalize_transport(value: Optional[str]) -> Optional[str]:
+    """Profile name for a mode_of_transport value ("Flight", "flights", "cab", ...), or None if unknown."""
+    key = " ".join((value or "").lower().replace("-", " ").replace("_", " ").split())
+    if not key:
+        return None
+    for candidate in (key, key.rstrip("s")):
+        if candidate.replace(" ", "_") in get_transport_profiles():
+            return candidate.replace(" ", "_")
+        if candidate in _TRANSPORT_ALIASES:
+            return _TRANSPORT_ALIASES[candidate]
+    return None
+
+
+def estimate_travel(lat1: float, lng1: float, lat2: float, lng2: float, transport: str = "car") -> Dict[str, int]:
+    """
+    Network-free distance / duration between two points: great-circle
+    distance times the profile's circuity, at the profile's average speed.
+    """
+    profiles = get_transport_profiles()
+    profile = profiles.get(transport) or profiles["car"]
+    km = haversine_km(lat1, lng1, lat2, lng2) * profile["circuity"]
+    seconds = km / profile["speed_kmh"] * 3600 + profile["overhead_minutes"] * 60
+    return {"distance_meters": int(round(km * 1000)), "duration_seconds": int(round(seconds))}
+
+
+def haversine_matrix(a: np.ndarray, b: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Pairwise great-circle distances (km) between (n, 2) and (m, 2) arrays of
+    [lat, lng] in degrees. With b omitted, returns the (n, n) matrix of a.
+    """
+    b = a if b is None else b
+    lat1 = np.radians(a[:, 0])[:, None]
+    lng1 = np.radians(a[:, 1])[:, None]
+    lat2 = np.radians(b[:, 0])[None, :]
+    lng2 = np.radians(b[:, 1])[None, :]
+
+    h = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def extract_lat_lng(place: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(lat, lng) from simplified ({lat, lng}) or raw Google ({latitude, longitude}) locations."""
+    loc = place.get("location") or (place.get("geometry") or {}).get("location")
+    if not isinstance(loc, dict):
+        return None
+    lat = loc.get("lat", loc.get("latitude"))
+    lng = loc.get("lng", loc.get("longitude"))
+    if lat is None or lng is None:
+        return None
+    return float(lat), float(lng)
@@ -1,5 +1,7 @@
 import requests
 from typing import Dict, Any, List
+from places.services.metrics import stage
+from places.services.preference_matcher import SEARCH_TEXT_KEY, build_search_text
 
 GOOGLE_PLACES_URL = "https://places.googleapis.com/v1/places:searchNearby"
 def fetch_places(api_key: str, latitude: float, longitude: float, included_types: list, radius: float = 1500):
@@ -38,9 +40,10 @@ def fetch_places(api_key: str, latitude: float, longitude: float, included_types
     }
 
     try:
-        res = requests.post(GOOGLE_PLACES_URL, json=payload, headers=headers, timeout=10)
-        res.raise_for_status()
-        return res.json()
+        with stage("nearby", desc=",".join(included_types)):
+            res = requests.post(GOOGLE_PLACES_URL, json=payload, headers=headers, timeout=10)
+            res.raise_for_status()
+            return res.json()
     except Exception as e:
         print("❌ Nearby Search API error:", e)
         return {"places": []}
@@ -77,6 +80,7 @@ def filter_nearbySearch_places_data(data: dict) -> list:
                 .get("text"),
             "reviewSummary_reviewsUri": p.get("reviewSummary", {}).get("reviewsUri"),
         }
+        place_data[SEARCH_TEXT_KEY] = build_search_text(place_data)
 
         results.append(place_data)
 
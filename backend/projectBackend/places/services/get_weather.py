@@ -1,6 +1,7 @@
 import requests
 from typing import Dict, Any, List
 from datetime import date, datetime
+from places.services.metrics import stage
 
 class WeatherService:
     def __init__(self, api_key: str):
@@ -129,7 +130,8 @@ class WeatherService:
         }
 
         try:
-            response = requests.get(url, params=params, timeout=10)
+            with stage("weather"):
+                response = requests.get(url, params=params, timeout=10)
             response.raise_for_status()
             raw_data = response.json()
 
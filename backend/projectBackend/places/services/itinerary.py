@@ -3,6 +3,7 @@ import logging
 import google.generativeai as genai
 from dotenv import load_dotenv
 import json
+from places.services.metrics import stage
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -21,16 +22,19 @@ class GeminiItineraryService:
     
     async def generate_itinerary(self, request_data):
         try:
-            prompt = self._build_itinerary_prompt(request_data)
-            response = await self.model.generate_content_async(prompt)
-            raw_text = response.text.strip()
-            
-            # Extract JSON substring safely
-            json_start = raw_text.find('{')
-            json_end = raw_text.rfind('}') + 1
-            json_text = raw_text[json_start:json_end]
-            
-            return json.loads(json_text)
+            with stage("prompt_build"):
+                prompt = self._build_itinerary_prompt(request_data)
+            with stage("gemini_call"):
+                response = await self.model.generate_content_async(prompt)
+            with stage("gemini_parse"):
+                raw_text = response.text.strip()
+
+                # Extract JSON substring safely
+                json_start = raw_text.find('{')
+                json_end = raw_text.rfind('}') + 1
+                json_text = raw_text[json_start:json_end]
+
+                return json.loads(json_text)
 
         except Exception as e:
             logger.error(f"Gemini itinerary generation failed: {str(e)}")
@@ -1,4 +1,5 @@
-from typing import Dict, Any, List  
+from typing import Dict, Any, List, Optional
+from places.services.route_planner import plan_day_routes, nearest_places, opening_hours_by_id
 
 # ======================================================================
 # AI ITINERARY HELPERS
@@ -162,12 +163,15 @@ def build_daywise_place_plan(
     reference_places: Dict[str, Any],
     preferences_list: List[str],
     days: int,
+    start_date: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
     Build a structured plan for each day:
-    - 5 tourist attractions / day
-    - 1–3 restaurants for breakfast/lunch/dinner per day
+    - 5 tourist attractions / day, clustered so each day stays in one area
+      and ordered as a short route (route_distance_km is attached)
+    - 1–3 restaurants for breakfast/lunch/dinner per day, nearest to that day's area
     - 3–5 lodging options for Day 1 only
+    Falls back to rating order when places carry no coordinates.
     """
     ta_grouped = reference_places.get("tourist_attractions", {}) or {}
     rest_grouped = reference_places.get("restaurants", {}) or {}
@@ -194,23 +198,33 @@ def build_daywise_place_plan(
     rest_simpl = [_simplify_place_for_ai(p) for p in rest_flat]
     lodg_simpl = [_simplify_place_for_ai(p) for p in lodg_flat]
 
+    # Geo-clustered days (None when nothing has coordinates)
+    day_routes = plan_day_routes(
+        ta_simpl, days, per_day=5, start_date=start_date, opening_hours=opening_hours_by_id(ta_flat)
+    )
+
     day_plans: List[Dict[str, Any]] = []
 
     for day_idx in range(days):
         day_number = day_idx + 1
 
-        # 5 attractions per day (unique within the day, can repeat across days if needed)
-        ta_start = day_idx * 5
-        attractions = []
-        for i in range(5):
-            if not ta_simpl:
-                break
-            idx = (ta_start + i) % len(ta_simpl)
-            attractions.append(ta_simpl[idx])
-
-        # Restaurants: aim for 3 per meal if available (Option A: reuse allowed)
-        rest_start = day_idx * 3 if rest_simpl else 0
-        slice_block = rest_simpl[rest_start: rest_start + 3] or rest_simpl[:3]
+        if day_routes:
+            route = day_routes[day_idx]
+            attractions = route["attractions"]
+            slice_block = nearest_places(rest_simpl, route["centroid"], 3)
+        else:
+            # 5 attractions per day (unique within the day, can repeat across days if needed)
+            ta_start = day_idx * 5
+            attractions = []
+            for i in range(5):
+                if not ta_simpl:
+                    break
+                idx = (ta_start + i) % len(ta_simpl)
+                attractions.append(ta_simpl[idx])
+
+            # Restaurants: aim for 3 per meal if available (Option A: reuse allowed)
+            rest_start = day_idx * 3 if rest_simpl else 0
+            slice_block = rest_simpl[rest_start: rest_start + 3] or rest_simpl[:3]
 
         breakfast_rests = slice_block[:3]
         lunch_rests = slice_block[:3]
@@ -225,13 +239,15 @@ def build_daywise_place_plan(
         # Lodging only for Day 1: 3–5 suggestions
         lodging_options = lodg_simpl[:5] if day_number == 1 else []
 
-        day_plans.append(
-            {
-                "day": day_number,
-                "attractions": attractions,
-                "restaurants": restaurants_block,
-                "lodging_options": lodging_options,
-            }
-        )
+        day_plan = {
+            "day": day_number,
+            "attractions": attractions,
+            "restaurants": restaurants_block,
+            "lodging_options": lodging_options,
+        }
+        if day_routes:
+            day_plan["route_distance_km"] = day_routes[day_idx]["route_distance_km"]
+
+        day_plans.append(day_plan)
 
     return day_plans
@@ -8,6 +8,8 @@ from places.services.utility_helpers import get_coordinates
 import os
 from dotenv import load_dotenv
 from places.services.itinerary_helpers import build_daywise_place_plan
+from places.services.route_planner import plan_day_routes, nearest_places, opening_hours_by_id
+from places.services.metrics import stage, set_source
 
 # Load environment variables from .env file
 load_dotenv()
@@ -62,28 +64,44 @@ def _segregate_and_simplify_places(custom_places: list):
     return {
         "tourist": tourist_s,
         "lodging": lodging_s,
-        "restaurants": restaurants_s
+        "restaurants": restaurants_s,
+        # For day planning only; not part of the AI payload
+        "opening_hours": opening_hours_by_id(tourist),
     }
 
 
-def _build_places_plan(tourist_s, lodging_s, restaurants_s, days):
+def _build_places_plan(tourist_s, lodging_s, restaurants_s, days, start_date=None, opening_hours=None):
     plan = []
     t_idx = 0
 
+    # Keep each day's selected places in one area when coordinates are known
+    day_routes = plan_day_routes(
+        tourist_s, days, per_day=3, start_date=start_date, allow_repeats=False, opening_hours=opening_hours
+    )
+
     for d in range(days):
-        attractions = tourist_s[t_idx:t_idx+3]
-        t_idx += 3
+        if day_routes:
+            attractions = day_routes[d]["attractions"]
+            day_restaurants = nearest_places(restaurants_s, day_routes[d]["centroid"], 3)
+        else:
+            attractions = tourist_s[t_idx:t_idx+3]
+            t_idx += 3
+            day_restaurants = restaurants_s[:3]
 
-        plan.append({
+        day_plan = {
             "day": d + 1,
             "attractions": attractions,
             "restaurants": {
-                "breakfast": restaurants_s[:3],
-                "lunch": restaurants_s[:3],
-                "dinner": restaurants_s[:3]
+                "breakfast": day_restaurants,
+                "lunch": day_restaurants,
+                "dinner": day_restaurants
             },
             "lodging_options": lodging_s[:1] if d == 0 else []
-        })
+        }
+        if day_routes:
+            day_plan["route_distance_km"] = day_routes[d]["route_distance_km"]
+
+        plan.append(day_plan)
 
     return plan
 
@@ -122,8 +140,9 @@ async def _helper_ai_based(destination, days, preferences, budget, group_size, t
     preferences_list = [p.strip() for p in preferences if p.strip()]
 
     cache_key = build_cache_key(destination, preferences_list, travel_style)
-    trip_places = load_trip_response(cache_key)
-
+    trip_places = load_trip_response(cache_key, projection="itinerary_custom")
+    if trip_places:
+        set_source("db")
 
     from places.views import get_preference_based_places
     if not trip_places:
@@ -135,7 +154,7 @@ async def _helper_ai_based(destination, days, preferences, budget, group_size, t
                         travel_style
                     )
 
-        trip_places = load_trip_response(cache_key) or trip_places
+        trip_places = load_trip_response(cache_key, projection="itinerary_custom") or trip_places
 
     reference_places = trip_places.get("reference_places", {}) if isinstance(trip_places, dict) else {}
     coords = trip_places.get("coordinates", {}) if isinstance(trip_places, dict) else {}
@@ -153,11 +172,12 @@ async def _helper_ai_based(destination, days, preferences, budget, group_size, t
         weather_info = None
 
     # ----------------------- Build daywise plan -----------------------
-    places_plan = build_daywise_place_plan(
-        reference_places=reference_places,
-        preferences_list=preferences_list,
-        days=days,
-    )
+    with stage("plan_build"):
+        places_plan = build_daywise_place_plan(
+            reference_places=reference_places,
+            preferences_list=preferences_list,
+            days=days,
+        )
 
     # ----------------------- Prepare final payload -----------------------
     payload = {
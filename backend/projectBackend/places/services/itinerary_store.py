@@ -0,0 +1,94 @@
+# places/services/itinerary_store.py
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Any, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from places.services.metrics import stage
+from places.services.write_behind import WRITE_BEHIND
+
+# Payload keys that decide what gets generated (used for inputs_hash)
+_INPUT_KEYS = (
+    "destination", "days", "duration_days", "preferences", "mode", "places",
+    "experience_type", "budget", "group_size", "people_count", "travel_style", "start_date",
+)
+
+
+def _canonical_json(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def inputs_hash(payload: Dict[str, Any]) -> str:
+    """Stable hash of the request inputs, so identical requests can be found later."""
+    inputs = {k: payload.get(k) for k in _INPUT_KEYS if payload.get(k) is not None}
+    return hashlib.sha256(_canonical_json(inputs)).hexdigest()
+
+
+def compute_etag(itinerary: Dict[str, Any]) -> str:
+    """Strong ETag (quoted) over the itinerary content."""
+    return f'"{hashlib.sha256(_canonical_json(itinerary)).hexdigest()[:32]}"'
+
+
+def split_itinerary(itinerary: Any) -> Dict[str, Any]:
+    """
+    Gemini JSON -> storage fields: the day list goes to itinerary_days (one
+    subdocument per day) and everything else (packing_suggestions,
+    overall_summary, ...) to itinerary_extra.
+    """
+    if isinstance(itinerary, dict) and isinstance(itinerary.get("itinerary"), list):
+        extra = {k: v for k, v in itinerary.items() if k != "itinerary"}
+        return {"itinerary_days": itinerary["itinerary"], "itinerary_extra": extra}
+    # Unexpected shape: keep it whole
+    return {"itinerary_days": [], "itinerary_extra": {"raw": itinerary}}
+
+
+def assemble_itinerary(doc: Dict[str, Any]) -> Any:
+    """Inverse of split_itinerary."""
+    extra = doc.get("itinerary_extra") or {}
+    if "raw" in extra and not doc.get("itinerary_days"):
+        return extra["raw"]
+    return {"itinerary": doc.get("itinerary_days") or [], **extra}
+
+
+def save_itinerary(itinerary: Any, payload: Dict[str, Any], meta: Dict[str, Any]) -> str:
+    """
+    Persist a generated itinerary with its inputs hash and ETag.
+    `meta` holds the listing fields (destination, days, mode, user_id, ...).
+    Returns the new itinerary id.
+    """
+    doc = {
+        **meta,
+        **split_itinerary(itinerary),
+        "inputs_hash": inputs_hash(payload),
+        "etag": compute_etag(itinerary),
+        "generated_at": datetime.now(),
+    }
+    # _id is assigned client-side, so the id can be returned before the write lands
+    with stage("mongo_save", desc="itineraries queued"):
+        itinerary_id = WRITE_BEHIND.insert("itineraries", doc)
+    return str(itinerary_id)
+
+
+def load_itinerary(itinerary_id: str) -> Optional[Dict[str, Any]]:
+    """Stored itinerary document, or None for unknown / malformed ids."""
+    try:
+        oid = ObjectId(itinerary_id)
+    except (InvalidId, TypeError):
+        return None
+    pending = WRITE_BEHIND.get_pending("itineraries", oid)
+    if pending is not None:
+        return pending
+    with stage("mongo_load", desc="itineraries"):
+        return settings.MONGO_DB.itineraries.find_one({"_id": oid})
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 If-None-Match check (weak comparison, list or *)."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    strip_weak = lambda tag: tag.strip().removeprefix("W/")
+    return any(strip_weak(tag) == strip_weak(etag) for tag in if_none_match.split(","))
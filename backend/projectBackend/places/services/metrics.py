@@ -0,0 +1,223 @@
+# places/services/metrics.py
+import ipaddress
+import re
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+from django.conf import settings
+
+# ======================================================================
+# PER-REQUEST STAGE TIMINGS
+# ======================================================================
+# Upper bounds (ms) of the latency histogram buckets; +Inf is implicit.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_TOKEN_RE = re.compile(r"[^A-Za-z0-9_.\-]")
+
+
+class RequestTimings:
+    """Collects the stage timings and labels of a single request."""
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float, Optional[str]]] = []
+        self.labels: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration_ms: float, desc: Optional[str] = None) -> None:
+        with self._lock:
+            self.stages.append((name, duration_ms, desc))
+
+    def server_timing_header(self, total_ms: Optional[float] = None, include_desc: bool = True) -> str:
+        """Render the stages as a Server-Timing header value (descriptions only if include_desc)."""
+        parts = []
+        for name, duration_ms, desc in self.stages:
+            entry = f"{_TOKEN_RE.sub('_', name)};dur={duration_ms:.1f}"
+            if desc and include_desc:
+                safe_desc = desc.replace("\\", "").replace('"', "'")[:80]
+                entry += f';desc="{safe_desc}"'
+            parts.append(entry)
+        if total_ms is not None:
+            parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+@lru_cache(maxsize=1)
+def _allowed_networks():
+    return [
+        ipaddress.ip_network(net, strict=False)
+        for net in getattr(settings, "METRICS_ALLOWED_NETWORKS", ["127.0.0.1/32", "::1/128"])
+    ]
+
+
+def can_read_metrics(request) -> bool:
+    """Clients in METRICS_ALLOWED_NETWORKS and staff users (/api/metrics/, stage descriptions)."""
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        address = None
+    if address is not None and any(address in net for net in _allowed_networks()):
+        return True
+    # Checked second: resolving request.user can mean a session lookup
+    user = getattr(request, "user", None)
+    return bool(user and user.is_authenticated and user.is_staff)
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def begin_request():
+    """Start collecting timings for the current request. Returns (timings, token)."""
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    return timings, token
+
+
+def end_request(token) -> None:
+    _current_timings.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+def set_source(source: str) -> None:
+    """Label the current request with where its data came from (db / api / fallback_*)."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.labels["source"] = source
+
+
+@contextmanager
+def stage(name: str, desc: Optional[str] = None):
+    """
+    Time a block and record it against the current request (no-op outside a request).
+
+    Usage:
+        with stage("geocode"):
+            ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(name, (time.perf_counter() - start) * 1000.0, desc)
+
+
+# ======================================================================
+# PROCESS-WIDE HISTOGRAMS
+# ======================================================================
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value_ms <= bound:
+                idx = i
+                break
+        self.counts[idx] += 1
+        self.count += 1
+        self.sum += value_ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside the matching bucket."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if cumulative + bucket_count >= rank and bucket_count:
+                fraction = (rank - cumulative) / bucket_count
+                return lower + (upper - lower) * fraction
+            cumulative += bucket_count
+            lower = upper
+        return float(self.buckets[-1])
+
+
+class MetricsRegistry:
+    """Aggregates stage timings per (endpoint, source, stage). Counts are per worker process."""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe_request(self, endpoint: str, timings: RequestTimings, total_ms: float) -> None:
+        source = timings.labels.get("source", "none")
+        with self._lock:
+            for name, duration_ms, _ in timings.stages:
+                self._histogram(endpoint, source, name).observe(duration_ms)
+            self._histogram(endpoint, source, "total").observe(total_ms)
+
+    def _histogram(self, endpoint: str, source: str, stage_name: str) -> Histogram:
+        key = (endpoint, source, stage_name)
+        hist = self._histograms.get(key)
+        if hist is None:
+            hist = self._histograms[key] = Histogram()
+        return hist
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """JSON-friendly summary with p50 / p95 / p99 estimates."""
+        with self._lock:
+            rows = []
+            for (endpoint, source, stage_name), hist in sorted(self._histograms.items()):
+                rows.append({
+                    "endpoint": endpoint,
+                    "source": source,
+                    "stage": stage_name,
+                    "count": hist.count,
+                    "sum_ms": round(hist.sum, 2),
+                    "p50_ms": _round_or_none(hist.quantile(0.50)),
+                    "p95_ms": _round_or_none(hist.quantile(0.95)),
+                    "p99_ms": _round_or_none(hist.quantile(0.99)),
+                })
+            return rows
+
+    def render_prometheus(self) -> str:
+        """Render all histograms in the Prometheus text exposition format."""
+        lines = [
+            "# HELP travai_stage_duration_ms Duration of request stages in milliseconds.",
+            "# TYPE travai_stage_duration_ms histogram",
+        ]
+        with self._lock:
+            for (endpoint, source, stage_name), hist in sorted(self._histograms.items()):
+                labels = (
+                    f'endpoint="{_escape_label(endpoint)}",'
+                    f'source="{_escape_label(source)}",'
+                    f'stage="{_escape_label(stage_name)}"'
+                )
+                cumulative = 0
+                for bound, bucket_count in zip(hist.buckets, hist.counts):
+                    cumulative += bucket_count
+                    lines.append(f'travai_stage_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'travai_stage_duration_ms_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"travai_stage_duration_ms_sum{{{labels}}} {hist.sum:.3f}")
+                lines.append(f"travai_stage_duration_ms_count{{{labels}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+def _round_or_none(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,152 @@
+# places/services/mongo_indexes.py
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List
+from django.conf import settings
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Cache documents carry a BSON date in `cached_at`; TTL indexes expire them after this long.
+CACHE_TTL_SECONDS = getattr(settings, "MONGO_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+
+# Mongo error codes for "index exists with different options / same name"
+_INDEX_CONFLICT_CODES = {85, 86}
+
+
+def _ttl_index() -> IndexModel:
+    return IndexModel([("cached_at", ASCENDING)], name="cached_at_ttl", expireAfterSeconds=CACHE_TTL_SECONDS)
+
+
+# ======================================================================
+# DECLARED INDEXES (collection -> indexes)
+# ======================================================================
+INDEXES: Dict[str, List[IndexModel]] = {
+    # /v1/places/{destination} cache lookup
+    "cached_places": [
+        IndexModel([("destination", ASCENDING)], name="destination_1"),
+        _ttl_index(),
+    ],
+    # /places/{destination} cache lookup
+    "new_places_cache": [
+        IndexModel([("destination", ASCENDING)], name="destination_1"),
+        _ttl_index(),
+    ],
+    # Looked up by _id (= cache_key); destination for coverage / prewarm reports
+    "trip_places_cache": [
+        IndexModel([("destination", ASCENDING)], name="destination_1"),
+        _ttl_index(),
+    ],
+    # Per-user history, newest first
+    "itineraries": [
+        IndexModel([("user_id", ASCENDING), ("generated_at", DESCENDING)], name="user_id_1_generated_at_-1"),
+        IndexModel([("generated_at", DESCENDING)], name="generated_at_-1"),
+        IndexModel([("inputs_hash", ASCENDING)], name="inputs_hash_1"),
+    ],
+    # Trip listing: per-user keyset pages, date filters, destination frequency
+    "trip_details": [
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id_1__id_1"),
+        IndexModel([("start_date", ASCENDING)], name="start_date_1"),
+        IndexModel([("to_location", ASCENDING)], name="to_location_1"),
+    ],
+}
+
+# Queries on the request path, used by the explain report
+HOT_QUERIES: List[Dict[str, Any]] = [
+    {"collection": "cached_places", "filter": {"destination": "Goa"}},
+    {"collection": "new_places_cache", "filter": {"destination": "Goa"}},
+    {"collection": "trip_places_cache", "filter": {"_id": "goa__moderate__"}},
+    {"collection": "itineraries", "filter": {"user_id": "example"}, "sort": [("generated_at", DESCENDING)], "limit": 20},
+    {"collection": "trip_details", "filter": {}, "sort": [("_id", ASCENDING)], "limit": 50},
+    {"collection": "trip_details", "filter": {"user_id": "example"}, "sort": [("_id", ASCENDING)], "limit": 50},
+    {"collection": "trip_details", "filter": {"start_date": {"$gte": datetime(2025, 1, 1)}}, "limit": 50},
+]
+
+
+def _backfill_cached_at(db, collection: str) -> int:
+    """
+    Stamp documents written before `cached_at` existed with the current time,
+    so they expire one TTL period after the index is introduced instead of
+    never (the TTL monitor skips documents without the field).
+    """
+    result = db[collection].update_many(
+        {"cached_at": {"$exists": False}}, {"$set": {"cached_at": datetime.now(timezone.utc)}}
+    )
+    if result.modified_count:
+        logger.info(f"Backfilled cached_at on {result.modified_count} {collection} documents")
+    return result.modified_count
+
+
+def ensure_indexes(db=None) -> Dict[str, List[str]]:
+    """
+    Create every declared index. Safe to run on each deploy: existing indexes
+    are left alone, and a changed TTL is applied with collMod. Collections with
+    a TTL index get `cached_at` backfilled on older documents first.
+    Returns {collection: [index names]}.
+    """
+    db = db if db is not None else settings.MONGO_DB
+    report: Dict[str, List[str]] = {}
+
+    for collection, models in INDEXES.items():
+        if any(model.document["name"] == "cached_at_ttl" for model in models):
+            _backfill_cached_at(db, collection)
+        created = []
+        for model in models:
+            try:
+                created += db[collection].create_indexes([model])
+            except OperationFailure as e:
+                if e.code not in _INDEX_CONFLICT_CODES:
+                    raise
+                name = model.document["name"]
+                ttl = model.document.get("expireAfterSeconds")
+                if ttl is None:
+                    raise
+                db.command("collMod", collection, index={"name": name, "expireAfterSeconds": ttl})
+                logger.info(f"Updated TTL of {collection}.{name} to {ttl}s")
+                created.append(name)
+        report[collection] = created
+
+    return report
+
+
+def _winning_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten a winningPlan tree into its stage names (e.g. LIMIT > FETCH > IXSCAN)."""
+    stages = []
+    node = plan
+    while isinstance(node, dict):
+        stages.append(node.get("stage", "?"))
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0] or node.get("queryPlan")
+    return stages
+
+
+def explain_hot_queries(db=None) -> List[Dict[str, Any]]:
+    """Winning plan and execution stats for each hot query."""
+    db = db if db is not None else settings.MONGO_DB
+    report = []
+
+    for query in HOT_QUERIES:
+        cursor = db[query["collection"]].find(query["filter"])
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        if query.get("limit"):
+            cursor = cursor.limit(query["limit"])
+
+        explain = cursor.explain()
+        planner = explain.get("queryPlanner", {})
+        stats = explain.get("executionStats", {})
+        stages = _winning_stages(planner.get("winningPlan", {}))
+
+        report.append({
+            "collection": query["collection"],
+            "filter": query["filter"],
+            "sort": query.get("sort"),
+            "plan": " > ".join(stages),
+            "collection_scan": "COLLSCAN" in stages,
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "returned": stats.get("nReturned"),
+            "execution_ms": stats.get("executionTimeMillis"),
+        })
+
+    return report
@@ -1,7 +1,14 @@
 # places/services/place_queries.py
 import json
 import os
-from typing import List
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+# Seconds between mtime checks of the queries file (keeps stat() off most requests)
+RELOAD_CHECK_INTERVAL = 2.0
+
 
 def get_queries_file_path():
     """Get the absolute path to the queries JSON file"""
@@ -9,176 +16,228 @@ def get_queries_file_path():
     project_root = os.path.dirname(os.path.dirname(current_dir))
     return os.path.join(project_root, 'config', 'preference_queries.json')
 
-def load_preference_queries():
-    """Load queries from JSON file with proper error handling"""
+
+# ======================================================================
+# STATIC QUERY TABLES
+# ======================================================================
+def _freeze(table: Dict[str, List[str]]) -> Mapping[str, Tuple[str, ...]]:
+    """Read-only {Title Case key: deduplicated queries} (first occurrence wins)."""
+    frozen: Dict[str, Tuple[str, ...]] = {}
+    for key, queries in table.items():
+        title = str(key).strip().title()
+        merged = frozen.get(title, ()) + tuple(str(q).strip() for q in queries if str(q).strip())
+        frozen[title] = tuple(dict.fromkeys(merged))
+    return MappingProxyType(frozen)
+
+
+FALLBACK_QUERIES = _freeze({
+    "Adventure": ["adventure activities", "outdoor adventures", "adventure sports"],
+    "Relaxation": ["spa centers", "peaceful spots", "relaxation venues"],
+    "Culture": ["cultural sites", "museums", "heritage locations"],
+    "Food & Cuisine": ["local restaurants", "food spots", "dining places"],
+    "Nature": ["nature parks", "scenic spots", "natural attractions"]
+})
+
+GENERIC_TOURIST_QUERIES = (
+    "top tourist attractions",
+    "popular places to visit",
+    "must-see attractions",
+    "famous landmarks",
+    "things to do",
+    "sightseeing spots"
+)
+
+# Experience-based restaurant queries (PRIMARY)
+RESTAURANT_QUERIES = MappingProxyType({
+    "budget": (
+        "budget restaurants", "cheap eats", "affordable dining",
+        "street food", "local cheap restaurants", "fast food restaurants"
+    ),
+    "moderate": (
+        "good restaurants", "popular dining spots", "local cuisine restaurants",
+        "mid-range restaurants", "family restaurants", "casual dining"
+    ),
+    "luxury": (
+        "fine dining restaurants", "luxury dining", "premium restaurants",
+        "gourmet restaurants", "award-winning restaurants", "upscale restaurants"
+    )
+})
+
+# Preference-based restaurant enhancements (secondary)
+CUISINE_QUERIES = _freeze({
+    "Food": ["local cuisine restaurants", "food tours", "culinary experiences"],
+    "Food & Cuisine": ["local cuisine restaurants", "food tours", "culinary experiences"],
+    "Local Experiences": ["authentic local restaurants", "traditional dining"],
+    "Romantic": ["romantic restaurants", "candlelight dining", "intimate cafes"],
+    "Adventure": ["unique dining experiences", "adventure-themed restaurants"],
+    "Culture": ["traditional cultural restaurants", "ethnic cuisine"],
+    "Cultural": ["traditional cultural restaurants", "ethnic cuisine"],
+    "Nature": ["restaurants with scenic views", "garden restaurants"],
+    "Budget Travel": ["budget restaurants", "affordable dining"]
+})
+
+# Experience-based lodging queries (PRIMARY)
+LODGING_QUERIES = MappingProxyType({
+    "budget": ("budget hotels", "hostels", "affordable accommodation", "cheap hotels", "budget stays"),
+    "moderate": ("comfortable hotels", "good hotels", "mid-range accommodation", "standard hotels"),
+    "luxury": ("luxury hotels", "5-star hotels", "premium resorts", "boutique hotels", "deluxe accommodation")
+})
+
+# Preference-based lodging additions (secondary)
+LODGING_PREFERENCE_QUERIES = _freeze({
+    "Eco-Friendly Travel": ["eco hotels", "sustainable accommodation"],
+    "Relaxation": ["spa resorts", "wellness hotels"],
+})
+
+
+# ======================================================================
+# PREFERENCE QUERY CATALOG (config/preference_queries.json)
+# ======================================================================
+class QueryCatalog(NamedTuple):
+    """Immutable snapshot of the preference queries file."""
+    queries: Mapping[str, Tuple[str, ...]]  # Title Case preference -> deduplicated queries
+    mtime: Optional[float]                  # of the file when it was (re)read; None if missing
+    version: int                            # bumped on every reload (cache keys of derived data)
+
+    def get(self, preference: str) -> Tuple[str, ...]:
+        """Queries for a preference (any casing); falls back to '<preference> attractions'."""
+        pref_key = preference.strip().title()
+        queries = self.queries.get(pref_key)
+        if queries is not None:
+            return queries
+        return (f"{preference.strip().lower()} attractions",)
+
+
+_catalog: Optional[QueryCatalog] = None
+_next_check = 0.0
+_lock = threading.Lock()
+
+
+def _read_queries(file_path: str) -> Optional[Mapping[str, Tuple[str, ...]]]:
+    """Parsed and frozen queries file, or None if it cannot be used."""
     try:
-        file_path = get_queries_file_path()
         with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("expected an object of preference -> query list")
+        return _freeze(data)
     except FileNotFoundError:
         print(f"Warning: Preference queries file not found at {file_path}")
-        return get_fallback_queries()
     except json.JSONDecodeError as e:
         print(f"Warning: Invalid JSON in queries file: {e}")
-        return get_fallback_queries()
     except Exception as e:
         print(f"Warning: Error loading queries: {e}")
-        return get_fallback_queries()
-
-def get_fallback_queries():
+    return None
+
+
+def get_query_catalog() -> QueryCatalog:
+    """
+    Current catalog. The file is parsed once and re-read only when its mtime
+    changes (checked at most every RELOAD_CHECK_INTERVAL seconds).
+    """
+    global _catalog, _next_check
+    now = time.monotonic()
+    catalog = _catalog
+    if catalog is not None and now < _next_check:
+        return catalog
+
+    with _lock:
+        if _catalog is not None and now < _next_check:
+            return _catalog
+        file_path = get_queries_file_path()
+        try:
+            mtime = os.stat(file_path).st_mtime
+        except OSError:
+            mtime = None
+
+        if _catalog is None or mtime != _catalog.mtime:
+            queries = _read_queries(file_path) if mtime is not None else None
+            if queries is None:
+                # Broken or half-written file: keep serving the last good catalog
+                if mtime is None:
+                    print(f"Warning: Preference queries file not found at {file_path}")
+                queries = _catalog.queries if _catalog is not None else FALLBACK_QUERIES
+            version = _catalog.version + 1 if _catalog is not None else 1
+            _catalog = QueryCatalog(queries, mtime, version)
+        _next_check = now + RELOAD_CHECK_INTERVAL
+        return _catalog
+
+
+def load_preference_queries() -> Mapping[str, Tuple[str, ...]]:
+    """Preference -> queries mapping of the current catalog (read-only)."""
+    return get_query_catalog().queries
+
+
+def get_fallback_queries() -> Mapping[str, Tuple[str, ...]]:
     """Provide fallback queries if JSON file is unavailable"""
-    return {
-        "Adventure": ["adventure activities", "outdoor adventures", "adventure sports"],
-        "Relaxation": ["spa centers", "peaceful spots", "relaxation venues"],
-        "Culture": ["cultural sites", "museums", "heritage locations"],
-        "Food & Cuisine": ["local restaurants", "food spots", "dining places"],
-        "Nature": ["nature parks", "scenic spots", "natural attractions"]
-    }
+    return FALLBACK_QUERIES
+
+
+# ======================================================================
+# QUERY GENERATION
+# ======================================================================
+def _dedupe(output: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    unique_list = []
+    seen = set()
+    for item in output:
+        key = (item["preference"], item["query"])
+        if key not in seen:
+            seen.add(key)
+            unique_list.append(item)
+    return unique_list
+
+
+def _normalize_experience(experience_type) -> str:
+    if isinstance(experience_type, list):
+        experience_type = experience_type[0] if experience_type else "moderate"
+    return str(experience_type).lower()
+
 
 def generate_tourist_queries(travel_preferences: List[str], experience_type: str):
     """Generate search queries for tourist attractions with preference metadata."""
-    preference_queries = load_preference_queries()
-    output = []
-
     # ✅ FIX: If NO preferences provided, use generic queries
     if not travel_preferences or len(travel_preferences) == 0:
         print("📍 No preferences - using generic queries")
-        generic_queries = [
-            "top tourist attractions",
-            "popular places to visit",
-            "must-see attractions",
-            "famous landmarks",
-            "things to do",
-            "sightseeing spots"
-        ]
-        for q in generic_queries:
-            output.append({"preference": "General", "query": q})
-        return output[:8]
+        return [{"preference": "General", "query": q} for q in GENERIC_TOURIST_QUERIES][:8]
 
     print(f"✅ Using preference-based queries for: {travel_preferences}")
-    
-    # Original logic for preference-based queries
+
+    catalog = get_query_catalog()
+    output = []
     for preference in travel_preferences:
         pref_key = preference.strip().title()
+        for q in catalog.get(preference):
+            output.append({"preference": pref_key, "query": q})
 
-        if pref_key in preference_queries:
-            for q in preference_queries[pref_key]:
-                output.append({"preference": pref_key, "query": q})
-        else:
-            # fallback if preference is not in the file
-            fallback_q = f"{preference.lower()} attractions"
-            output.append({"preference": pref_key, "query": fallback_q})
-
-    # Remove duplicates
-    unique_list = []
-    seen = set()
-    for item in output:
-        key = (item["preference"], item["query"])
-        if key not in seen:
-            seen.add(key)
-            unique_list.append(item)
-
-    return unique_list[:8]
+    return _dedupe(output)[:8]
 
 
 def generate_restaurant_queries(experience_type: str, travel_preferences: List[str]):
     """Generate restaurant queries with metadata."""
-    output = []
-
-    # Normalize experience type
-    if isinstance(experience_type, list):
-        experience_type = experience_type[0] if experience_type else "moderate"
-    exp = str(experience_type).lower()
-
-    # Experience-based queries (PRIMARY)
-    experience_restaurant_queries = {
-        "budget": [
-            "budget restaurants", "cheap eats", "affordable dining",
-            "street food", "local cheap restaurants", "fast food restaurants"
-        ],
-        "moderate": [
-            "good restaurants", "popular dining spots", "local cuisine restaurants",
-            "mid-range restaurants", "family restaurants", "casual dining"
-        ],
-        "luxury": [
-            "fine dining restaurants", "luxury dining", "premium restaurants",
-            "gourmet restaurants", "award-winning restaurants", "upscale restaurants"
-        ]
-    }
+    exp = _normalize_experience(experience_type)
 
     # Use experience_type as metadata
-    base_queries = experience_restaurant_queries.get(exp, experience_restaurant_queries["moderate"])
-    for q in base_queries:
-        output.append({"preference": exp.title(), "query": q})
-
-    # PREFERENCE-BASED secondary enhancements
-    cuisine_mapping = {
-        "Food": ["local cuisine restaurants", "food tours", "culinary experiences"],
-        "Food & Cuisine": ["local cuisine restaurants", "food tours", "culinary experiences"],
-        "Local Experiences": ["authentic local restaurants", "traditional dining"],
-        "Romantic": ["romantic restaurants", "candlelight dining", "intimate cafes"],
-        "Adventure": ["unique dining experiences", "adventure-themed restaurants"],
-        "Culture": ["traditional cultural restaurants", "ethnic cuisine"],
-        "Cultural": ["traditional cultural restaurants", "ethnic cuisine"],
-        "Nature": ["restaurants with scenic views", "garden restaurants"],
-        "Budget Travel": ["budget restaurants", "affordable dining"]
-    }
+    base_queries = RESTAURANT_QUERIES.get(exp, RESTAURANT_QUERIES["moderate"])
+    output = [{"preference": exp.title(), "query": q} for q in base_queries]
 
     for preference in travel_preferences:
         pref_key = preference.strip().title()
-        if pref_key in cuisine_mapping:
-            for q in cuisine_mapping[pref_key]:
-                output.append({"preference": pref_key, "query": q})
+        for q in CUISINE_QUERIES.get(pref_key, ()):
+            output.append({"preference": pref_key, "query": q})
 
-    # Deduplicate
-    unique_list = []
-    seen = set()
-    for item in output:
-        key = (item["preference"], item["query"])
-        if key not in seen:
-            seen.add(key)
-            unique_list.append(item)
-
-    return unique_list[:5]
+    return _dedupe(output)[:5]
 
 
 def generate_lodging_queries(experience_type: str, travel_preferences: List[str]):
     """Generate lodging queries with metadata."""
-    output = []
-
-    # Normalize experience type
-    if isinstance(experience_type, list):
-        experience_type = experience_type[0] if experience_type else "moderate"
-    exp = str(experience_type).lower()
-
-    # Primary lodging queries
-    experience_lodging_queries = {
-        "budget": ["budget hotels", "hostels", "affordable accommodation", "cheap hotels", "budget stays"],
-        "moderate": ["comfortable hotels", "good hotels", "mid-range accommodation", "standard hotels"],
-        "luxury": ["luxury hotels", "5-star hotels", "premium resorts", "boutique hotels", "deluxe accommodation"]
-    }
+    exp = _normalize_experience(experience_type)
 
-    base_queries = experience_lodging_queries.get(exp, experience_lodging_queries["moderate"])
-    for q in base_queries:
-        output.append({"preference": exp.title(), "query": q})
+    base_queries = LODGING_QUERIES.get(exp, LODGING_QUERIES["moderate"])
+    output = [{"preference": exp.title(), "query": q} for q in base_queries]
 
-    # Secondary preference additions
     for preference in travel_preferences:
         pref_key = preference.strip().title()
-        if pref_key == "Eco-Friendly Travel":
-            output.append({"preference": pref_key, "query": "eco hotels"})
-            output.append({"preference": pref_key, "query": "sustainable accommodation"})
-        elif pref_key == "Relaxation":
-            output.append({"preference": pref_key, "query": "spa resorts"})
-            output.append({"preference": pref_key, "query": "wellness hotels"})
-
-    # Deduplicate
-    unique_list = []
-    seen = set()
-    for item in output:
-        key = (item["preference"], item["query"])
-        if key not in seen:
-            seen.add(key)
-            unique_list.append(item)
+        for q in LODGING_PREFERENCE_QUERIES.get(pref_key, ()):
+            output.append({"preference": pref_key, "query": q})
 
-    return unique_list[:5]
\ No newline at end of file
+    return _dedupe(output)[:5]
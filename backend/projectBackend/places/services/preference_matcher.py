@@ -0,0 +1,181 @@
+# places/services/preference_matcher.py
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Any, List, Set, Tuple
+
+# ======================================================================
+# SEARCHABLE TEXT (computed once per place at ingest, stored, kept out of responses)
+# ======================================================================
+SEARCH_TEXT_KEY = "search_text"
+
+# Text-bearing fields for both Text Search (flattened) and Nearby Search places
+_SEARCH_FIELDS = (
+    "displayName",
+    "name",
+    "types",
+    "editorialSummary.text",
+    "reviewSummary.text",
+    "reviewSummary_text",
+    "formattedAddress",
+)
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _flatten(value) -> str:
+    if isinstance(value, dict):
+        return " ".join(_flatten(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(_flatten(v) for v in value)
+    if value is None:
+        return ""
+    return str(value)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents, and turn every non-alphanumeric run (incl. '_') into one space."""
+    text = unicodedata.normalize("NFKD", text)
+    text = text.encode("ascii", "ignore").decode("ascii").lower()
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def build_search_text(place: Dict[str, Any]) -> str:
+    """Normalized searchable text for a place (name, types, summaries, address)."""
+    return normalize_text(" ".join(_flatten(place.get(field)) for field in _SEARCH_FIELDS))
+
+
+def get_search_text(place: Dict[str, Any]) -> str:
+    """Stored search text, or build it for places cached before it existed."""
+    text = place.get(SEARCH_TEXT_KEY)
+    if text is None:
+        text = build_search_text(place)
+    return text
+
+
+def without_search_text(value: Any) -> Any:
+    """Copy of a response (nested dicts / lists of places) with the stored search text removed."""
+    if isinstance(value, dict):
+        return {k: without_search_text(v) for k, v in value.items() if k != SEARCH_TEXT_KEY}
+    if isinstance(value, list):
+        return [without_search_text(v) for v in value]
+    return value
+
+
+# ======================================================================
+# SYNONYMS + STEMMING
+# ======================================================================
+# Extra terms per preference on top of the preference name itself.
+PREFERENCE_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "Adventure": ("adventure", "trek", "hiking", "trail", "rafting", "climbing", "zipline",
+                  "paragliding", "camping", "amusement park", "water park", "sports"),
+    "Relaxation": ("relax", "spa", "wellness", "resort", "peaceful", "tranquil", "massage", "beach", "lake"),
+    "Culture": ("culture", "cultural", "museum", "art", "gallery", "heritage", "theater", "theatre",
+                "performing arts", "cultural center"),
+    "Shopping": ("shopping", "shop", "mall", "market", "bazaar", "boutique", "store", "souvenir", "craft"),
+    "Nature": ("nature", "natural", "park", "garden", "lake", "waterfall", "wildlife", "forest", "hill",
+               "national park", "botanical", "zoo", "beach", "scenic"),
+    "History": ("history", "historic", "historical", "monument", "fort", "palace", "archaeological",
+                "heritage", "museum", "memorial", "ruins"),
+    "Nightlife": ("nightlife", "night club", "bar", "pub", "club", "live music", "lounge", "casino"),
+    "Local Experiences": ("local", "traditional", "authentic", "workshop", "community", "market"),
+    "Romantic": ("romantic", "sunset", "viewpoint", "couple", "candlelight", "scenic"),
+    "Family-Friendly": ("family", "kids", "children", "amusement park", "zoo", "aquarium", "playground"),
+    "Solo Travel": ("solo", "hostel", "backpacker", "cafe", "walking tour"),
+    "Luxury": ("luxury", "premium", "upscale", "five star", "5 star", "fine dining", "boutique"),
+    "Budget Travel": ("budget", "cheap", "affordable", "free entry", "street food", "hostel"),
+    "Photography": ("photography", "photo", "viewpoint", "scenic", "panoramic", "sunset", "observation deck"),
+    "Spiritual & Wellness": ("spiritual", "temple", "church", "mosque", "monastery", "ashram", "meditation",
+                             "yoga", "wellness", "place of worship", "shrine", "gurudwara"),
+    "Events & Festivals": ("event", "festival", "fair", "concert", "stadium", "event venue", "exhibition"),
+    "Eco-Friendly Travel": ("eco", "sustainable", "organic", "nature reserve", "green", "conservation"),
+    "Work-Friendly Travel": ("coworking", "wifi", "cafe", "business center", "work"),
+    "Accessible Travel": ("accessible", "wheelchair", "accessibility"),
+    "Food": ("food", "cuisine", "restaurant", "cafe", "bakery", "street food", "culinary", "dining"),
+    "Food & Cuisine": ("food", "cuisine", "restaurant", "cafe", "bakery", "street food", "culinary", "dining"),
+}
+
+# Words that carry no meaning on their own inside preference names
+_STOPWORDS = {"and", "the", "of", "travel", "friendly", "experiences", "in", "for"}
+
+_SUFFIXES = ("ational", "ation", "ness", "ical", "ally", "ing", "ful", "ous", "ive", "ies",
+             "al", "ic", "es", "ly", "s", "e", "y")
+_MIN_STEM = 4
+
+
+def stem(word: str) -> str:
+    """Very small suffix-stripping stemmer (culture/cultural -> cultur, history/historic -> histor)."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[: -len(suffix)]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def token_key(word: str) -> str:
+    """Matching key of a normalized word: its stem, with plurals of short words folded (bars -> bar)."""
+    root = stem(word)
+    if root == word and len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return root
+
+
+def expand_preference_terms(preference: str) -> List[str]:
+    """Preference name (minus stopwords) plus its synonyms, normalized and deduplicated."""
+    key = preference.strip().title()
+    name_words = [w for w in normalize_text(preference).split() if w not in _STOPWORDS]
+    terms = name_words + list(PREFERENCE_SYNONYMS.get(key, ()))
+
+    seen = set()
+    result = []
+    for term in terms:
+        norm = normalize_text(term)
+        if norm and norm not in seen:
+            seen.add(norm)
+            result.append(norm)
+    return result
+
+
+# ======================================================================
+# COMPILED MATCHER
+# ======================================================================
+class PreferenceMatcher:
+    """
+    Token automaton for a whole preference set. Every term (single word or
+    phrase) is indexed by the key of its first word and mapped back to the
+    preferences that own it, so one linear pass over a place's search text
+    yields all matching preferences.
+    """
+
+    def __init__(self, preferences: Tuple[str, ...]):
+        self.preferences = preferences
+        # first token key -> [(remaining token keys, owning preference indices)]
+        self._index: Dict[str, List[Tuple[Tuple[str, ...], Set[int]]]] = {}
+
+        terms: Dict[Tuple[str, ...], Set[int]] = {}
+        for pref_idx, pref in enumerate(preferences):
+            for term in expand_preference_terms(pref):
+                keys = tuple(token_key(w) for w in term.split())
+                if keys:
+                    terms.setdefault(keys, set()).add(pref_idx)
+
+        for keys, owners in terms.items():
+            self._index.setdefault(keys[0], []).append((keys[1:], owners))
+
+    def match_keys(self, keys: List[str]) -> Set[int]:
+        """Indices of every preference that has a term in `keys` (search text split into token keys)."""
+        hits: Set[int] = set()
+        for i, key in enumerate(keys):
+            candidates = self._index.get(key)
+            if not candidates:
+                continue
+            for rest, owners in candidates:
+                if not rest or tuple(keys[i + 1: i + 1 + len(rest)]) == rest:
+                    hits |= owners
+        return hits
+
+
+@lru_cache(maxsize=256)
+def get_preference_matcher(preferences: Tuple[str, ...]) -> PreferenceMatcher:
+    """Compiled matcher, cached per preference set."""
+    return PreferenceMatcher(preferences)
@@ -0,0 +1,157 @@
+# places/services/preference_scoring.py
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from places.services.place_queries import QueryCatalog, get_query_catalog
+from places.services.preference_matcher import (
+    normalize_text,
+    token_key,
+    expand_preference_terms,
+    get_preference_matcher,
+)
+
+# Minimum combined score for a place to be assigned to a preference
+SCORE_THRESHOLD = 0.12
+# Added to a preference's score when the place literally mentions one of its terms
+LITERAL_MATCH_BOOST = 0.5
+# Words of the preference name count more than query / synonym words
+NAME_TERM_WEIGHT = 2.0
+
+# Filler words from the query catalog that say nothing about a preference
+_GENERIC_WORDS = {
+    "and", "the", "of", "in", "for", "with", "to", "a", "an",
+    "spots", "spot", "places", "place", "attractions", "attraction", "sites", "site",
+    "activities", "destinations", "experiences", "venues", "centers", "areas", "travel",
+    "friendly", "point", "interest", "establishment", "tourist",
+}
+
+
+def tokenize(normalized_text: str) -> List[str]:
+    """Stemmed content tokens of already-normalized text."""
+    return [token_key(w) for w in normalized_text.split() if len(w) > 2 and w not in _GENERIC_WORDS]
+
+
+def _split_keys(normalized_text: str) -> Tuple[List[str], List[str]]:
+    """(all token keys for the matcher, content token keys for scoring) in one pass."""
+    all_keys, content_keys = [], []
+    for w in normalized_text.split():
+        key = token_key(w)
+        all_keys.append(key)
+        if len(w) > 2 and w not in _GENERIC_WORDS:
+            content_keys.append(key)
+    return all_keys, content_keys
+
+
+class PreferenceScorer:
+    """
+    TF-IDF relevance of places to a preference set.
+
+    Each preference is a bag of words built from its name, its synonyms and its
+    queries in config/preference_queries.json. Places are vectorized over that
+    vocabulary (sublinear TF, IDF over the current candidate pool) and scored
+    against every preference with a single matrix product.
+    """
+
+    def __init__(self, preferences: Tuple[str, ...], catalog: QueryCatalog = None):
+        self.preferences = preferences
+        self.matcher = get_preference_matcher(preferences)
+        catalog = catalog or get_query_catalog()
+
+        self.vocab: Dict[str, int] = {}
+        pref_weights: List[Dict[int, float]] = []
+
+        for pref in preferences:
+            weights: Dict[int, float] = {}
+
+            def add(text: str, weight: float):
+                for token in tokenize(normalize_text(text)):
+                    idx = self.vocab.setdefault(token, len(self.vocab))
+                    weights[idx] = weights.get(idx, 0.0) + weight
+
+            add(pref, NAME_TERM_WEIGHT)
+            for term in expand_preference_terms(pref):
+                add(term, 1.0)
+            for query in catalog.queries.get(pref.strip().title(), ()):
+                add(query, 1.0)
+            pref_weights.append(weights)
+
+        self.query_matrix = np.zeros((len(preferences), max(len(self.vocab), 1)), dtype=np.float32)
+        for row, weights in enumerate(pref_weights):
+            for idx, weight in weights.items():
+                self.query_matrix[row, idx] = weight
+
+    def _term_counts(self, token_lists: List[List[str]]) -> np.ndarray:
+        n, v = len(token_lists), self.query_matrix.shape[1]
+        vocab = self.vocab
+        flat_idx = []
+        for i, tokens in enumerate(token_lists):
+            base = i * v
+            for token in tokens:
+                j = vocab.get(token)
+                if j is not None:
+                    flat_idx.append(base + j)
+        counts = np.bincount(np.asarray(flat_idx, dtype=np.int64), minlength=n * v)
+        return counts.reshape(n, v).astype(np.float32)
+
+    def score(self, texts: List[str]) -> np.ndarray:
+        """Cosine similarity matrix of shape (len(texts), len(preferences))."""
+        return self._score_tokens([tokenize(text) for text in texts])
+
+    def _score_tokens(self, token_lists: List[List[str]]) -> np.ndarray:
+        n = len(token_lists)
+        tf = self._term_counts(token_lists)
+        df = np.count_nonzero(tf, axis=0)
+        idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+
+        place_vecs = np.log1p(tf) * idf
+        place_vecs /= np.maximum(np.linalg.norm(place_vecs, axis=1, keepdims=True), 1e-9)
+
+        pref_vecs = self.query_matrix * idf
+        pref_vecs /= np.maximum(np.linalg.norm(pref_vecs, axis=1, keepdims=True), 1e-9)
+
+        return place_vecs @ pref_vecs.T
+
+    def assign(self, texts: List[str]) -> List[Optional[int]]:
+        """Best preference index per text, or None if nothing scores above the threshold."""
+        if not texts or not self.preferences:
+            return [None] * len(texts)
+
+        split = [_split_keys(text) for text in texts]
+        scores = self._score_tokens([content for _, content in split])
+        for i, (all_keys, _) in enumerate(split):
+            for pref_idx in self.matcher.match_keys(all_keys):
+                scores[i, pref_idx] += LITERAL_MATCH_BOOST
+
+        # argmax keeps the earliest preference on ties
+        best = scores.argmax(axis=1)
+        top = scores[np.arange(len(texts)), best]
+        return [int(b) if t >= SCORE_THRESHOLD else None for b, t in zip(best, top)]
+
+
+# (preferences, catalog version) -> scorer, least recently used first
+_SCORER_CACHE_SIZE = 128
+_scorers: "OrderedDict[Tuple[Tuple[str, ...], int], PreferenceScorer]" = OrderedDict()
+_scorers_lock = threading.Lock()
+
+
+def get_preference_scorer(preferences: Tuple[str, ...]) -> PreferenceScorer:
+    """
+    Scorer (vocabulary + preference vectors), cached per preference set and
+    query catalog version (a reloaded catalog builds new scorers). The scorer
+    is built from the same catalog snapshot whose version keys it.
+    """
+    catalog = get_query_catalog()
+    key = (preferences, catalog.version)
+    with _scorers_lock:
+        scorer = _scorers.get(key)
+        if scorer is not None:
+            _scorers.move_to_end(key)
+            return scorer
+
+    scorer = PreferenceScorer(preferences, catalog)
+    with _scorers_lock:
+        _scorers[key] = scorer
+        while len(_scorers) > _SCORER_CACHE_SIZE:
+            _scorers.popitem(last=False)
+    return scorer
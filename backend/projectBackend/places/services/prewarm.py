@@ -0,0 +1,237 @@
+# places/services/prewarm.py
+import time
+from collections import Counter
+from datetime import datetime, time as dtime
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from django.conf import settings
+from places.services.db_helpers import build_cache_key
+from places.services.write_behind import WRITE_BEHIND
+
+_DEFAULTS = {
+    "destinations": 300,        # most-requested destinations to cover
+    "combos": 8,                # most common (preferences, experience) combinations across all trips
+    "per_minute": 6,            # cache entries built per minute (each costs ~7 Places calls + a nearby search)
+    "window": None,             # off-peak window "HH:MM-HH:MM" (local time); None = any time
+}
+OPTIONS = {**_DEFAULTS, **getattr(settings, "PREWARM", {})}
+
+# Used when trip_details has no history yet
+DEFAULT_COMBOS: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    ((), "moderate"),
+    ((), "budget"),
+    ((), "luxury"),
+)
+
+Combo = Tuple[Tuple[str, ...], str]
+
+
+class PrewarmTarget(NamedTuple):
+    destination: str
+    preferences: Tuple[str, ...]
+    experience_type: str
+    cache_key: str
+
+
+# ======================================================================
+# DEMAND (trip_details history)
+# ======================================================================
+def _normalize_destination(value: Any) -> str:
+    return " ".join(str(value or "").split())
+
+
+def _normalize_combo(preferences: Any, experience_type: Any) -> Combo:
+    prefs = preferences if isinstance(preferences, list) else []
+    cleaned = sorted({str(p).strip().title() for p in prefs if str(p).strip()})
+    return tuple(cleaned), str(experience_type or "moderate").strip().lower()
+
+
+# Raw (preferences, experience) groups fetched per wanted combo: spelling / order
+# variants of one combo are separate groups in Mongo and merged afterwards
+COMBO_GROUP_HEADROOM = 4
+
+
+def _destination_pipeline(limit: int) -> List[Dict[str, Any]]:
+    return [
+        {"$match": {"to_location": {"$type": "string"}}},
+        # Sorting on the indexed field lets the first $group run as a covered to_location_1 scan
+        {"$sort": {"to_location": 1}},
+        {"$group": {"_id": "$to_location", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        # Case-insensitive count, reported with the most common spelling
+        {"$group": {
+            "_id": {"$toLower": {"$trim": {"input": "$_id"}}},
+            "count": {"$sum": "$count"},
+            "spelling": {"$first": "$_id"},
+        }},
+        {"$match": {"_id": {"$ne": ""}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+
+
+def _combo_pipeline(limit: int) -> List[Dict[str, Any]]:
+    return [
+        {"$group": {
+            "_id": {"preferences": "$travel_preferences", "experience_type": "$experience_type"},
+            "count": {"$sum": 1},
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": limit},
+    ]
+
+
+def demand_from_trips(db=None, max_destinations: Optional[int] = None,
+                      max_combos: Optional[int] = None) -> Tuple[Counter, Counter]:
+    """
+    (destination counts, (preferences, experience) combo counts) over
+    trip_details, aggregated in Mongo and limited to the most frequent
+    values. Destinations are counted case-insensitively and reported with
+    their most common spelling. max_destinations=0 skips the destination query.
+    """
+    db = db if db is not None else settings.MONGO_DB
+    max_destinations = OPTIONS["destinations"] if max_destinations is None else max_destinations
+    max_combos = max_combos or OPTIONS["combos"]
+
+    destinations: Counter = Counter()
+    spellings: Dict[str, str] = {}
+    if max_destinations:
+        for row in db.trip_details.aggregate(_destination_pipeline(max_destinations), allowDiskUse=True):
+            destination = _normalize_destination(row["spelling"])
+            key = destination.lower()
+            destinations[key] += row["count"]
+            spellings.setdefault(key, destination)
+
+    combos: Counter = Counter()
+    for row in db.trip_details.aggregate(_combo_pipeline(max_combos * COMBO_GROUP_HEADROOM), allowDiskUse=True):
+        group = row["_id"] or {}
+        combos[_normalize_combo(group.get("preferences"), group.get("experience_type"))] += row["count"]
+
+    named = Counter({spellings[key]: n for key, n in destinations.items()})
+    return named, combos
+
+
+def build_plan(destinations: Sequence[str], combos: Sequence[Combo]) -> List[PrewarmTarget]:
+    """Every (destination, combo) pair, in the given priority order (destination-major)."""
+    plan = []
+    seen = set()
+    for destination in destinations:
+        for prefs, experience in combos:
+            cache_key = build_cache_key(destination, list(prefs), experience)
+            if cache_key not in seen:
+                seen.add(cache_key)
+                plan.append(PrewarmTarget(destination, prefs, experience, cache_key))
+    return plan
+
+
+def default_plan(destinations: Optional[Sequence[str]] = None, max_destinations: Optional[int] = None,
+                 max_combos: Optional[int] = None, db=None) -> List[PrewarmTarget]:
+    """
+    Plan from demand: the explicit destinations (or the most frequent
+    trip_details.to_location values) times the most common combos.
+    """
+    max_destinations = max_destinations or OPTIONS["destinations"]
+    max_combos = max_combos or OPTIONS["combos"]
+    dest_counts, combo_counts = demand_from_trips(db, 0 if destinations else max_destinations, max_combos)
+
+    if not destinations:
+        destinations = [d for d, _ in dest_counts.most_common(max_destinations)]
+    combos = [c for c, _ in combo_counts.most_common(max_combos)] or list(DEFAULT_COMBOS[:max_combos])
+    return build_plan(destinations, combos)
+
+
+# ======================================================================
+# COVERAGE / RESUME
+# ======================================================================
+def cached_keys(keys: Sequence[str], db=None, chunk: int = 500) -> set:
+    """Keys that already have a trip_places_cache document (or a queued write)."""
+    db = db if db is not None else settings.MONGO_DB
+    found = {k for k in keys if WRITE_BEHIND.get_pending("trip_places_cache", k) is not None}
+    rest = [k for k in keys if k not in found]
+    for start in range(0, len(rest), chunk):
+        ids = rest[start:start + chunk]
+        found.update(doc["_id"] for doc in db.trip_places_cache.find({"_id": {"$in": ids}}, {"_id": 1}))
+    return found
+
+
+def coverage(plan: Sequence[PrewarmTarget], db=None) -> Dict[str, Any]:
+    """Cached / planned entries overall and per destination."""
+    cached = cached_keys([t.cache_key for t in plan], db)
+    per_destination: Dict[str, List[int]] = {}
+    for target in plan:
+        row = per_destination.setdefault(target.destination, [0, 0])
+        row[1] += 1
+        row[0] += target.cache_key in cached
+    return {
+        "planned": len(plan),
+        "cached": len(cached),
+        "ratio": round(len(cached) / len(plan), 4) if plan else 1.0,
+        "destinations": {d: {"cached": c, "planned": p} for d, (c, p) in per_destination.items()},
+    }
+
+
+# ======================================================================
+# OFF-PEAK WINDOW / RATE BUDGET
+# ======================================================================
+def parse_window(window: Optional[str]) -> Optional[Tuple[dtime, dtime]]:
+    """Parse "01:00-06:00" into (start, end); None / "" -> None. Windows may wrap midnight."""
+    if not window:
+        return None
+    start, end = (datetime.strptime(part.strip(), "%H:%M").time() for part in window.split("-", 1))
+    return start, end
+
+
+def in_window(window: Optional[Tuple[dtime, dtime]], now: Optional[datetime] = None) -> bool:
+    if window is None:
+        return True
+    current = (now or datetime.now()).time()
+    start, end = window
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class RateBudget:
+    """Paces work to `per_minute` items, with an optional cap on the total."""
+
+    def __init__(self, per_minute: float, max_items: Optional[int] = None):
+        self.interval = 60.0 / per_minute if per_minute and per_minute > 0 else 0.0
+        self.max_items = max_items
+        self.used = 0
+        self._next_at = 0.0
+
+    def exhausted(self) -> bool:
+        return self.max_items is not None and self.used >= self.max_items
+
+    def acquire(self) -> None:
+        """Block until the next item may start."""
+        wait = self._next_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._next_at = time.monotonic() + self.interval
+        self.used += 1
+
+
+# ======================================================================
+# RUN
+# ======================================================================
+def pending_targets(plan: Sequence[PrewarmTarget], db=None, chunk: int = 100) -> Iterator[PrewarmTarget]:
+    """Targets without a cache entry, checked chunk by chunk so a long run sees entries built meanwhile."""
+    for start in range(0, len(plan), chunk):
+        batch = plan[start:start + chunk]
+        done = cached_keys([t.cache_key for t in batch], db)
+        for target in batch:
+            if target.cache_key not in done:
+                yield target
+
+
+def warm_target(target: PrewarmTarget) -> Optional[str]:
+    """Build one entry through the normal request pipeline. Returns an error message or None."""
+    # Imported here: views pulls in the whole request stack
+    from places.views import get_preference_based_places
+
+    result = get_preference_based_places(
+        None, target.destination, ",".join(target.preferences), target.experience_type
+    )
+    if isinstance(result, dict) and result.get("error"):
+        return str(result["error"])
+    return None
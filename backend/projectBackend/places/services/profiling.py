@@ -0,0 +1,220 @@
+# places/services/profiling.py
+import asyncio
+import cProfile
+import functools
+import inspect
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE"          # X-Profile: 1
+PROFILE_QUERY_PARAM = "profile"             # ?profile=1
+REQUEST_ID_HEADER = "HTTP_X_REQUEST_ID"     # X-Request-ID: <id> (optional)
+
+TOP_FUNCTIONS = 40
+CALL_TREE_DEPTH = 8
+CALL_TREE_WIDTH = 6
+
+# Views call each other internally (generate_itinerary -> get_preference_based_places).
+# The outermost wrapper decides once per request, so inner views neither profile
+# again nor re-check the user (request.user must not be touched from async code).
+_profiling_decided: ContextVar[bool] = ContextVar("profiling_decided", default=False)
+
+# Only one profiler can be active per process (3.12+ raises ValueError otherwise);
+# requests arriving while another one is profiled simply run unprofiled.
+_profiler_lock = threading.Lock()
+
+
+def get_profiles_dir() -> Path:
+    profiles_dir = Path(getattr(settings, "PROFILES_DIR", Path(settings.BASE_DIR) / "profiles"))
+    profiles_dir.mkdir(parents=True, exist_ok=True)
+    return profiles_dir
+
+
+def _flag_is_set(value: Optional[str]) -> bool:
+    return str(value or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _profiling_requested(request) -> bool:
+    if request is None or not hasattr(request, "META"):
+        return False
+    if _flag_is_set(request.META.get(PROFILE_HEADER)):
+        return True
+    return _flag_is_set(getattr(request, "GET", {}).get(PROFILE_QUERY_PARAM))
+
+
+def _is_staff(user) -> bool:
+    return bool(user and user.is_authenticated and (user.is_staff or user.is_superuser))
+
+
+def _request_id(request) -> str:
+    rid = request.META.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    # Used as a file name: keep it boring
+    return "".join(c for c in rid if c.isalnum() or c in "-_")[:64] or uuid.uuid4().hex
+
+
+# ======================================================================
+# PROFILE SUMMARY
+# ======================================================================
+def _func_label(func) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        return name
+    return f"{name} ({Path(filename).name}:{lineno})"
+
+
+def _top_functions(stats: pstats.Stats) -> List[Dict[str, Any]]:
+    rows = []
+    for func, (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append({
+            "function": _func_label(func),
+            "calls": nc,
+            "primitive_calls": cc,
+            "self_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3),
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def _call_tree(stats: pstats.Stats, root_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild a (pruned) call tree from the caller graph recorded by cProfile,
+    starting at the profiled view function.
+    """
+    callees: Dict[tuple, Dict[tuple, float]] = {}
+    for func, (_cc, _nc, _tt, _ct, callers) in stats.stats.items():
+        for caller, caller_stats in callers.items():
+            callees.setdefault(caller, {})[func] = caller_stats[3]
+
+    roots = [f for f in stats.stats if f[2] == root_name]
+    if not roots:
+        return None
+    root = max(roots, key=lambda f: stats.stats[f][3])
+
+    def build(func, cumulative, depth, path):
+        node = {"function": _func_label(func), "cumulative_ms": round(cumulative * 1000, 3)}
+        if depth < CALL_TREE_DEPTH:
+            children = sorted(callees.get(func, {}).items(), key=lambda kv: kv[1], reverse=True)
+            node["children"] = [
+                build(child, child_ct, depth + 1, path | {child})
+                for child, child_ct in children[:CALL_TREE_WIDTH]
+                if child not in path
+            ]
+        return node
+
+    return build(root, stats.stats[root][3], 0, {root})
+
+
+def _store_profile(profiler: cProfile.Profile, request, request_id: str, view_name: str, elapsed_ms: float) -> None:
+    try:
+        profiles_dir = get_profiles_dir()
+        profiler.dump_stats(str(profiles_dir / f"{request_id}.prof"))
+
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        summary = {
+            "request_id": request_id,
+            "view": view_name,
+            "method": request.method,
+            "path": request.get_full_path(),
+            "created_at": datetime.now().isoformat(),
+            "total_ms": round(elapsed_ms, 3),
+            "top_functions": _top_functions(stats),
+            "call_tree": _call_tree(stats, view_name),
+        }
+        with open(profiles_dir / f"{request_id}.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        logger.info(f"Stored profile {request_id} for {view_name}")
+    except Exception as e:
+        logger.error(f"Storing profile {request_id} failed: {e}")
+
+
+def _mark_profiled(request, request_id: str) -> None:
+    # Views may return plain dicts; ServerTimingMiddleware copies this into X-Profile-Id.
+    request.profile_id = request_id
+
+
+def _profile_call(func, request, view_name: str, *args, **kwargs):
+    """Run func under cProfile and store the result, or run it plain if a profile is in progress."""
+    if not _profiler_lock.acquire(blocking=False):
+        logger.info(f"Profiler busy; {view_name} runs unprofiled")
+        return func(request, *args, **kwargs)
+    try:
+        request_id = _request_id(request)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = func(request, *args, **kwargs)
+        finally:
+            profiler.disable()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _store_profile(profiler, request, request_id, view_name, elapsed_ms)
+    finally:
+        _profiler_lock.release()
+    _mark_profiled(request, request_id)
+    return response
+
+
+# ======================================================================
+# DECORATOR
+# ======================================================================
+def profile_request(view_func):
+    """
+    Opt-in per-request profiler for Ninja views (sync or async).
+
+    Triggered by `X-Profile: 1` or `?profile=1` from a staff user; every other
+    request goes straight through. The deterministic profile (.prof) plus a
+    JSON summary (top functions + call tree) are written to PROFILES_DIR,
+    keyed by X-Request-ID or a generated id (returned as X-Profile-Id).
+    Async views are profiled on a private event loop in a worker thread, so
+    coroutines of other requests on the server loop are not recorded.
+    """
+    view_name = view_func.__name__
+
+    if inspect.iscoroutinefunction(view_func):
+        def run_on_private_loop(request, *args, **kwargs):
+            return asyncio.run(view_func(request, *args, **kwargs))
+
+        @functools.wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if _profiling_decided.get() or not _profiling_requested(request):
+                return await view_func(request, *args, **kwargs)
+            token = _profiling_decided.set(True)
+            try:
+                if not _is_staff(await request.auser()):
+                    return await view_func(request, *args, **kwargs)
+                # to_thread copies the context (request timings, _profiling_decided)
+                return await asyncio.to_thread(
+                    _profile_call, run_on_private_loop, request, view_name, *args, **kwargs
+                )
+            finally:
+                _profiling_decided.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(view_func)
+    def sync_wrapper(request, *args, **kwargs):
+        if _profiling_decided.get() or not _profiling_requested(request):
+            return view_func(request, *args, **kwargs)
+        token = _profiling_decided.set(True)
+        try:
+            if not _is_staff(getattr(request, "user", None)):
+                return view_func(request, *args, **kwargs)
+            return _profile_call(view_func, request, view_name, *args, **kwargs)
+        finally:
+            _profiling_decided.reset(token)
+
+    return sync_wrapper
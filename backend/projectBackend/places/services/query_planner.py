@@ -0,0 +1,173 @@
+# places/services/query_planner.py
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set
+from django.conf import settings
+from pymongo.errors import PyMongoError
+from places.services.metrics import stage
+from places.services.write_behind import WRITE_BEHIND
+
+_DEFAULTS = {
+    # Unique places each category should end up with for a single preference
+    "targets": {"tourist": 40, "restaurants": 25, "lodging": 20},
+    # Added to the target for every further preference (lodging does not depend on them)
+    "per_preference": {"tourist": 10, "restaurants": 5, "lodging": 0},
+    # Upper bound on paid Text Search calls per category
+    "max_queries": {"tourist": 3, "restaurants": 2, "lodging": 2},
+    # Expected new places for a query that has never run (Text Search returns up to 20)
+    "prior_yield": 12.0,
+    # Weight of the prior, in runs, when averaging observed yields
+    "prior_runs": 1.0,
+}
+OPTIONS = {**_DEFAULTS, **getattr(settings, "QUERY_PLANNER", {})}
+
+# Rating buckets tracked per query (well-rated places are worth more to the itinerary)
+_RATING_BUCKETS = (("lt3", 3.0), ("3_4", 4.0), ("4_45", 4.5), ("ge45", float("inf")))
+_GOOD_BUCKETS = ("4_45", "ge45")
+
+
+def _rating_bucket(rating: Optional[float]) -> str:
+    if rating is None:
+        return "none"
+    for name, upper in _RATING_BUCKETS:
+        if rating < upper:
+            return name
+    return _RATING_BUCKETS[-1][0]
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def _stat_id(destination: str, query: str) -> str:
+    return f"{_normalize(destination)}|{_normalize(query)}"
+
+
+def _tie_break(seed: str, query: str) -> str:
+    """Stable per (seed, query) ordering, the same in every process (unlike hash())."""
+    return hashlib.sha1(f"{seed}|{query}".encode("utf-8")).hexdigest()
+
+
+class QueryPlanner:
+    """
+    Chooses which Text Search queries to run for a destination.
+
+    Each (destination, query) keeps running totals in the `query_stats`
+    collection: runs, places returned, new unique places added (not already
+    returned by an earlier query of the same request) and a rating histogram.
+    plan() greedily takes the queries with the highest expected yield until
+    the expected unique places reach the category target, breaking ties with
+    a hash of the cache key, so the same request always runs the same queries.
+    """
+
+    def __init__(self, destination: str, seed: str, candidates: List[Dict[str, str]], db=None, write_behind=None):
+        self.destination = destination
+        self.seed = seed
+        self._db = db
+        self._write_behind = write_behind or WRITE_BEHIND
+        self._stats = self._load_stats([c["query"] for c in candidates])
+        self._seen: Dict[str, Set[str]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def db(self):
+        return self._db if self._db is not None else settings.MONGO_DB
+
+    def _load_stats(self, queries: List[str]) -> Dict[str, Dict[str, Any]]:
+        ids = list({_stat_id(self.destination, q) for q in queries})
+        if not ids:
+            return {}
+        try:
+            with stage("mongo_load", desc="query_stats"):
+                return {doc["_id"]: doc for doc in self.db.query_stats.find({"_id": {"$in": ids}})}
+        except PyMongoError as e:
+            print(f"Query stats unavailable, planning with priors: {e}")
+            return {}
+
+    # ------------------------------------------------------------------
+    # Planning
+    # ------------------------------------------------------------------
+    def expected_yield(self, query: str) -> float:
+        """Mean new unique places per run, smoothed towards the prior for rarely run queries."""
+        stats = self._stats.get(_stat_id(self.destination, query)) or {}
+        k = OPTIONS["prior_runs"]
+        return (stats.get("new_unique", 0) + OPTIONS["prior_yield"] * k) / (stats.get("runs", 0) + k)
+
+    def good_share(self, query: str) -> float:
+        """Smoothed share of returned places rated 4.0 or higher."""
+        ratings = (self._stats.get(_stat_id(self.destination, query)) or {}).get("ratings") or {}
+        good = sum(ratings.get(b, 0) for b in _GOOD_BUCKETS)
+        return (good + 1.0) / (sum(ratings.values()) + 2.0)
+
+    def target(self, category: str, candidates: List[Dict[str, str]]) -> int:
+        """Category target, raised for every preference beyond the first among the candidates."""
+        preferences = len({c.get("preference") for c in candidates})
+        extra = OPTIONS["per_preference"].get(category, 0) * max(preferences - 1, 0)
+        return OPTIONS["targets"].get(category, 20) + extra
+
+    def plan(self, category: str, candidates: List[Dict[str, str]],
+             target: Optional[int] = None, max_queries: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Smallest prefix of the ranked candidates expected to reach `target`
+        unique places, capped at `max_queries`. A preference that already has a
+        query picked counts for less, so the plan still spreads over preferences.
+        """
+        target = target or self.target(category, candidates)
+        max_queries = max_queries or OPTIONS["max_queries"].get(category, 2)
+
+        remaining = list(candidates)
+        picked: List[Dict[str, str]] = []
+        per_pref: Dict[str, int] = {}
+        expected = 0.0
+
+        while remaining and len(picked) < max_queries and expected < target:
+            def score(c):
+                base = self.expected_yield(c["query"]) * (0.75 + 0.25 * self.good_share(c["query"]))
+                return (-base / (1 + per_pref.get(c["preference"], 0)), _tie_break(self.seed, c["query"]))
+
+            best = min(remaining, key=score)
+            remaining.remove(best)
+            picked.append(best)
+            per_pref[best["preference"]] = per_pref.get(best["preference"], 0) + 1
+            expected += self.expected_yield(best["query"])
+
+        return picked
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+    def record(self, category: str, query: str, places: List[Dict[str, Any]]) -> None:
+        """Account one executed query (call in execution order; `places` as returned)."""
+        seen = self._seen.setdefault(category, set())
+        new_unique = 0
+        ratings: Dict[str, int] = {}
+        for place in places:
+            pid = place.get("id")
+            if pid and pid not in seen:
+                seen.add(pid)
+                new_unique += 1
+            bucket = _rating_bucket(place.get("rating"))
+            ratings[bucket] = ratings.get(bucket, 0) + 1
+
+        entry = self._pending.setdefault(query, {"runs": 0, "returned": 0, "new_unique": 0, "ratings": {}})
+        entry["runs"] += 1
+        entry["returned"] += len(places)
+        entry["new_unique"] += new_unique
+        for bucket, count in ratings.items():
+            entry["ratings"][bucket] = entry["ratings"].get(bucket, 0) + count
+
+    def flush(self) -> None:
+        """Queue the recorded runs as $inc upserts on query_stats (written behind the request)."""
+        if not self._pending:
+            return
+        now = datetime.now()
+        with stage("mongo_save", desc="query_stats queued"):
+            for query, entry in self._pending.items():
+                inc = {"runs": entry["runs"], "returned": entry["returned"], "new_unique": entry["new_unique"]}
+                inc.update({f"ratings.{bucket}": count for bucket, count in entry["ratings"].items()})
+                self._write_behind.update("query_stats", _stat_id(self.destination, query), {
+                    "$inc": inc,
+                    "$set": {"last_run": now},
+                    "$setOnInsert": {"destination": _normalize(self.destination), "query": _normalize(query)},
+                })
+        self._pending = {}
@@ -0,0 +1,302 @@
+# places/services/route_planner.py
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional
+import numpy as np
+from places.services.geo_utils import haversine_matrix, extract_lat_lng
+
+KMEANS_MAX_ITER = 12
+TWO_OPT_MAX_PASSES = 4
+
+# ======================================================================
+# HELPERS
+# ======================================================================
+def _rating_key(place: Dict[str, Any]):
+    return (
+        place.get("rating") is not None,
+        place.get("rating") or 0,
+        place.get("user_rating_count") or place.get("userRatingCount") or 0,
+    )
+
+
+def _parse_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.strptime(value[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    return None
+
+
+def opening_hours_by_id(places: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Weekday descriptions of raw Google places by place id (kept out of the simplified places sent to the AI)."""
+    hours = {}
+    for place in places:
+        descriptions = place.get("currentOpeningHours")
+        if place.get("id") and isinstance(descriptions, list):
+            hours[place["id"]] = descriptions
+    return hours
+
+
+def is_closed_on(place: Dict[str, Any], weekday_name: str, hours: Optional[List[str]] = None) -> bool:
+    """True when the place's weekday descriptions say it is closed that day ("Monday: Closed")."""
+    if hours is None:
+        hours = place.get("opening_hours") or place.get("currentOpeningHours") or []
+    if not isinstance(hours, list):
+        return False
+    for line in hours:
+        if isinstance(line, str) and line.lower().startswith(weekday_name.lower()):
+            return "closed" in line.lower()
+    return False
+
+
+# ======================================================================
+# BALANCED K-MEANS
+# ======================================================================
+def _init_centroids(coords: np.ndarray, k: int) -> np.ndarray:
+    """Deterministic farthest-point seeding, starting from the first (best rated) point."""
+    chosen = [0]
+    min_dist = haversine_matrix(coords, coords[:1])[:, 0]
+    for _ in range(1, k):
+        nxt = int(np.argmax(min_dist))
+        chosen.append(nxt)
+        min_dist = np.minimum(min_dist, haversine_matrix(coords, coords[nxt:nxt + 1])[:, 0])
+    return coords[chosen].copy()
+
+
+def _balanced_assign(dist: np.ndarray, capacity: int) -> np.ndarray:
+    """Greedy capacity-constrained assignment: closest (point, cluster) pairs first."""
+    n, k = dist.shape
+    labels = [-1] * n
+    remaining = [capacity] * k
+    assigned = 0
+    # Plain Python ints in the loop: numpy scalar indexing is ~10x slower here
+    for flat in np.argsort(dist, axis=None, kind="stable").tolist():
+        point, cluster = divmod(flat, k)
+        if labels[point] != -1 or remaining[cluster] == 0:
+            continue
+        labels[point] = cluster
+        remaining[cluster] -= 1
+        assigned += 1
+        if assigned == n:
+            break
+    return np.asarray(labels, dtype=np.int64)
+
+
+def balanced_kmeans(coords: np.ndarray, k: int) -> np.ndarray:
+    """Cluster (n, 2) lat/lng points into k spatially compact groups of near-equal size."""
+    n = len(coords)
+    if k <= 1 or n <= 1:
+        return np.zeros(n, dtype=np.int64)
+    k = min(k, n)
+    capacity = math.ceil(n / k)
+
+    centroids = _init_centroids(coords, k)
+    labels = None
+    for _ in range(KMEANS_MAX_ITER):
+        new_labels = _balanced_assign(haversine_matrix(coords, centroids), capacity)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = coords[labels == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return labels
+
+
+# ======================================================================
+# INTRA-DAY ORDERING (open-path TSP heuristic)
+# ======================================================================
+def _path_length(order: List[int], dist: np.ndarray) -> float:
+    return float(sum(dist[order[i], order[i + 1]] for i in range(len(order) - 1)))
+
+
+def order_route(dist: np.ndarray) -> List[int]:
+    """Nearest-neighbour from every start, best one refined with 2-opt."""
+    n = len(dist)
+    if n <= 2:
+        return list(range(n))
+
+    best_order, best_len = None, math.inf
+    for start in range(n):
+        order = [start]
+        unvisited = set(range(n)) - {start}
+        while unvisited:
+            last = order[-1]
+            nxt = min(unvisited, key=lambda j: dist[last, j])
+            order.append(nxt)
+            unvisited.remove(nxt)
+        length = _path_length(order, dist)
+        if length < best_len:
+            best_order, best_len = order, length
+
+    order = best_order
+    for _ in range(TWO_OPT_MAX_PASSES):
+        improved = False
+        for i in range(0, n - 2):
+            for j in range(i + 2, n):
+                # reverse order[i+1..j]; last edge only exists when j < n-1
+                before = dist[order[i], order[i + 1]] + (dist[order[j], order[j + 1]] if j < n - 1 else 0.0)
+                after = dist[order[i], order[j]] + (dist[order[i + 1], order[j + 1]] if j < n - 1 else 0.0)
+                if after + 1e-9 < before:
+                    order[i + 1: j + 1] = reversed(order[i + 1: j + 1])
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+# ======================================================================
+# DAY PLANS
+# ======================================================================
+def nearest_places(
+    places: List[Dict[str, Any]],
+    centroid: Optional[np.ndarray],
+    count: int,
+) -> List[Dict[str, Any]]:
+    """`count` places closest to the centroid (located first), falling back to list order."""
+    if centroid is None or not places:
+        return places[:count]
+    located = [(i, extract_lat_lng(p)) for i, p in enumerate(places)]
+    located = [(i, ll) for i, ll in located if ll is not None]
+    if not located:
+        return places[:count]
+
+    coords = np.array([ll for _, ll in located], dtype=np.float64)
+    dist = haversine_matrix(coords, centroid[None, :])[:, 0]
+    picked = [places[located[j][0]] for j in np.argsort(dist, kind="stable")[:count]]
+    if len(picked) < count:
+        picked_ids = {id(p) for p in picked}
+        picked += [p for p in places if id(p) not in picked_ids][: count - len(picked)]
+    return picked
+
+
+def _pick_compact(candidates: List[int], located: List[Dict[str, Any]], dist: np.ndarray, per_day: int) -> List[int]:
+    """Best-rated candidate as anchor, then the closest well-rated places around it."""
+    if len(candidates) <= per_day:
+        return list(candidates)
+    anchor = candidates[0]
+
+    def cost(j):
+        rating = located[j].get("rating") or 3.0
+        return dist[anchor, j] / (max(rating, 1.0) / 5.0) ** 2
+
+    return [anchor] + sorted(candidates[1:], key=cost)[: per_day - 1]
+
+
+def plan_day_routes(
+    attractions: List[Dict[str, Any]],
+    days: int,
+    per_day: int = 5,
+    start_date=None,
+    allow_repeats: bool = True,
+    opening_hours: Optional[Dict[str, List[str]]] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Split candidate attractions into `days` spatially compact days of `per_day`
+    stops each, ordered as a short walking/driving path. Places closed on a
+    day's weekday (when start_date is known) are picked last; their hours come
+    from `opening_hours` (place id -> weekday descriptions, see
+    opening_hours_by_id) or the place itself. With
+    allow_repeats, short days are topped up with places already used.
+
+    Returns one dict per day with "attractions", "centroid" (np.array or None)
+    and "route_distance_km", or None when no candidate has coordinates (callers
+    then keep their rating-order logic).
+    """
+    if days <= 0 or not attractions:
+        return None
+    opening_hours = opening_hours or {}
+
+    located_idx = []
+    coords_list = []
+    for i, place in enumerate(attractions):
+        ll = extract_lat_lng(place)
+        if ll is not None:
+            located_idx.append(i)
+            coords_list.append(ll)
+    if not coords_list:
+        return None
+
+    # Best-rated first so seeding and top-ups prefer good places
+    order = sorted(range(len(located_idx)), key=lambda j: _rating_key(attractions[located_idx[j]]), reverse=True)
+    located = [attractions[located_idx[j]] for j in order]
+    coords = np.array([coords_list[j] for j in order], dtype=np.float64)
+    located_set = set(located_idx)
+    unlocated = [p for i, p in enumerate(attractions) if i not in located_set]
+
+    labels = balanced_kmeans(coords, days)
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    full_dist = haversine_matrix(coords)
+
+    start = _parse_date(start_date)
+    used = set()
+    # Members stay rating-sorted because `located` is
+    day_members: List[List[int]] = [[] for _ in range(n_clusters)]
+    for j, c in enumerate(labels):
+        day_members[int(c)].append(j)
+
+    # Strongest cluster first
+    day_members.sort(key=lambda m: _rating_key(located[m[0]]) if m else (False, 0, 0), reverse=True)
+    while len(day_members) < days:
+        day_members.append([])
+
+    plans = []
+    for day_idx, members in enumerate(day_members[:days]):
+        weekday = (start + timedelta(days=day_idx)).strftime("%A") if start else None
+        available = [j for j in members if j not in used]
+        open_today = [
+            j for j in available
+            if not (weekday and is_closed_on(located[j], weekday, opening_hours.get(located[j].get("id"))))
+        ]
+
+        picked = _pick_compact(open_today, located, full_dist, per_day)
+        if len(picked) < per_day:
+            closed_today = [j for j in available if j not in picked]
+            picked += _pick_compact(closed_today, located, full_dist, per_day - len(picked))
+        used.update(picked)
+
+        if picked:
+            centroid = coords[picked].mean(axis=0)
+        else:
+            unused = [j for j in range(len(located)) if j not in used]
+            centroid = coords[unused[0] if unused else 0]
+
+        # Top up short days with the nearest unused places, then (as before) allow repeats
+        if len(picked) < per_day:
+            dist_to_centroid = haversine_matrix(coords, centroid[None, :])[:, 0]
+            by_distance = [int(j) for j in np.argsort(dist_to_centroid, kind="stable")]
+            pool_filters = [lambda j: j not in used]
+            if allow_repeats:
+                pool_filters.append(lambda j: j not in picked)
+            for pool_filter in pool_filters:
+                for j in by_distance:
+                    if len(picked) >= per_day:
+                        break
+                    if pool_filter(j) and j not in picked:
+                        picked.append(j)
+                        used.add(j)
+
+        route = order_route(full_dist[np.ix_(picked, picked)]) if picked else []
+        ordered = [picked[r] for r in route]
+        distance_km = float(sum(full_dist[ordered[i], ordered[i + 1]] for i in range(len(ordered) - 1)))
+
+        day_places = [located[j] for j in ordered]
+        if len(day_places) < per_day and unlocated:
+            take = unlocated[: per_day - len(day_places)]
+            day_places += take
+            if not allow_repeats:
+                unlocated = unlocated[len(take):]
+
+        plans.append({
+            "attractions": day_places,
+            "centroid": coords[ordered].mean(axis=0) if ordered else None,
+            "route_distance_km": round(distance_km, 2),
+        })
+
+    return plans
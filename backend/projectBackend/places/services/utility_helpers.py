@@ -1,26 +1,28 @@
-import googlemaps
 import requests
 import os
 from dotenv import load_dotenv
 from typing import Dict, Any, List
+from places.services.geo_cache import geocode
+from places.services.metrics import stage
+from places.services.preference_matcher import SEARCH_TEXT_KEY, build_search_text, get_search_text
+from places.services.preference_scoring import get_preference_scorer
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-gmaps = googlemaps.Client(key=GOOGLE_API_KEY)
 
 def get_coordinates(destination: str):
     """
     Geocode a destination string to (lat, lng, formatted_address).
+    Goes through the shared geocode cache (places/services/geo_cache.py).
     """
     try:
-        geocode_result = gmaps.geocode(destination)
-        if not geocode_result:
+        result = geocode(destination)
+        if not result:
             return None, None, f"Could not find location: {destination}"
-        location = geocode_result[0]["geometry"]["location"]
-        formatted_address = geocode_result[0].get("formatted_address", destination)
+        formatted_address = result.get("label") or destination
 
-        latitude = location["lat"]
-        longitude = location["lng"]
+        latitude = result["lat"]
+        longitude = result["lng"]
 
         return latitude, longitude, formatted_address
     except Exception as e:
@@ -41,7 +43,9 @@ def safe_str(value):
 
 def group_places_by_preference(places: List[Dict[str, Any]], preferences_list: List[str]) -> Dict[str, List[Dict[str, Any]]]:
     """
-    Groups places based on whether the place-related text contains a given preference term.
+    Groups places under the preference they are most relevant to (TF-IDF over the
+    preference query vocabularies, boosted by literal term matches). Places that
+    score below the threshold for every preference go to "_others".
     
     HANDLES EMPTY PREFERENCES: If no preferences provided, returns all places under "General" category.
     
@@ -61,32 +65,18 @@ def group_places_by_preference(places: List[Dict[str, Any]], preferences_list: L
             "_others": []
         }
     
-    # Original logic for preference-based grouping
+    # All places are scored against all preferences in one batch (TF-IDF + literal matches)
+    scorer = get_preference_scorer(tuple(preferences_list))
+    assignments = scorer.assign([get_search_text(place) for place in places])
+
     grouped: Dict[str, List[Dict[str, Any]]] = {pref: [] for pref in preferences_list}
     grouped["_others"] = []
 
-    for place in places:
-        combined_text = (
-            safe_str(place.get("name"))
-            + " "
-            + safe_str(place.get("types"))
-            + " "
-            + safe_str(place.get("editorialSummary.text"))
-            + " "
-            + safe_str(place.get("reviewSummary.text"))
-            + " "
-            + safe_str(place.get("formattedAddress"))
-        ).lower()
-
-        matched = False
-        for pref in preferences_list:
-            if pref.lower() in combined_text:
-                grouped[pref].append(place)
-                matched = True
-                break
-
-        if not matched:
+    for place, pref_idx in zip(places, assignments):
+        if pref_idx is None:
             grouped["_others"].append(place)
+        else:
+            grouped[preferences_list[pref_idx]].append(place)
 
     return grouped
 
@@ -132,14 +122,16 @@ def filter_textSearch_place_data(raw_data: Dict[str, Any]) -> List[Dict[str, Any
             "currentOpeningHours": place.get("currentOpeningHours", {}).get("weekdayDescriptions"),
             "photos": [photo.get("name") for photo in place.get("photos", [])[:3]],  # First 3 photos
         }
+        filtered_place[SEARCH_TEXT_KEY] = build_search_text(filtered_place)
         filtered_places.append(filtered_place)
 
     return filtered_places
 
 # This function is used to call the Google Places Text Search API
-def fetch_places_data(api_key: str, query: str) -> Dict[str, Any]:
+def fetch_places_data(api_key: str, query: str, category: str = "places") -> Dict[str, Any]:
     """
     Calls the Google Places Text Search API.
+    `category` labels the Server-Timing stage; the query text itself is never exposed there.
     """
     url = "https://places.googleapis.com/v1/places:searchText"
 
@@ -152,9 +144,10 @@ def fetch_places_data(api_key: str, query: str) -> Dict[str, Any]:
     body = {"textQuery": query}
 
     try:
-        response = requests.post(url, headers=headers, json=body, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        with stage("text_search", desc=category):
+            response = requests.post(url, headers=headers, json=body, timeout=10)
+            response.raise_for_status()
+            return response.json()
 
     except requests.RequestException as e:
         print(f"❌ Places API request failed: {e}")
@@ -0,0 +1,272 @@
+# places/services/write_behind.py
+import atexit
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from django.conf import settings
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+_DEFAULTS = {
+    "enabled": True,
+    "max_pending": 1000,        # distinct (collection, key) entries held in memory
+    "batch_size": 500,          # operations per bulk_write
+    "flush_interval": 0.2,      # seconds the worker waits to coalesce more writes
+    "max_retries": 3,
+    "shutdown_timeout": 10.0,
+}
+
+_Key = Tuple[str, Any]
+
+
+class WriteBehindQueue:
+    """
+    In-process write-behind buffer for MongoDB.
+
+    Writes are parked per (collection, key) and drained by one background
+    thread with unordered bulk_write calls. A newer upsert for a key that is
+    still pending replaces the older one, so a hot key costs one write per
+    flush. Producers never block or touch Mongo: callers include async views
+    running on the event loop. Past max_pending the write is still queued
+    (counted as overflow) and the worker drains without waiting to coalesce.
+    Pending and in-flight writes are visible through get_pending so readers
+    see their own writes.
+    """
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None, db=None):
+        self.options = {**_DEFAULTS, **(options or {})}
+        self._db = db
+        self._pending: "OrderedDict[_Key, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[_Key, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats = {"enqueued": 0, "coalesced": 0, "written": 0, "overflow": 0, "failed": 0, "flushes": 0}
+
+    # ------------------------------------------------------------------
+    # Producer API
+    # ------------------------------------------------------------------
+    @property
+    def db(self):
+        return self._db if self._db is not None else settings.MONGO_DB
+
+    def upsert(self, collection: str, key: Any, set_fields: Dict[str, Any], unset_fields: Optional[Dict[str, Any]] = None) -> None:
+        """Queue {"$set": set_fields, "$unset": unset_fields} for _id=key (upsert)."""
+        op = {"kind": "upsert", "set": dict(set_fields), "unset": dict(unset_fields or {}), "attempts": 0}
+        self._enqueue((collection, key), op)
+
+    def update(self, collection: str, key: Any, update: Dict[str, Any]) -> None:
+        """
+        Queue a raw update document ($inc, $set, $setOnInsert, $unset) for _id=key
+        (upsert). Pending updates for a key are merged: $inc amounts add up.
+        """
+        self._enqueue((collection, key), {"kind": "update", "update": copy.deepcopy(update), "attempts": 0})
+
+    def insert(self, collection: str, doc: Dict[str, Any]) -> ObjectId:
+        """Queue an insert. The _id is assigned here so callers can return it right away."""
+        doc.setdefault("_id", ObjectId())
+        self._enqueue((collection, doc["_id"]), {"kind": "insert", "doc": doc, "attempts": 0})
+        return doc["_id"]
+
+    def get_pending(self, collection: str, key: Any) -> Optional[Dict[str, Any]]:
+        """
+        Copy of the document a pending / in-flight write will produce, or None.
+        Raw updates depend on the stored document, so they are not visible here.
+        """
+        with self._cond:
+            op = self._pending.get((collection, key)) or self._inflight.get((collection, key))
+            if op is None or op["kind"] == "update":
+                return None
+            if op["kind"] == "insert":
+                return copy.deepcopy(op["doc"])
+            return {"_id": key, **copy.deepcopy(op["set"])}
+
+    def _enqueue(self, qkey: _Key, op: Dict[str, Any]) -> None:
+        if not self.options["enabled"]:
+            self._write_sync(qkey, op)
+            return
+
+        with self._cond:
+            self._ensure_worker()
+            if qkey in self._pending:
+                self._pending[qkey] = _coalesce(self._pending[qkey], op)
+                self._stats["coalesced"] += 1
+                return
+
+            if len(self._pending) >= self.options["max_pending"]:
+                # Hand the overflow to the worker rather than waiting or writing here
+                if not self._stats["overflow"] % self.options["max_pending"]:
+                    logger.warning(f"Write-behind queue over max_pending ({len(self._pending)} pending)")
+                self._stats["overflow"] += 1
+            self._pending[qkey] = op
+            self._stats["enqueued"] += 1
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name="mongo-write-behind", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending and self._stopping:
+                    return
+                # Give bursts a moment to coalesce, unless we are full or shutting down
+                deadline = time.monotonic() + self.options["flush_interval"]
+                full = min(self.options["batch_size"], self.options["max_pending"])
+                while not self._stopping and len(self._pending) < full:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch: List[Tuple[_Key, Dict[str, Any]]] = []
+                while self._pending and len(batch) < self.options["batch_size"]:
+                    batch.append(self._pending.popitem(last=False))
+                self._inflight.update(batch)
+
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch: List[Tuple[_Key, Dict[str, Any]]]) -> None:
+        by_collection: Dict[str, List[Tuple[_Key, Dict[str, Any]]]] = {}
+        for qkey, op in batch:
+            by_collection.setdefault(qkey[0], []).append((qkey, op))
+
+        retry: List[Tuple[_Key, Dict[str, Any]]] = []
+        for collection, items in by_collection.items():
+            try:
+                self.db[collection].bulk_write([_to_request(qkey, op) for qkey, op in items], ordered=False)
+                self._stats["written"] += len(items)
+            except BulkWriteError as e:
+                # Write errors (duplicate key, validation) will not succeed on retry
+                errors = e.details.get("writeErrors", [])
+                self._stats["written"] += len(items) - len(errors)
+                self._stats["failed"] += len(errors)
+                logger.error(f"Write-behind {collection}: {len(errors)} writes failed: {errors[:3]}")
+            except PyMongoError as e:
+                logger.warning(f"Write-behind flush of {len(items)} {collection} writes failed: {e}")
+                retry += items
+
+        with self._cond:
+            for qkey, _ in batch:
+                self._inflight.pop(qkey, None)
+            for qkey, op in retry:
+                op["attempts"] += 1
+                if op["attempts"] > self.options["max_retries"]:
+                    self._stats["failed"] += 1
+                    logger.error(f"Write-behind dropped {qkey} after {op['attempts']} attempts")
+                elif qkey not in self._pending:
+                    # Requeue unless a newer write for the key is already pending
+                    self._pending[qkey] = op
+            self._stats["flushes"] += 1
+            self._cond.notify_all()
+
+        if retry:
+            time.sleep(self.options["flush_interval"])
+
+    def _write_sync(self, qkey: _Key, op: Dict[str, Any]) -> None:
+        collection, key = qkey
+        if op["kind"] == "insert":
+            self.db[collection].insert_one(op["doc"])
+        else:
+            self.db[collection].update_one({"_id": key}, _update_doc(op), upsert=True)
+
+    # ------------------------------------------------------------------
+    # Lifecycle / introspection
+    # ------------------------------------------------------------------
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is written. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pending:
+                self._ensure_worker()
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+        return True
+
+    def close(self) -> None:
+        """Flush and stop the worker (registered with atexit)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(self.options["shutdown_timeout"])
+        with self._cond:
+            left = len(self._pending) + len(self._inflight)
+        if left:
+            logger.error(f"Write-behind shut down with {left} unwritten entries")
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {**self._stats, "pending": len(self._pending), "inflight": len(self._inflight)}
+
+
+def _coalesce(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge two queued writes for the same key; the newer one wins field by field."""
+    if newer["kind"] == "insert" or older["kind"] == "insert":
+        return newer
+    if "update" in (older["kind"], newer["kind"]):
+        return {"kind": "update", "update": _merge_updates(_update_doc(older), _update_doc(newer)), "attempts": 0}
+    set_fields = {k: v for k, v in older["set"].items() if k not in newer["unset"]}
+    set_fields.update(newer["set"])
+    unset = {k: v for k, v in older["unset"].items() if k not in newer["set"]}
+    unset.update(newer["unset"])
+    return {"kind": "upsert", "set": set_fields, "unset": unset, "attempts": 0}
+
+
+def _merge_updates(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two update documents: $inc adds up, $setOnInsert keeps the first value, the rest newer wins."""
+    merged = {op: dict(fields) for op, fields in older.items()}
+    for op, fields in newer.items():
+        target = merged.setdefault(op, {})
+        for field, value in fields.items():
+            if op == "$inc":
+                target[field] = target.get(field, 0) + value
+            elif op == "$setOnInsert":
+                target.setdefault(field, value)
+            else:
+                target[field] = value
+            # A field is either set or unset, whichever came last
+            if op == "$set":
+                merged.get("$unset", {}).pop(field, None)
+            elif op == "$unset":
+                merged.get("$set", {}).pop(field, None)
+    return {op: fields for op, fields in merged.items() if fields}
+
+
+def _update_doc(op: Dict[str, Any]) -> Dict[str, Any]:
+    """Mongo update document of a queued upsert / update."""
+    if op["kind"] == "update":
+        return op["update"]
+    update = {"$set": op["set"]}
+    if op["unset"]:
+        update["$unset"] = op["unset"]
+    return update
+
+
+def _to_request(qkey: _Key, op: Dict[str, Any]):
+    if op["kind"] == "insert":
+        return InsertOne(op["doc"])
+    return UpdateOne({"_id": qkey[1]}, _update_doc(op), upsert=True)
+
+
+WRITE_BEHIND = WriteBehindQueue(getattr(settings, "WRITE_BEHIND", None))
+atexit.register(WRITE_BEHIND.close)
@@ -1,3 +1,469 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import threading
+import time
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from places.middleware import ServerTimingMiddleware
+from places.services import preference_scoring
+from places.services.db_helpers import load_trip_response, save_trip_response
+from places.services.geo_utils import haversine_matrix
+from places.services.itinerary_store import save_itinerary
+from places.services.metrics import stage
+from places.services.place_queries import QueryCatalog
+from places.services.preference_matcher import SEARCH_TEXT_KEY, get_search_text, token_key, without_search_text
+from places.services.preference_scoring import PreferenceScorer, get_preference_scorer
+from places.services.query_planner import QueryPlanner
+from places.services.route_planner import balanced_kmeans, opening_hours_by_id, order_route, plan_day_routes
+from places.services.utility_helpers import filter_textSearch_place_data, group_places_by_preference
+from places.services.write_behind import WriteBehindQueue
+
+
+def _place(name, lat, lng, rating=4.0, hours=None):
+    place = {"name": name, "location": {"lat": lat, "lng": lng}, "rating": rating}
+    if hours is not None:
+        place["opening_hours"] = hours
+    return place
+
+
+def _path_km(order, dist):
+    return sum(dist[order[i], order[i + 1]] for i in range(len(order) - 1))
+
+
+class FakeCollection:
+    def __init__(self, release: threading.Event):
+        self.requests = []
+        self.sync_writes = []
+        self.release = release
+
+    def bulk_write(self, requests, ordered=True):
+        self.release.wait(5)
+        self.requests += requests
+
+    def insert_one(self, doc):
+        self.sync_writes.append(doc)
+
+    def update_one(self, filter, update, upsert=False):
+        self.sync_writes.append((filter, update))
+
+
+class FakeDB(dict):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __getitem__(self, name):
+        return self.setdefault(name, FakeCollection(self.release))
+
+
+class FakeStatsCollection:
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    def find(self, filter):
+        return [self.docs[i] for i in filter["_id"]["$in"] if i in self.docs]
+
+
+class FakeStatsDB:
+    def __init__(self, docs=()):
+        self.query_stats = FakeStatsCollection(docs)
+
+
+def _catalog(queries, version=1):
+    return QueryCatalog({pref: tuple(q) for pref, q in queries.items()}, None, version)
+
+
+def _candidates(*pairs):
+    return [{"preference": pref, "query": query} for pref, query in pairs]
+
+
+class RoutePlannerTests(SimpleTestCase):
+    def test_balanced_kmeans_splits_distant_groups_evenly(self):
+        north = [(48.85 + i * 0.001, 2.35) for i in range(4)]
+        south = [(43.30 + i * 0.001, 5.37) for i in range(4)]
+        labels = balanced_kmeans(np.array(north + south), 2)
+
+        self.assertEqual(len(set(labels[:4])), 1)
+        self.assertEqual(len(set(labels[4:])), 1)
+        self.assertNotEqual(labels[0], labels[4])
+
+    def test_order_route_matches_brute_force_optimum(self):
+        coords = np.array([
+            (0.0, 0.0), (0.0, 0.03), (0.02, 0.01), (0.01, 0.04), (0.03, 0.02), (0.015, 0.0),
+        ])
+        dist = haversine_matrix(coords)
+
+        order = order_route(dist)
+
+        self.assertEqual(sorted(order), list(range(len(coords))))
+        best = min(_path_km(list(p), dist) for p in itertools.permutations(range(len(coords))))
+        self.assertAlmostEqual(_path_km(order, dist), best, places=6)
+
+    def test_order_route_walks_collinear_points_end_to_end(self):
+        coords = np.array([(0.0, lng) for lng in (0.03, 0.0, 0.04, 0.01, 0.02)])
+        order = order_route(haversine_matrix(coords))
+
+        lngs = [coords[i, 1] for i in order]
+        self.assertIn(lngs, (sorted(lngs), sorted(lngs, reverse=True)))
+
+    def test_place_closed_on_the_day_is_picked_last(self):
+        monday = date(2025, 1, 6)
+        closed = _place("Museum", 0.0, 0.0, rating=5.0, hours=["Monday: Closed", "Tuesday: 9 AM – 5 PM"])
+        cafe = _place("Cafe", 0.001, 0.0, rating=4.0)
+        park = _place("Park", 0.002, 0.0, rating=3.5)
+
+        plans = plan_day_routes([closed, cafe, park], days=1, per_day=2, start_date=monday, allow_repeats=False)
+        self.assertNotIn(closed, plans[0]["attractions"])
+
+        plans = plan_day_routes([closed, cafe, park], days=1, per_day=3, start_date=monday, allow_repeats=False)
+        self.assertIn(closed, plans[0]["attractions"])
+
+    def test_closed_place_is_kept_on_other_weekdays(self):
+        tuesday = date(2025, 1, 7)
+        closed = _place("Museum", 0.0, 0.0, rating=5.0, hours=["Monday: Closed", "Tuesday: 9 AM – 5 PM"])
+        others = [_place("Cafe", 0.001, 0.0), _place("Park", 0.002, 0.0, rating=3.5)]
+
+        plans = plan_day_routes([closed] + others, days=1, per_day=2, start_date=tuesday, allow_repeats=False)
+        self.assertIn(closed, plans[0]["attractions"])
+
+    def test_opening_hours_can_come_from_the_raw_places(self):
+        monday = date(2025, 1, 6)
+        raw = [{"id": "museum", "currentOpeningHours": ["Monday: Closed"]}, {"id": "cafe"}]
+        museum = dict(_place("Museum", 0.0, 0.0, rating=5.0), id="museum")
+        cafe = dict(_place("Cafe", 0.001, 0.0), id="cafe")
+        park = dict(_place("Park", 0.002, 0.0, rating=3.5), id="park")
+
+        plans = plan_day_routes([museum, cafe, park], days=1, per_day=2, start_date=monday,
+                                allow_repeats=False, opening_hours=opening_hours_by_id(raw))
+        self.assertNotIn(museum, plans[0]["attractions"])
+
+    def test_days_are_spatially_compact(self):
+        city_a = [_place(f"A{i}", 10.0 + i * 0.002, 10.0) for i in range(3)]
+        city_b = [_place(f"B{i}", 20.0 + i * 0.002, 20.0) for i in range(3)]
+
+        plans = plan_day_routes(city_a + city_b, days=2, per_day=3, allow_repeats=False)
+
+        names = [{p["name"][0] for p in plan["attractions"]} for plan in plans]
+        self.assertCountEqual(names, [{"A"}, {"B"}])
+        self.assertTrue(all(plan["route_distance_km"] < 1.0 for plan in plans))
+
+    def test_without_coordinates_returns_none(self):
+        self.assertIsNone(plan_day_routes([{"name": "Somewhere"}], days=2))
+
+
+class WriteBehindQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.db = FakeDB()
+        self.queue = WriteBehindQueue({"flush_interval": 0.01}, db=self.db)
+
+    def tearDown(self):
+        self.db.release.set()
+        self.queue.close()
+
+    def test_pending_upsert_is_visible_until_flushed(self):
+        self.db.release.clear()
+        self.queue.upsert("trip_places_cache", "goa__moderate__", {"destination": "Goa"})
+
+        self.assertEqual(
+            self.queue.get_pending("trip_places_cache", "goa__moderate__"),
+            {"_id": "goa__moderate__", "destination": "Goa"},
+        )
+        # Still blocked in bulk_write: the write is in flight, not done
+        self.assertFalse(self.queue.flush(timeout=0.1))
+        self.assertIsNotNone(self.queue.get_pending("trip_places_cache", "goa__moderate__"))
+
+        self.db.release.set()
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertIsNone(self.queue.get_pending("trip_places_cache", "goa__moderate__"))
+        self.assertEqual(len(self.db["trip_places_cache"].requests), 1)
+
+    def test_upserts_for_one_key_are_coalesced(self):
+        self.db.release.clear()
+        # The first write goes in flight and blocks, the next two wait in the queue
+        self.queue.upsert("trip_places_cache", "k0", {"a": 0})
+        self.assertFalse(self.queue.flush(timeout=0.1))
+        self.queue.upsert("trip_places_cache", "k", {"a": 1, "b": 1})
+        self.queue.upsert("trip_places_cache", "k", {"a": 2}, {"b": ""})
+
+        self.assertEqual(self.queue.get_pending("trip_places_cache", "k"), {"_id": "k", "a": 2})
+        self.db.release.set()
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertEqual(len(self.db["trip_places_cache"].requests), 2)
+        self.assertEqual(self.queue.stats()["coalesced"], 1)
+
+    def test_pending_insert_is_found_by_id_and_copied(self):
+        self.db.release.clear()
+        doc_id = self.queue.insert("itineraries", {"user_id": "u1", "days": [{"day": 1}]})
+
+        pending = self.queue.get_pending("itineraries", doc_id)
+        self.assertEqual(pending["user_id"], "u1")
+        pending["days"].append({"day": 2})
+        self.assertEqual(len(self.queue.get_pending("itineraries", doc_id)["days"]), 1)
+
+        self.db.release.set()
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertIsNone(self.queue.get_pending("itineraries", doc_id))
+
+    def test_full_queue_hands_overflow_to_the_worker(self):
+        queue = WriteBehindQueue({"flush_interval": 0.01, "max_pending": 1}, db=self.db)
+        self.addCleanup(queue.close)
+        self.db.release.clear()
+        queue.upsert("trip_places_cache", "k0", {"a": 0})
+        self.assertFalse(queue.flush(timeout=0.1))
+
+        started = time.monotonic()
+        for i in range(1, 4):
+            queue.upsert("trip_places_cache", f"k{i}", {"a": i})
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(queue.stats()["overflow"], 2)
+        self.assertEqual(self.db["trip_places_cache"].sync_writes, [])
+
+        self.db.release.set()
+        self.assertTrue(queue.flush(timeout=5))
+        self.assertEqual(len(self.db["trip_places_cache"].requests), 4)
+
+    def test_pending_increments_for_one_key_add_up(self):
+        self.db.release.clear()
+        self.queue.upsert("trip_places_cache", "k0", {"a": 0})
+        self.assertFalse(self.queue.flush(timeout=0.1))
+        self.queue.update("query_stats", "goa|forts", {"$inc": {"runs": 1}, "$setOnInsert": {"query": "forts"}})
+        self.queue.update("query_stats", "goa|forts", {"$inc": {"runs": 2, "returned": 5}, "$setOnInsert": {"query": "x"}})
+
+        self.assertIsNone(self.queue.get_pending("query_stats", "goa|forts"))
+        self.db.release.set()
+        self.assertTrue(self.queue.flush(timeout=5))
+        [request] = self.db["query_stats"].requests
+        self.assertEqual(request._doc, {"$inc": {"runs": 3, "returned": 5}, "$setOnInsert": {"query": "forts"}})
+        self.assertTrue(request._upsert)
+
+    def test_disabled_queue_writes_synchronously(self):
+        queue = WriteBehindQueue({"enabled": False}, db=self.db)
+        queue.upsert("trip_places_cache", "k", {"a": 1})
+
+        self.assertIsNone(queue.get_pending("trip_places_cache", "k"))
+        self.assertEqual(self.db["trip_places_cache"].sync_writes, [({"_id": "k"}, {"$set": {"a": 1}})])
+
+
+class SearchTextTests(SimpleTestCase):
+    def test_search_text_is_stored_at_ingest_and_kept_out_of_responses(self):
+        raw = {"places": [{"id": "p1", "displayName": {"text": "Fort Aguada"}, "types": ["historical_landmark"]}]}
+        places = filter_textSearch_place_data(raw)
+        self.assertEqual(places[0][SEARCH_TEXT_KEY], "fort aguada historical landmark")
+
+        places[0][SEARCH_TEXT_KEY] = "stored text"
+        self.assertEqual(get_search_text(places[0]), "stored text")
+        self.assertEqual(get_search_text({"name": "Baga Beach"}), "baga beach")
+
+        response = {"reference_places": {"tourist_attractions": {"History": places}}}
+        stripped = without_search_text(response)
+        self.assertNotIn(SEARCH_TEXT_KEY, stripped["reference_places"]["tourist_attractions"]["History"][0])
+        self.assertIn(SEARCH_TEXT_KEY, places[0])
+
+
+class PreferenceScorerTests(SimpleTestCase):
+    def setUp(self):
+        # Many catalog queries dilute the cosine of a single synonym well below the threshold
+        self.catalog = _catalog({"Relaxation": [f"calm retreat{i} getaway{i}" for i in range(15)]})
+        self.scorer = PreferenceScorer(("Relaxation", "Nightlife"), self.catalog)
+        self.texts = ["quiet lake", "city parking garage", "bar pub club lounge"]
+        preference_scoring._scorers.clear()
+        self.addCleanup(preference_scoring._scorers.clear)
+
+    def test_score_threshold_cuts_off_weak_matches(self):
+        scores = self.scorer.score(self.texts)
+        self.assertLess(scores[0].max(), preference_scoring.SCORE_THRESHOLD)
+
+        with mock.patch.object(preference_scoring, "LITERAL_MATCH_BOOST", 0.0):
+            self.assertEqual(self.scorer.assign(self.texts), [None, None, 1])
+            with mock.patch.object(preference_scoring, "SCORE_THRESHOLD", float(scores[0].max())):
+                self.assertEqual(self.scorer.assign(self.texts), [0, None, 1])
+
+    def test_literal_match_boost_lifts_a_weak_match(self):
+        # "lake" is a Relaxation synonym: the literal match alone clears the threshold
+        self.assertEqual(self.scorer.assign(self.texts), [0, None, 1])
+
+    def test_unmatched_places_fall_back_to_others(self):
+        places = [{"name": "Quiet Lake"}, {"name": "City Parking Garage"}, {"name": "Pub Lounge"}]
+        with mock.patch.object(preference_scoring, "get_query_catalog", return_value=self.catalog):
+            grouped = group_places_by_preference(places, ["Relaxation", "Nightlife"])
+
+        self.assertEqual([p["name"] for p in grouped["Relaxation"]], ["Quiet Lake"])
+        self.assertEqual([p["name"] for p in grouped["Nightlife"]], ["Pub Lounge"])
+        self.assertEqual([p["name"] for p in grouped["_others"]], ["City Parking Garage"])
+        self.assertEqual(group_places_by_preference(places, []), {"General": places, "_others": []})
+
+    def test_cached_scorer_is_rebuilt_when_the_catalog_version_changes(self):
+        reloaded = _catalog({"Relaxation": ["hammock hideaways"]}, version=2)
+        preferences = ("Relaxation", "Nightlife")
+
+        with mock.patch.object(preference_scoring, "get_query_catalog", return_value=self.catalog):
+            first = get_preference_scorer(preferences)
+            self.assertIs(get_preference_scorer(preferences), first)
+        with mock.patch.object(preference_scoring, "get_query_catalog", return_value=reloaded):
+            second = get_preference_scorer(preferences)
+
+        self.assertIsNot(second, first)
+        self.assertIn(token_key("hammock"), second.vocab)
+        self.assertNotIn(token_key("hammock"), first.vocab)
+        self.assertEqual(list(preference_scoring._scorers), [(preferences, 1), (preferences, 2)])
+
+
+class ServerTimingTests(SimpleTestCase):
+    def _header(self, remote_addr):
+        request = RequestFactory().get("/api/tour/preference-places/Goa", REMOTE_ADDR=remote_addr)
+        middleware = ServerTimingMiddleware(lambda req: self._view(req))
+        return middleware(request)["Server-Timing"]
+
+    @staticmethod
+    def _view(request):
+        with stage("text_search", desc="tourist"):
+            pass
+        return HttpResponse()
+
+    def test_stage_descriptions_only_reach_internal_clients(self):
+        self.assertIn('desc="tourist"', self._header("127.0.0.1"))
+        outside = self._header("203.0.113.7")
+        self.assertIn("text_search;dur=", outside)
+        self.assertNotIn("desc=", outside)
+
+
+class TripCacheLoadTests(SimpleTestCase):
+    @override_settings(TRIP_CACHE_COMPRESSION="zlib")
+    def test_projection_applies_to_pending_packed_documents(self):
+        db = FakeDB()
+        db.release.clear()
+        queue = WriteBehindQueue({"flush_interval": 0.01}, db=db)
+        self.addCleanup(queue.close)
+        self.addCleanup(db.release.set)
+        response = {
+            "destination": "Goa",
+            "reference_places": [{"name": "Fort Aguada"}],
+            "recommended_places": [{"name": "Baga Beach"}],
+            "generated_queries": ["beaches in goa"],
+            "status": "ok",
+        }
+
+        with mock.patch("places.services.db_helpers.WRITE_BEHIND", queue):
+            save_trip_response("goa__moderate__", response)
+            doc = load_trip_response("goa__moderate__", projection="itinerary")
+
+        self.assertEqual(doc["reference_places"], [{"name": "Fort Aguada"}])
+        self.assertNotIn("recommended_places", doc)
+        self.assertNotIn("generated_queries", doc)
+        self.assertNotIn("status", doc)
+
+
+class ItineraryStoreTests(SimpleTestCase):
+    def test_full_write_behind_queue_does_not_stall_async_callers(self):
+        db = FakeDB()
+        db.release.clear()
+        queue = WriteBehindQueue({"flush_interval": 0.01, "max_pending": 1}, db=db)
+        self.addCleanup(queue.close)
+        self.addCleanup(db.release.set)
+
+        async def save_many():
+            ids = []
+            for day in range(5):
+                ids.append(save_itinerary({"itinerary": [{"day": day}]}, {"destination": "Goa"}, {"user_id": "u1"}))
+                await asyncio.sleep(0)
+            return ids
+
+        async def run():
+            # The loop must keep ticking while the queue is full and Mongo is stuck
+            gaps, last = [], time.monotonic()
+            saver = asyncio.ensure_future(asyncio.wait_for(save_many(), timeout=1))
+            while not saver.done():
+                await asyncio.sleep(0.005)
+                gaps.append(time.monotonic() - last)
+                last = time.monotonic()
+            return await saver, max(gaps)
+
+        with mock.patch("places.services.itinerary_store.WRITE_BEHIND", queue):
+            ids, worst_gap = asyncio.run(run())
+
+        self.assertEqual(len(set(ids)), 5)
+        self.assertLess(worst_gap, 0.1)
+        self.assertEqual(db["itineraries"].sync_writes, [])
+        db.release.set()
+        self.assertTrue(queue.flush(timeout=5))
+
+
+class QueryPlannerTests(SimpleTestCase):
+    def test_plan_is_deterministic_for_a_seed(self):
+        candidates = _candidates(*[("Beaches", f"beach query {i}") for i in range(8)])
+
+        first = QueryPlanner("Goa", "goa__moderate__beaches", candidates, db=FakeStatsDB())
+        again = QueryPlanner("Goa", "goa__moderate__beaches", list(reversed(candidates)), db=FakeStatsDB())
+        plan = first.plan("tourist", candidates, target=100, max_queries=3)
+
+        self.assertEqual(plan, again.plan("tourist", list(reversed(candidates)), target=100, max_queries=3))
+        self.assertEqual(len(plan), 3)
+
+    def test_expected_yield_is_smoothed_towards_the_prior(self):
+        db = FakeStatsDB([
+            {"_id": "goa|dry query", "runs": 1, "new_unique": 0},
+            {"_id": "goa|proven query", "runs": 9, "new_unique": 180},
+        ])
+        candidates = _candidates(("Beaches", "new query"), ("Beaches", "dry query"), ("Beaches", "proven query"))
+        planner = QueryPlanner("Goa", "seed", candidates, db=db)
+
+        self.assertAlmostEqual(planner.expected_yield("new query"), 12.0)
+        self.assertAlmostEqual(planner.expected_yield("dry query"), 6.0)
+        self.assertAlmostEqual(planner.expected_yield("proven query"), 19.2)
+        self.assertAlmostEqual(planner.good_share("new query"), 0.5)
+        self.assertEqual(planner.plan("tourist", candidates, target=100, max_queries=1)[0]["query"], "proven query")
+
+    def test_plan_stops_at_the_target(self):
+        candidates = _candidates(*[("Beaches", f"beach query {i}") for i in range(5)])
+        planner = QueryPlanner("Goa", "seed", candidates, db=FakeStatsDB())
+
+        # Each unseen query is expected to add 12 places
+        self.assertEqual(len(planner.plan("tourist", candidates, target=20, max_queries=5)), 2)
+
+    def test_plan_spreads_over_preferences(self):
+        db = FakeStatsDB([
+            {"_id": "goa|beach clubs", "runs": 4, "new_unique": 80},
+            {"_id": "goa|beach shacks", "runs": 4, "new_unique": 72},
+            {"_id": "goa|old forts", "runs": 4, "new_unique": 48},
+        ])
+        candidates = _candidates(("Beaches", "beach clubs"), ("Beaches", "beach shacks"), ("History", "old forts"))
+        planner = QueryPlanner("Goa", "seed", candidates, db=db)
+
+        picked = [c["query"] for c in planner.plan("tourist", candidates, target=100, max_queries=2)]
+        self.assertEqual(picked, ["beach clubs", "old forts"])
+
+    def test_target_grows_with_the_number_of_preferences(self):
+        one = _candidates(("Beaches", "beach clubs"), ("Beaches", "beach shacks"))
+        three = one + _candidates(("History", "old forts"), ("Nightlife", "night clubs"))
+        planner = QueryPlanner("Goa", "seed", three, db=FakeStatsDB())
+
+        self.assertEqual(planner.target("tourist", one), 40)
+        self.assertEqual(planner.target("tourist", three), 60)
+        self.assertEqual(planner.target("lodging", three), 20)
+
+    def test_record_counts_new_unique_places_per_category(self):
+        writes = FakeDB()
+        queue = WriteBehindQueue({"flush_interval": 0.01}, db=writes)
+        self.addCleanup(queue.close)
+        candidates = _candidates(("Beaches", "beach clubs"), ("Beaches", "beach shacks"))
+        planner = QueryPlanner("Goa", "seed", candidates, db=FakeStatsDB(), write_behind=queue)
+
+        planner.record("tourist", "beach clubs", [{"id": "a", "rating": 4.6}, {"id": "b", "rating": 3.2}])
+        planner.record("tourist", "beach shacks", [{"id": "b", "rating": 3.2}, {"id": "c"}])
+        planner.flush()
+        self.assertTrue(queue.flush(timeout=5))
+
+        updates = {op._filter["_id"]: op._doc["$inc"] for op in writes["query_stats"].requests}
+        self.assertEqual(updates["goa|beach clubs"], {"runs": 1, "returned": 2, "new_unique": 2,
+                                                      "ratings.ge45": 1, "ratings.3_4": 1})
+        self.assertEqual(updates["goa|beach shacks"], {"runs": 1, "returned": 2, "new_unique": 1,
+                                                       "ratings.3_4": 1, "ratings.none": 1})
+        planner.flush()
+        self.assertTrue(queue.flush(timeout=5))
+        self.assertEqual(len(writes["query_stats"].requests), 2)
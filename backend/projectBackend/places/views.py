@@ -1,10 +1,9 @@
 import os
-import random
 import requests
 import logging
-from datetime import datetime
-from typing import Dict, Any, List
-from django.http import JsonResponse
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from django.http import JsonResponse, HttpResponseNotModified
 from django.conf import settings
 from dotenv import load_dotenv
 import googlemaps
@@ -36,6 +35,17 @@ from places.services.db_helpers import (
     load_trip_response
 )
 from places.services.itinerary_helpers import build_daywise_place_plan
+from places.services.itinerary_store import (
+    save_itinerary,
+    load_itinerary,
+    assemble_itinerary,
+    compute_etag,
+    etag_matches,
+)
+from places.services.metrics import stage, set_source
+from places.services.preference_matcher import without_search_text
+from places.services.profiling import profile_request
+from places.services.query_planner import QueryPlanner
 
 # Ninja Routers
 tour_router = Router()
@@ -48,10 +58,11 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 gmaps = googlemaps.Client(key=GOOGLE_API_KEY)
 weather = WeatherService(api_key=GOOGLE_API_KEY)
 
-# ===== GLOBAL HASHSETS TO STORE UNIQUE PLACE IDs (for current request lifetime) =====
-PREF_TOURIST_SET: set[str] = set()
-PREF_LODGING_SET: set[str] = set()
-PREF_RESTAURANT_SET: set[str] = set()
+# ===== UNIQUE PLACE IDs PER CATEGORY =====
+# Created per request and passed down: module-level sets would be shared by
+# concurrent requests and background prefetches.
+def new_seen_sets() -> Dict[str, set]:
+    return {"tourist": set(), "lodging": set(), "restaurants": set()}
 
 # ======================================================================
 # OLD NEARBY PLACES API (FALLBACK ONLY)
@@ -120,6 +131,7 @@ def tourist_places(request, destination: str):
         if cached_data:
             cached_data["_id"] = str(cached_data["_id"])
             print("Cached Data is used....")
+            set_source("db")
             return {"source": "cache", **cached_data}
 
         # Step 2: Fetch from Google API
@@ -140,10 +152,14 @@ def tourist_places(request, destination: str):
             "last_updated": datetime.now().isoformat(),
         }
 
-        # Step 3: Save to cache
-        result = settings.MONGO_DB.cached_places.insert_one(response_data)
+        # Step 3: Save to cache (cached_at drives the TTL index). Written synchronously,
+        # not write-behind: the lookup above is by destination, not by a queued _id.
+        result = settings.MONGO_DB.cached_places.insert_one(
+            {**response_data, "cached_at": datetime.now(timezone.utc)}
+        )
         response_data["_id"] = str(result.inserted_id)
 
+        set_source("api")
         return {"source": "api", **response_data}
 
     except Exception as e:
@@ -153,6 +169,7 @@ def tourist_places(request, destination: str):
 # ITINERARY GENERATION (AI MODE WITH PLACES + WEATHER)
 # ======================================================================
 @tour_router.post("/itinerary/generate/")
+@profile_request
 async def generate_itinerary(request, payload: dict = Body(...)):
     """
     Generate itinerary using Google Gemini API with:
@@ -180,9 +197,11 @@ async def generate_itinerary(request, payload: dict = Body(...)):
 
         # Try trip_places_cache first
         cache_key = build_cache_key(destination, preferences_list, experience_type)
-        trip_places = load_trip_response(cache_key)
+        trip_places = load_trip_response(cache_key, projection="itinerary")
 
-        if not trip_places:
+        if trip_places:
+            set_source("db")
+        else:
             # Fallback: call main preference-based API internally to populate cache
             prefs_string = ",".join(preferences_list)
             trip_places = get_preference_based_places(
@@ -194,7 +213,7 @@ async def generate_itinerary(request, payload: dict = Body(...)):
                 pass
 
             # Reload from cache in case it wrote via save_trip_response
-            trip_places = load_trip_response(cache_key) or trip_places
+            trip_places = load_trip_response(cache_key, projection="itinerary") or trip_places
 
         reference_places = trip_places.get("reference_places", {}) if isinstance(trip_places, dict) else {}
         coords = trip_places.get("coordinates", {}) if isinstance(trip_places, dict) else {}
@@ -215,11 +234,13 @@ async def generate_itinerary(request, payload: dict = Body(...)):
         # ================== BUILD DAYWISE PLACE PLAN ==================
         daywise_place_plan = []
         if mode == "ai":
-            daywise_place_plan = build_daywise_place_plan(
-                reference_places=reference_places,
-                preferences_list=preferences_list,
-                days=days,
-            )
+            with stage("plan_build"):
+                daywise_place_plan = build_daywise_place_plan(
+                    reference_places=reference_places,
+                    preferences_list=preferences_list,
+                    days=days,
+                    start_date=payload.get("start_date"),
+                )
 
         # ================== PREPARE REQUEST DATA FOR GEMINI ==================
         request_data = {
@@ -244,18 +265,18 @@ async def generate_itinerary(request, payload: dict = Body(...)):
         )
         base_itinerary = await gemini_service.generate_itinerary(request_data)
 
-        # Store metadata (we are not storing full AI JSON to Mongo for now)
-        itinerary_doc = {
-            "destination": destination,
-            "days": days,
-            "mode": mode,
-            "preferences": preferences_list,
-            "itinerary": "ai_generated",
-            "generated_at": datetime.now(),
-            "user_id": getattr(request, "user_id", None),
-        }
-
-        result = settings.MONGO_DB.itineraries.insert_one(itinerary_doc)
+        # Store the full itinerary so it can be reopened without calling Gemini again
+        itinerary_id = save_itinerary(
+            base_itinerary,
+            payload,
+            {
+                "destination": destination,
+                "days": days,
+                "mode": mode,
+                "preferences": preferences_list,
+                "user_id": getattr(request, "user_id", None),
+            },
+        )
 
         logger.info(f"Successfully generated itinerary for {destination}")
 
@@ -263,7 +284,7 @@ async def generate_itinerary(request, payload: dict = Body(...)):
             {
                 "success": True,
                 "itinerary": base_itinerary,
-                "itinerary_id": str(result.inserted_id),
+                "itinerary_id": itinerary_id,
             }
         )
 
@@ -272,6 +293,42 @@ async def generate_itinerary(request, payload: dict = Body(...)):
         return {"success": False, "error": f"Failed to generate itinerary: {str(e)}"}
 
 
+# ======================================================================
+# STORED ITINERARY (BY ID, WITH ETAG)
+# ======================================================================
+@tour_router.get("/itinerary/{itinerary_id}")
+def get_itinerary(request, itinerary_id: str):
+    """
+    Return a previously generated itinerary. Answers 304 when the client's
+    If-None-Match still matches, so reopening a saved trip costs one indexed read.
+    """
+    doc = load_itinerary(itinerary_id)
+    if not doc or ("itinerary_days" not in doc and "itinerary_extra" not in doc):
+        # Unknown id, or an old metadata-only record
+        return JsonResponse({"success": False, "error": "Itinerary not found"}, status=404)
+
+    etag = doc.get("etag") or compute_etag(assemble_itinerary(doc))
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        response = HttpResponseNotModified()
+    else:
+        generated_at = doc.get("generated_at")
+        response = JsonResponse({
+            "success": True,
+            "itinerary_id": str(doc["_id"]),
+            "destination": doc.get("destination"),
+            "days": doc.get("days"),
+            "mode": doc.get("mode"),
+            "preferences": doc.get("preferences", []),
+            "generated_at": generated_at.isoformat() if isinstance(generated_at, datetime) else generated_at,
+            "itinerary": assemble_itinerary(doc),
+        })
+
+    # Stored itineraries never change; clients may reuse them but must revalidate
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
 # ======================================================================
 # NEW NEARBY PLACES API (SECONDARY)
 # ======================================================================
@@ -287,7 +344,7 @@ def get_places_new(request, destination: str):
         cached = settings.MONGO_DB.new_places_cache.find_one({"destination": destination})
         if cached:
             cached["_id"] = str(cached["_id"])
-            return {"source": "cache", **cached}
+            return {"source": "cache", **without_search_text(cached)}
 
         # 2. Geocode destination
         lat, lng, formatted = get_coordinates(destination)
@@ -299,10 +356,11 @@ def get_places_new(request, destination: str):
         lodging = get_places_data(GOOGLE_API_KEY, lat, lng, ["lodging"])
         restaurants = get_places_data(GOOGLE_API_KEY, lat, lng, ["restaurant"])
 
-        # 4. Filter duplicates vs global sets (if any from main API)
-        ta_filtered = filter_new_places(tourist_attractions, PREF_TOURIST_SET)
-        lodging_filtered = filter_new_places(lodging, PREF_LODGING_SET)
-        restaurants_filtered = filter_new_places(restaurants, PREF_RESTAURANT_SET)
+        # 4. Filter duplicates
+        seen = new_seen_sets()
+        ta_filtered = filter_new_places(tourist_attractions, seen["tourist"])
+        lodging_filtered = filter_new_places(lodging, seen["lodging"])
+        restaurants_filtered = filter_new_places(restaurants, seen["restaurants"])
 
         response = {
             "destination": formatted,
@@ -313,34 +371,40 @@ def get_places_new(request, destination: str):
             "last_updated": datetime.now().isoformat(),
         }
 
-        inserted = settings.MONGO_DB.new_places_cache.insert_one(response)
-        response["_id"] = str(inserted.inserted_id)
+        # Synchronous for the same reason as cached_places in tourist_places
+        result = settings.MONGO_DB.new_places_cache.insert_one(
+            {**response, "cached_at": datetime.now(timezone.utc)}
+        )
+        response["_id"] = str(result.inserted_id)
 
-        return {"source": "api", **response}
+        return {"source": "api", **without_search_text(response)}
 
     except Exception as e:
         print(f"Error in get_places_new: {e}")
         return {"error": f"Internal server error: {str(e)}", "status": 500}
 
 
-def fetch_nearby_grouped(lat: float, lng: float, formatted_destination: str, preferences_list: List[str]):
+def fetch_nearby_grouped(lat: float, lng: float, formatted_destination: str, preferences_list: List[str],
+                         seen: Optional[Dict[str, set]] = None):
     """
-    Helper used by main API: fetch nearby places via get_places_data, dedupe using global sets,
-    and return grouped-by-preference structure.
+    Helper used by main API: fetch nearby places via get_places_data, dedupe against the
+    request's `seen` sets, and return grouped-by-preference structure.
     """
+    seen = seen if seen is not None else new_seen_sets()
     tourist_attractions = get_places_data(GOOGLE_API_KEY, lat, lng, ["tourist_attraction"])
     lodging = get_places_data(GOOGLE_API_KEY, lat, lng, ["lodging"])
     restaurants = get_places_data(GOOGLE_API_KEY, lat, lng, ["restaurant"])
 
-    ta_filtered = filter_new_places(tourist_attractions, PREF_TOURIST_SET)
-    lodging_filtered = filter_new_places(lodging, PREF_LODGING_SET)
-    restaurants_filtered = filter_new_places(restaurants, PREF_RESTAURANT_SET)
+    ta_filtered = filter_new_places(tourist_attractions, seen["tourist"])
+    lodging_filtered = filter_new_places(lodging, seen["lodging"])
+    restaurants_filtered = filter_new_places(restaurants, seen["restaurants"])
 
-    grouped = {
-        "tourist_attractions": group_places_by_preference(ta_filtered, preferences_list),
-        "lodging": group_places_by_preference(lodging_filtered, preferences_list),
-        "restaurants": group_places_by_preference(restaurants_filtered, preferences_list),
-    }
+    with stage("grouping", desc="nearby"):
+        grouped = {
+            "tourist_attractions": group_places_by_preference(ta_filtered, preferences_list),
+            "lodging": group_places_by_preference(lodging_filtered, preferences_list),
+            "restaurants": group_places_by_preference(restaurants_filtered, preferences_list),
+        }
 
     return grouped
 
@@ -355,6 +419,7 @@ from typing import Optional, List
 from ninja import Query
 
 @tour_router.get("/preference-places/{destination}")
+@profile_request
 def get_preference_based_places(
     request, 
     destination: str, 
@@ -382,12 +447,11 @@ def get_preference_based_places(
     cached_full = load_trip_response(cache_key)
     if cached_full:
         print(f"✅ Using cache for: {cache_key}")
-        return {"source": "db", **cached_full}
+        set_source("db")
+        return {"source": "db", **without_search_text(cached_full)}
 
-    # Reset global sets for this request
-    PREF_TOURIST_SET.clear()
-    PREF_LODGING_SET.clear()
-    PREF_RESTAURANT_SET.clear()
+    # Unique place ids seen by this request
+    seen = new_seen_sets()
 
     try:
         # Geocode
@@ -407,12 +471,15 @@ def get_preference_based_places(
         restaurants: List[Dict[str, Any]] = []
         lodging: List[Dict[str, Any]] = []
 
+        # Picks the highest-yield queries per category (deterministic per cache key)
+        planner = QueryPlanner(destination, cache_key, tourist_queries + restaurant_queries + lodging_queries)
+
         # ===== TOURIST ATTRACTIONS (Multiple Queries to get 40+ places) =====
         print(f"🔍 Starting tourist attractions fetch for {destination}")
         print(f"📋 Generated {len(tourist_queries)} tourist queries: {tourist_queries}")
 
         if tourist_queries:
-            queries_to_use = random.sample(tourist_queries, min(3, len(tourist_queries)))
+            queries_to_use = planner.plan("tourist", tourist_queries)
             print(f"✅ Selected {len(queries_to_use)} queries to execute")
             
             for idx, query_obj in enumerate(queries_to_use, 1):
@@ -423,7 +490,7 @@ def get_preference_based_places(
                 print(f"🔎 Query {idx}/{len(queries_to_use)}: '{full_query}'")
                 
                 try:
-                    raw = fetch_places_data(GOOGLE_API_KEY, full_query)
+                    raw = fetch_places_data(GOOGLE_API_KEY, full_query, category="tourist")
                     
                     if raw is None:
                         print(f"❌ Query returned None (API error)")
@@ -431,9 +498,11 @@ def get_preference_based_places(
                         
                     if not raw or not raw.get("places"):
                         print(f"⚠️ Query returned empty results")
+                        planner.record("tourist", chosen_query, [])
                         continue
                     
                     places = filter_textSearch_place_data(raw)
+                    planner.record("tourist", chosen_query, places)
                     print(f"✅ Query returned {len(places)} places")
                     
                     for p in places:
@@ -455,7 +524,7 @@ def get_preference_based_places(
         print(f"📋 Generated {len(restaurant_queries)} restaurant queries")
 
         if restaurant_queries:
-            queries_to_use = random.sample(restaurant_queries, min(2, len(restaurant_queries)))
+            queries_to_use = planner.plan("restaurants", restaurant_queries)
             
             for idx, query_obj in enumerate(queries_to_use, 1):
                 chosen_pref = query_obj["preference"]
@@ -465,7 +534,7 @@ def get_preference_based_places(
                 print(f"🔎 Query {idx}/{len(queries_to_use)}: '{full_query}'")
                 
                 try:
-                    raw = fetch_places_data(GOOGLE_API_KEY, full_query)
+                    raw = fetch_places_data(GOOGLE_API_KEY, full_query, category="restaurants")
                     
                     if raw is None:
                         print(f"❌ Query returned None (API error)")
@@ -473,9 +542,11 @@ def get_preference_based_places(
                         
                     if not raw or not raw.get("places"):
                         print(f"⚠️ Query returned empty results")
+                        planner.record("restaurants", chosen_query, [])
                         continue
                     
                     places = filter_textSearch_place_data(raw)
+                    planner.record("restaurants", chosen_query, places)
                     print(f"✅ Query returned {len(places)} places")
                     
                     for p in places:
@@ -493,7 +564,7 @@ def get_preference_based_places(
         print(f"📋 Generated {len(lodging_queries)} lodging queries")
 
         if lodging_queries:
-            queries_to_use = random.sample(lodging_queries, min(2, len(lodging_queries)))
+            queries_to_use = planner.plan("lodging", lodging_queries)
             
             for idx, query_obj in enumerate(queries_to_use, 1):
                 chosen_pref = query_obj["preference"]
@@ -503,7 +574,7 @@ def get_preference_based_places(
                 print(f"🔎 Query {idx}/{len(queries_to_use)}: '{full_query}'")
                 
                 try:
-                    raw = fetch_places_data(GOOGLE_API_KEY, full_query)
+                    raw = fetch_places_data(GOOGLE_API_KEY, full_query, category="lodging")
                     
                     if raw is None:
                         print(f"❌ Query returned None (API error)")
@@ -511,9 +582,11 @@ def get_preference_based_places(
                         
                     if not raw or not raw.get("places"):
                         print(f"⚠️ Query returned empty results")
+                        planner.record("lodging", chosen_query, [])
                         continue
                     
                     places = filter_textSearch_place_data(raw)
+                    planner.record("lodging", chosen_query, places)
                     print(f"✅ Query returned {len(places)} places")
                     
                     for p in places:
@@ -526,12 +599,14 @@ def get_preference_based_places(
                     print(f"❌ Error processing query: {e}")
                     continue
 
+        planner.flush()
+
         print(f"\n📊 FETCH SUMMARY:")
         print(f"   Tourist Attractions: {len(tourist_attractions)} places")
         print(f"   Restaurants: {len(restaurants)} places")
         print(f"   Lodging: {len(lodging)} places")
 
-        # Remove duplicates using global sets - NO LIMIT
+        # Remove duplicates using the request's sets - NO LIMIT
         def remove_duplicates(data, limit=None, container_set=None):
             results = []
             if container_set is None:
@@ -552,22 +627,24 @@ def get_preference_based_places(
             return results
 
         # Remove duplicates WITHOUT limits
-        tourist_attractions = remove_duplicates(tourist_attractions, limit=None, container_set=PREF_TOURIST_SET)
-        restaurants = remove_duplicates(restaurants, limit=None, container_set=PREF_RESTAURANT_SET)
-        lodging = remove_duplicates(lodging, limit=None, container_set=PREF_LODGING_SET)
+        with stage("dedup"):
+            tourist_attractions = remove_duplicates(tourist_attractions, limit=None, container_set=seen["tourist"])
+            restaurants = remove_duplicates(restaurants, limit=None, container_set=seen["restaurants"])
+            lodging = remove_duplicates(lodging, limit=None, container_set=seen["lodging"])
 
         print(f"After deduplication: {len(tourist_attractions)} tourist, {len(restaurants)} restaurants, {len(lodging)} lodging")
 
         # Build REFERENCE places (grouped by preference)
-        reference_places = {
-            "tourist_attractions": group_places_by_preference(tourist_attractions, preferences_list),
-            "restaurants": group_places_by_preference(restaurants, preferences_list),
-            "lodging": group_places_by_preference(lodging, preferences_list),
-        }
+        with stage("grouping", desc="reference"):
+            reference_places = {
+                "tourist_attractions": group_places_by_preference(tourist_attractions, preferences_list),
+                "restaurants": group_places_by_preference(restaurants, preferences_list),
+                "lodging": group_places_by_preference(lodging, preferences_list),
+            }
 
         # Now call secondary logic (NearbySearch) for RECOMMENDED places
         try:
-            recommended_places = fetch_nearby_grouped(lat, lng, formatted_destination, preferences_list)
+            recommended_places = fetch_nearby_grouped(lat, lng, formatted_destination, preferences_list, seen)
             secondary_source = "secondary"
         except Exception as e2:
             print(f"Secondary fetch_nearby_grouped failed: {e2}")
@@ -604,7 +681,8 @@ def get_preference_based_places(
             f"{len(restaurants)} restaurants, {len(lodging)} lodging"
         )
 
-        return {"source": "api", **response_data}
+        set_source("api")
+        return {"source": "api", **without_search_text(response_data)}
 
     except Exception as e_main:
         print(f"Error in main preference-based flow: {str(e_main)}")
@@ -635,7 +713,8 @@ def get_preference_based_places(
             }
 
             save_trip_response(cache_key, response_data)
-            return {"source": "fallback_secondary", **response_data}
+            set_source("fallback_secondary")
+            return {"source": "fallback_secondary", **without_search_text(response_data)}
 
         except Exception as e_sec:
             print(f"Secondary-only fallback failed: {e_sec}")
@@ -672,6 +751,7 @@ def get_preference_based_places(
             }
 
             save_trip_response(response_data["cache_key"], response_data)
+            set_source("fallback_v1")
             return {"source": "fallback_v1", **response_data}
 
 
@@ -752,6 +832,7 @@ def get_places_for_trip(request, trip_id: str):
 
 
 @tour_router.post("/itinerary/custom/")
+@profile_request
 async def generate_custom_itinerary(request, payload: dict = Body(...)):
     """
     CUSTOM ITINERARY LOGIC:
@@ -819,7 +900,11 @@ async def generate_custom_itinerary(request, payload: dict = Body(...)):
         weather_info = None  # weather optional now
     
     # Build daywise place plan
-    places_plan = _build_places_plan(tourist_s, lodging_s, restaurants_s, days)
+    with stage("plan_build"):
+        places_plan = _build_places_plan(
+            tourist_s, lodging_s, restaurants_s, days, start_date=payload.get("start_date"),
+            opening_hours=seg["opening_hours"],
+        )
 
     # ----------------------------------------------------------
     # 4. INVALID CASE → RETURN TWO ITINERARIES
@@ -862,21 +947,24 @@ async def generate_custom_itinerary(request, payload: dict = Body(...)):
     gemini = GeminiItineraryService()
     itinerary = await gemini.generate_itinerary(custom_payload)
 
-    # Save metadata
-    doc = {
-        "destination": destination,
-        "days": days,
-        "mode": "custom",
-        "valid": True,
-        "preferences": preferences,
-        "generated_at": datetime.now(),
-    }
-    result = settings.MONGO_DB.itineraries.insert_one(doc)
+    # Save the full itinerary
+    itinerary_id = save_itinerary(
+        itinerary,
+        payload,
+        {
+            "destination": destination,
+            "days": days,
+            "mode": "custom",
+            "valid": True,
+            "preferences": preferences,
+            "user_id": getattr(request, "user_id", None),
+        },
+    )
 
     return JsonResponse({
         "success": True,
         "valid": True,
         "mode": "custom",
         "itinerary": itinerary,
-        "itinerary_id": str(result.inserted_id),
+        "itinerary_id": itinerary_id,
     })
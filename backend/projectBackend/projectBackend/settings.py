@@ -62,6 +62,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "places.middleware.ServerTimingMiddleware",
 ]
 
 ROOT_URLCONF = "projectBackend.urls"
@@ -71,6 +72,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
+# Let the frontend read the per-stage latency breakdown
+CORS_EXPOSE_HEADERS = ["Server-Timing", "X-Profile-Id", "ETag"]
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -112,6 +116,33 @@ DATABASES = {
 MONGO_CLIENT = MongoClient("mongodb://localhost:27017/")
 MONGO_DB = MONGO_CLIENT["travAi_db"]  # your database
 
+# Expiry of cached place documents in cached_places, new_places_cache and
+# trip_places_cache (TTL index on `cached_at`, see `manage.py ensure_mongo_indexes`;
+# documents without `cached_at` are stamped with the time the command runs)
+MONGO_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Compression of the bulky sections of trip_places_cache documents: "zstd"
+# (needs the zstandard package, otherwise zlib is used), "zlib" or None to
+# store them as plain fields. Documents in either layout load fine.
+TRIP_CACHE_COMPRESSION = "zlib"
+
+# Background (write-behind) Mongo writes for trip_places_cache and itineraries.
+# Set "enabled" to False to write synchronously on the request path.
+# max_pending is a soft bound: past it writes are still queued, never blocked.
+WRITE_BEHIND = {
+    "enabled": True,
+    "max_pending": 1000,
+    "batch_size": 500,
+    "flush_interval": 0.2,
+}
+
+# In-process caches for geocoding and /routes/distance/ results (places/services/geo_cache.py)
+GEO_CACHE = {
+    "geocode_ttl": 7 * 24 * 3600,
+    "route_ttl": 24 * 3600,
+    "timeout": (3.05, 10),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -140,6 +171,12 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Clients allowed to read /api/metrics/ without a staff session (CIDR notation)
+METRICS_ALLOWED_NETWORKS = ["127.0.0.1/32", "::1/128"]
+
+# On-demand request profiles (X-Profile: 1 / ?profile=1, staff only)
+PROFILES_DIR = BASE_DIR / "profiles"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -4,11 +4,13 @@ from ninja import NinjaAPI
 from places.views import tour_router
 from places.routers.distance import routes_router
 from places.routers.trip_data import trip_router
+from places.routers.metrics import metrics_router
 
 api = NinjaAPI()
 api.add_router("/trip", trip_router)
 api.add_router("/tour", tour_router)
 api.add_router("/routes", routes_router)
+api.add_router("/metrics", metrics_router)
 
 urlpatterns = [
     path("admin/", admin.site.urls),